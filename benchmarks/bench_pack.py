@@ -0,0 +1,121 @@
+"""打包性能对比：shutil.make_archive 与 parallel_pack 并行压缩引擎
+
+用法：
+    python benchmarks/bench_pack.py                       # 生成约 128 MiB 的合成目录
+    python benchmarks/bench_pack.py --size-mb 512 --workers 1 2 4 8
+    python benchmarks/bench_pack.py --source <Qt 安装目录>  # 使用实际的安装目录
+
+合成目录模拟 Qt 安装目录的构成：大量小的头文件/文本文件，加上少量较大的、可压缩性一般的库文件。
+每种组合运行 --repeat 次取最短时间，输出耗时、压缩后大小以及相对 make_archive 的加速比。
+并行引擎直接调用 parallel_pack，不经过 create_archive 的 CPU/目录大小判断。
+shutil.make_archive 的 tar.gz 固定使用压缩级别 9，因此另列一行相同 --level 的单线程 tarfile 作为对照。
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build_qt.parallel_pack import create_tar_gz, create_zip  # noqa: E402
+
+WORDS = [b'QObject', b'QString', b'virtual', b'const', b'return', b'#include', b'template', b'namespace',
+         b'Q_DECL_OVERRIDE', b'QT_BEGIN_NAMESPACE', b'int', b'void', b'{', b'}', b';', b'\n']
+
+
+def _text(rng: random.Random, size: int) -> bytes:
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(WORDS) + b' '
+    return bytes(out[:size])
+
+
+def _binary(rng: random.Random, size: int) -> bytes:
+    # 一半随机字节、一半重复文本，压缩率接近 .so/.a
+    half = size // 2
+    return rng.randbytes(half) + _text(rng, size - half)
+
+
+def make_tree(root: str, size_mb: int, seed: int = 0) -> int:
+    """生成合成目录，返回文件数。约 30% 的数据为小文本文件，其余为 1~8 MiB 的库文件。"""
+    rng = random.Random(seed)
+    total = size_mb * 1024 * 1024
+    text_budget = total * 3 // 10
+    count = 0
+    written = 0
+    while written < text_budget:
+        size = rng.randint(512, 16 * 1024)
+        path = os.path.join(root, 'include', 'Qt{}'.format(count % 20), 'q{}.h'.format(count))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(_text(rng, size))
+        written += size
+        count += 1
+    os.makedirs(os.path.join(root, 'lib'), exist_ok=True)
+    while written < total:
+        size = min(rng.randint(1, 8) * 1024 * 1024, total - written)
+        with open(os.path.join(root, 'lib', 'libQt5Mod{}.so'.format(count)), 'wb') as f:
+            f.write(_binary(rng, size))
+        written += size
+        count += 1
+    return count
+
+
+def _timed(func, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比 shutil.make_archive 与 parallel_pack 的打包耗时')
+    parser.add_argument('--source', help='待打包目录，默认生成合成目录')
+    parser.add_argument('--size-mb', type=int, default=128, help='合成目录大小 (MiB)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--level', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='bench-pack-')
+    try:
+        source = args.source
+        if not source:
+            source = os.path.join(work, 'src')
+            files = make_tree(source, args.size_mb)
+            print('合成目录: {} 个文件, {} MiB'.format(files, args.size_mb))
+        print('CPU 核心数: {}'.format(os.cpu_count()))
+        out = os.path.join(work, 'out')
+        print('{:<8} {:<22} {:>9} {:>12} {:>8}'.format('format', 'engine', 'time(s)', 'size', 'speedup'))
+        for fmt, make_format, parallel in (('zip', 'zip', create_zip), ('tar.gz', 'gztar', create_tar_gz)):
+            baseline = _timed(lambda: shutil.make_archive(out, make_format, root_dir=source), args.repeat)
+            size = os.path.getsize(out + '.' + fmt)
+            print('{:<8} {:<22} {:>9.2f} {:>12} {:>8}'.format(fmt, 'shutil.make_archive', baseline, size, '1.00x'))
+            os.remove(out + '.' + fmt)
+            if fmt == 'tar.gz':
+                def single():
+                    with tarfile.open(out + '.tarfile.tar.gz', 'w:gz', compresslevel=args.level) as t:
+                        t.add(source, arcname='.')
+                baseline = _timed(single, args.repeat)
+                print('{:<8} {:<22} {:>9.2f} {:>12} {:>8}'.format(
+                    fmt, 'tarfile level {}'.format(args.level), baseline, os.path.getsize(out + '.tarfile.tar.gz'), '1.00x'))
+                os.remove(out + '.tarfile.tar.gz')
+            for workers in sorted(set(args.workers)):
+                path = out + '.parallel.' + fmt
+                elapsed = _timed(lambda: parallel(source, path, workers, args.level), args.repeat)
+                print('{:<8} {:<22} {:>9.2f} {:>12} {:>7.2f}x'.format(
+                    fmt, 'parallel_pack x{}'.format(workers), elapsed, os.path.getsize(path), baseline / elapsed))
+                os.remove(path)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,9 +11,12 @@ def init_parser():
     parser.add_argument('--init', action='store_true', help='初始化Qt仓库,并应用补丁')
     parser.add_argument('--env_check', action='store_true', help='检查开发环境')
     parser.add_argument('--reset_repo', action='store_true', help='重置Qt仓库,并重新应用补丁')
+    parser.add_argument('--list_worktrees', action='store_true', help='列出worktrees模式下已检出的Qt工作树')
+    parser.add_argument('--remove_worktree', type=str, metavar='TAG', help='删除worktrees模式下指定tag的Qt工作树')
     build_stages = ['configure', 'build', 'install', 'clean', 'all', "print_build_info"]
     parser.add_argument('--exe_stage', type=str, choices=build_stages, help='执行指定阶段')
     parser.add_argument("--with_pack", action="store_true", help="编译后是否打包编译结果")
+    parser.add_argument("--delta_base", type=str, help="配合 --with_pack 使用，以指定的产物包/目录/zip 清单为基线额外生成差量包")
     _args = parser.parse_args()
     if not any(vars(_args).values()):
         parser.print_help()
@@ -24,19 +27,28 @@ if __name__ == '__main__':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     args = init_parser()
     config = Config(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'configure.json'))
-    qt_dir = os.path.join(config.get_working_dir(), 'qt5')
+    main_qt_dir = os.path.join(config.get_working_dir(), 'qt5')
+    qt_dir = config.qt_source_dir()
 
     repo = QtRepo(qt_dir)
     if args.init:
         try:
+            # 启用 worktrees 时 qt5 作为共享对象库，当前 tag 检出到独立的工作树
+            main_repo = repo if qt_dir == main_qt_dir else QtRepo(main_qt_dir)
             # Qt源码克隆，url: {config.qt_repo()}, 深度为 {depth}, 分支/标签为 {config.tag()}
-            repo.clone(config.qt_repo(), depth=config.clone_depth(), branch=config.tag())
+            main_repo.clone(config.qt_repo(), depth=config.clone_depth(), branch=config.tag(), mirror=config.git_mirror(),
+                            jobs=config.clone_jobs(), skip=config.skip_modules(), clone_filter=config.clone_filter(),
+                            no_checkout=main_repo is not repo)
 
             # Qt OHOS补丁仓库克隆，url: {config.qt_ohos_patch_repo()}, 深度为 {depth, 分支/标签为 {config.ohqt_tag()}
-            repo.clone_patch_repo(config.qt_ohos_patch_repo(), depth=0, branch=config.ohqt_tag())
+            main_repo.clone_patch_repo(config.qt_ohos_patch_repo(), depth=0, branch=config.ohqt_tag(), mirror=config.git_mirror())
+
+            if main_repo is not repo:
+                repo = main_repo.add_worktree(qt_dir, config.tag(), patch_ref=config.ohqt_tag(), jobs=config.clone_jobs(),
+                                              skip=config.skip_modules(), mirror=config.git_mirror())
 
             # 应用补丁
-            repo.apply_patches()
+            repo.apply_patches(config.tag(), snapshots=config.patch_snapshots())
         except QtRepoError as e:
             print('QtRepoError:', e)
             exit(1)
@@ -44,10 +56,27 @@ if __name__ == '__main__':
             print('Error:', e)
             exit(1)
         exit()
+    if args.list_worktrees or args.remove_worktree:
+        try:
+            main_repo = QtRepo(main_qt_dir)
+            if not main_repo.repo:
+                raise QtRepoError('主仓库未初始化: {}'.format(main_qt_dir))
+            if args.remove_worktree:
+                main_repo.remove_worktree(config.qt_worktree_dir(args.remove_worktree))
+            else:
+                worktrees = main_repo.list_worktrees()
+                for worktree in worktrees:
+                    print('{}  {}'.format(worktree['path'], worktree['head']))
+                if not worktrees:
+                    print('没有工作树')
+        except QtRepoError as e:
+            print('QtRepoError:', e)
+            exit(1)
+        exit()
     if args.reset_repo:
         try:
-            # 重新应用补丁
-            repo.apply_patches()
+            # 重新应用补丁，只改写内容变化的文件
+            repo.apply_patches(config.tag(), incremental=True, snapshots=config.patch_snapshots())
         except QtRepoError as e:
             print('QtRepoError:', e)
             exit(1)
@@ -89,7 +118,7 @@ if __name__ == '__main__':
         # 打包
         if args.with_pack:
             try:
-                qtBuild.pack()
+                qtBuild.pack(delta_base=args.delta_base)
             except Exception as e:
                 print('Error during pack:', e)
                 exit(1)
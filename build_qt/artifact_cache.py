@@ -0,0 +1,212 @@
+"""
+按 sha256 寻址的共享构件缓存
+
+提供 ArtifactCache 类：
+- fetch(digest, dest_path): 缓存命中时以 reflink/复制的方式放置到目标路径
+- publish(src_path, digest): 将已校验的文件原子地发布到缓存
+- evict(): 按最近使用时间淘汰，直到总大小不超过上限
+
+多个工作目录、多个构建任务可共享同一缓存目录，跨进程操作通过缓存目录下的锁文件串行化；
+锁只在查找、更新索引与重命名时持有，复制大文件在锁外进行，不会阻塞其他构建。
+缓存文件与工作目录中的文件不使用硬链接：工作目录中的文件可能被就地修改（如断点续传、覆盖写），硬链接会连带改坏缓存。
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+from .utils import FileLock
+
+
+class ArtifactCacheError(Exception):
+    pass
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """尝试以写时复制方式克隆文件（Linux FICLONE），不支持时返回 False。"""
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    ficlone = 0x40049409
+    try:
+        with open(src, 'rb') as fs, open(dst, 'wb') as fd:
+            fcntl.ioctl(fd.fileno(), ficlone, fs.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        _remove_quietly(dst)
+        return False
+
+
+def reflink_or_copy(src: str, dst: str) -> str:
+    """依次尝试 reflink、复制，将 src 放置到 dst，返回实际使用的方式。"""
+    if _reflink(src, dst):
+        return 'reflink'
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+class ArtifactCache:
+    """按 sha256 寻址的构件缓存。
+
+    目录结构：
+        <root>/sha256/<前两位>/<digest>   缓存文件
+        <root>/tmp/                       发布时的暂存目录
+        <root>/index.json                 digest -> 最近使用时间，用于 LRU 淘汰
+        <root>/.lock                      跨进程锁文件
+
+    Example:
+        cache = ArtifactCache('~/.cache/build-qt-ohos', max_size=20 * 1024 ** 3)
+        if not cache.fetch(digest, 'work/.temp/native.zip'):
+            ...  # 下载并校验后
+            cache.publish('work/.temp/native.zip', digest)
+    """
+
+    def __init__(self, root: str, max_size: Optional[int] = None):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_size = max_size
+        self.blob_dir = os.path.join(self.root, 'sha256')
+        self.tmp_dir = os.path.join(self.root, 'tmp')
+        self.index_path = os.path.join(self.root, 'index.json')
+        try:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            os.makedirs(self.tmp_dir, exist_ok=True)
+        except OSError as e:
+            raise ArtifactCacheError('无法创建缓存目录 {}: {}'.format(self.root, e))
+
+    def _lock(self) -> FileLock:
+        return FileLock(os.path.join(self.root, '.lock'))
+
+    def blob_path(self, digest: str) -> str:
+        digest = digest.lower()
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _load_index(self) -> Dict[str, float]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index: Dict[str, float]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _touch(self, digest: str) -> None:
+        index = self._load_index()
+        index[digest.lower()] = time.time()
+        self._save_index(index)
+
+    def contains(self, digest: str) -> bool:
+        return os.path.isfile(self.blob_path(digest))
+
+    def fetch(self, digest: str, dest_path: str) -> bool:
+        """缓存命中时将文件放置到 dest_path 并返回 True，否则返回 False。
+
+        先复制到 dest_path 同目录的临时文件再重命名；复制期间缓存文件被淘汰时按未命中处理。
+        """
+        blob = self.blob_path(digest)
+        with self._lock():
+            if not os.path.isfile(blob):
+                return False
+            self._touch(digest)
+        dest_dir = os.path.dirname(os.path.abspath(dest_path))
+        os.makedirs(dest_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dest_dir, prefix=os.path.basename(dest_path) + '.', suffix='.tmp')
+        os.close(fd)
+        try:
+            mode = reflink_or_copy(blob, tmp_path)
+            os.replace(tmp_path, dest_path)
+        except FileNotFoundError:
+            _remove_quietly(tmp_path)
+            return False
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+        print('Info: 从构件缓存获取 {}（{}）'.format(os.path.basename(dest_path), mode))
+        return True
+
+    def publish(self, src_path: str, digest: str) -> str:
+        """将已校验的 src_path 原子地发布到缓存，返回缓存文件路径。
+
+        复制到 tmp/ 在锁外进行，持锁时只做重命名；其他进程已发布同一 digest 时丢弃本次副本。
+        """
+        blob = self.blob_path(digest)
+        if not self.contains(digest):
+            fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+            os.close(fd)
+            try:
+                reflink_or_copy(src_path, tmp_path)
+                with self._lock():
+                    if os.path.isfile(blob):
+                        os.remove(tmp_path)
+                    else:
+                        os.makedirs(os.path.dirname(blob), exist_ok=True)
+                        os.replace(tmp_path, blob)
+                    self._touch(digest)
+            except BaseException:
+                _remove_quietly(tmp_path)
+                raise
+        else:
+            with self._lock():
+                self._touch(digest)
+        self.evict()
+        return blob
+
+    def size(self) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(self.blob_dir):
+            for name in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def evict(self, max_size: Optional[int] = None) -> int:
+        """按最近使用时间从旧到新删除缓存文件，直到总大小不超过上限，返回释放的字节数。"""
+        max_size = self.max_size if max_size is None else max_size
+        if max_size is None:
+            return 0
+        freed = 0
+        with self._lock():
+            index = self._load_index()
+            blobs = []
+            for dirpath, _, filenames in os.walk(self.blob_dir):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    blobs.append((index.get(name, st.st_mtime), st.st_size, name, path))
+            total = sum(b[1] for b in blobs)
+            for _, size, name, path in sorted(blobs):
+                if total <= max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                freed += size
+                index.pop(name, None)
+                print('Info: 构件缓存淘汰 {}'.format(name))
+            if freed:
+                self._save_index(index)
+        return freed
@@ -6,8 +6,12 @@ import sys
 from typing import Dict
 import platform
 import subprocess
-from build_qt.utils import detect_platform, download_component, extract_archive
-from build_qt.ohos_sdk_downloader import OhosSdkDownloader
+from build_qt.utils import detect_platform, download_component, download_and_extract, extract_archive, create_download_progress, \
+    set_hash_cache_dir
+from build_qt.stream_extract import StreamUnsupported
+from build_qt.ohos_sdk_downloader import OhosSdkDownloader, native_profile, native_triple_patterns
+from build_qt.artifact_cache import ArtifactCache, ArtifactCacheError
+from build_qt.git_mirror import GitMirrorCache, GitMirrorError
 
 class Config:
     config = None
@@ -20,7 +24,8 @@ class Config:
         self.system = platform.system()
         self.make_tools = 'mingw32-make' if self.system == 'Windows' else 'make'
         plat = detect_platform()
-        self.ohos_sdk_downloader = OhosSdkDownloader(os_type=plat['osType'], os_arch=plat['osArch'], support_version=self.ohos_support_version())
+        self.ohos_sdk_downloader = OhosSdkDownloader(os_type=plat['osType'], os_arch=plat['osArch'], support_version=self.ohos_support_version(),
+                                                     cache_dir=self.get_sdk_list_cache_path(), cache_ttl=self.sdk_list_cache_ttl())
         if sys.stdout.isatty():
             self.init_user_config()
         else:
@@ -31,6 +36,7 @@ class Config:
         self.perl_path = self.get_perl_path()
         self.mingw_path = self.get_mingw_path()
         self.ohos_sdk_path = self.get_ohos_sdk_path()
+        set_hash_cache_dir(os.path.join(self.get_working_dir(), '.temp'))
 
 
     def init_user_config(self):
@@ -113,32 +119,201 @@ class Config:
                 self.save_usr_config(answers)
                 print('用户配置已保存到 {}'.format(user_config_path))
 
+    def check_perl(self):
+        """Windows 下检查配置的 perl 是否可用，可用时加入 PATH。"""
+        if not (self.perl_path and os.path.isdir(self.perl_path)):
+            return False
+        cmd = [os.path.join(self.perl_path, 'perl'), '-e', 'print sprintf("%vd",$^V);']
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode == 0:
+                print('perl 版本信息 {}'.format(result.stdout.strip()))
+                os.environ['PATH'] = os.environ.get('PATH', '') + os.pathsep + self.perl_path
+                return True
+        except Exception as e:
+            print('执行 {} 失败：{}'.format(cmd, e))
+        return False
+
+    def check_mingw(self):
+        """Windows 下检查配置的 mingw 是否可用，可用时加入 PATH。"""
+        if not (self.mingw_path and os.path.isdir(self.mingw_path)):
+            return False
+        cmd = [os.path.join(self.mingw_path, self.make_tools), '--version']
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode == 0:
+                print('{} 版本信息 {}'.format(self.make_tools, result.stdout[0:result.stdout.find('\n')].strip()))
+                os.environ['PATH'] = os.environ.get('PATH', '') + os.pathsep + self.mingw_path
+                return True
+        except Exception as e:
+            print('执行 {} 失败：{}'.format(cmd, e))
+        return False
+
+    def check_ohos_sdk(self):
+        """检查 OHOS SDK 是否可用，可用时设置 OHOS_SDK_PATH。"""
+        if not (self.ohos_sdk_path and os.path.isdir(self.ohos_sdk_path)):
+            return False
+        # 检查 native\oh-uni-package.json 是否存在
+        package_json_path = os.path.join(self.ohos_sdk_path, 'native', 'oh-uni-package.json')
+        if not os.path.isfile(package_json_path):
+            return False
+        # 尝试读取 JSON 文件，检查是否能正确解析
+        try:
+            with open(package_json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                print('OHOS SDK 版本信息 {}  {}'.format(data.get('apiVersion'), data.get('version')))
+        except Exception as e:
+            print('警告: 无法解析 {}，文件可能损坏或格式不正确。错误: {}'.format(package_json_path, e))
+            return False
+        # 按需解压的 SDK 缺少当前 ABI 或配置改为完整解压时补齐
+        profile = self.load_ohos_sdk_profile()
+        if profile is not None:
+            try:
+                if self.ohos_sdk_profile() == 'full':
+                    self.pull_ohos_sdk(None)
+                elif self.build_ohos_abi() not in profile.get('abis', []):
+                    self.pull_ohos_sdk(native_triple_patterns(self.build_ohos_abi()), abi=self.build_ohos_abi())
+            except Exception as e:
+                print('补充解压 OHOS SDK 失败：{}'.format(e))
+                return False
+        os.environ['OHOS_SDK_PATH'] = self.ohos_sdk_path
+        return True
+
+    def install_perl(self, temp_dir, progress=None):
+        perl_url = self.get_depends().get('perl').get('url')
+        perl_checksum = ('sha256', self.get_depends().get('perl').get('sha256'))
+        download_path = os.path.join(temp_dir, 'perl5.7z')
+        print('正在下载并安装 Perl...')
+        zip_path = download_component(perl_url, download_path, perl_checksum, connections=self.download_connections(),
+                                      cache=self.artifact_cache(), progress=progress)
+        perl_extracted_path = os.path.join(self.get_working_dir(), 'perl')
+        extract_archive(zip_path, perl_extracted_path)
+        if os.path.isdir(perl_extracted_path):
+            self.perl_path = os.path.join(perl_extracted_path, 'bin')
+
+    def install_mingw(self, temp_dir, progress=None):
+        mingw_url = self.get_depends().get('mingw').get('url')
+        mingw_checksum = ('sha256', self.get_depends().get('mingw').get('sha256'))
+        download_path = os.path.join(temp_dir, 'mingw64-x86_64-8.1.0-release-posix-seh-rt_v6-rev0.7z')
+        print('正在下载并安装 MinGW...')
+        zip_path = download_component(mingw_url, download_path, mingw_checksum, connections=self.download_connections(),
+                                      cache=self.artifact_cache(), progress=progress)
+        mingw_extracted_path = os.path.join(self.get_working_dir(), 'mingw')
+        extract_archive(zip_path, mingw_extracted_path)
+        if os.path.isdir(mingw_extracted_path):
+            self.mingw_path = os.path.join(mingw_extracted_path, 'bin')
+
+    def install_ohos_sdk(self, temp_dir, progress=None):
+        api_version = self.ohos_version()
+        print('正在下载并安装 OpenHarmony SDK...')
+        archive = self.ohos_sdk_downloader.resolve_component(api_version, 'native')
+        include, exclude = (None, None)
+        if self.ohos_sdk_profile() == 'qt':
+            include, exclude = native_profile(self.build_ohos_abi())
+            print('按 {} 只解压 Qt 所需的 OHOS SDK 组件'.format(self.build_ohos_abi()))
+        installed = False
+        if self.stream_extract():
+            cache = self.artifact_cache()
+            # 构件缓存命中时直接走缓存，无需访问网络
+            if not (cache and archive.checksum and cache.contains(archive.checksum)):
+                try:
+                    download_and_extract(archive.url, self.ohos_sdk_path, ('sha256', archive.checksum), progress=progress,
+                                         include=include, exclude=exclude)
+                    installed = True
+                except StreamUnsupported as e:
+                    print('警告: 无法边下载边解压（{}），改为先下载后解压'.format(e))
+        if not installed:
+            saved = self.ohos_sdk_downloader.download_component_by_name(api_version=api_version,
+                                                                        component_name='native',
+                                                                        dest_dir=temp_dir,
+                                                                        connections=self.download_connections(),
+                                                                        cache=self.artifact_cache(),
+                                                                        progress=progress)
+            extract_archive(saved, self.ohos_sdk_path, include=include, exclude=exclude)
+        if include is not None:
+            self.save_ohos_sdk_profile({'profile': 'qt', 'checksum': archive.checksum,
+                                        'abis': [self.build_ohos_abi()], 'pulled': []})
+
+    def ohos_sdk_profile_path(self):
+        return os.path.join(self.ohos_sdk_path, 'native', '.build-qt-profile.json')
+
+    def load_ohos_sdk_profile(self):
+        """读取按需解压记录，SDK 为完整解压时返回 None。"""
+        try:
+            with open(self.ohos_sdk_profile_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_ohos_sdk_profile(self, profile):
+        with open(self.ohos_sdk_profile_path(), 'w', encoding='utf-8') as f:
+            json.dump(profile, f, ensure_ascii=False, indent=4)
+
+    def pull_ohos_sdk(self, patterns, abi=None):
+        """从 native 包中补充解压匹配 patterns 的成员（为 None 时解压全部），已解压的部分保持不变。
+
+        按需解压的 SDK 在首次需要其他 ABI 或其他组件时调用；存档优先取自构件缓存。
+        """
+        profile = self.load_ohos_sdk_profile()
+        if profile is None:
+            return
+        pulled = profile.setdefault('pulled', [])
+        if patterns is not None:
+            patterns = [p for p in patterns if p not in pulled]
+            if not patterns:
+                return
+        print('补充解压 OHOS SDK: {}'.format(', '.join(patterns) if patterns else '全部组件'))
+        saved = self.ohos_sdk_downloader.download_component_by_name(api_version=self.ohos_version(),
+                                                                    component_name='native',
+                                                                    dest_dir=os.path.join(self.get_working_dir(), '.temp'),
+                                                                    connections=self.download_connections(),
+                                                                    cache=self.artifact_cache())
+        extract_archive(saved, self.ohos_sdk_path, include=patterns, merge=True)
+        if patterns is None:
+            os.remove(self.ohos_sdk_profile_path())
+            return
+        pulled += patterns
+        if abi is not None and abi not in profile['abis']:
+            profile['abis'].append(abi)
+        self.save_ohos_sdk_profile(profile)
+
+    def provision(self, components):
+        """并发下载并解压缺失的依赖，然后只对本次安装的组件重新校验。
+
+        components: 组件名 -> (安装函数, 校验函数)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if not components:
+            return
+        temp_dir = os.path.join(self.get_working_dir(), '.temp')
+        # 在工作线程启动前初始化共享缓存，避免并发创建
+        self.artifact_cache()
+        failed = []
+        with create_download_progress() as progress:
+            with ThreadPoolExecutor(max_workers=len(components)) as executor:
+                futures = {name: executor.submit(install, temp_dir, progress) for name, (install, _) in components.items()}
+                for name, future in futures.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print('安装 {} 失败：{}'.format(name, e))
+                        failed.append(name)
+        for name, (_, check) in components.items():
+            if name not in failed and not check():
+                print('安装 {} 后校验失败'.format(name))
+                failed.append(name)
+        if failed:
+            print('以下依赖未能安装：{}'.format(', '.join(failed)))
+            exit(1)
+
     def dev_env_check(self):
         need_perl = True
         need_mingw = True
-        need_ohos_sdk = True
         if self.system == 'Windows':
             os.environ['PATH'] = 'C:\\Windows\\System32' + os.pathsep + 'C:\\Windows'
-            if self.perl_path and os.path.isdir(self.perl_path):
-                cmd = [os.path.join(self.perl_path, 'perl'), '-e', 'print sprintf("%vd",$^V);']
-                try:
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    if result.returncode == 0:
-                        print('perl 版本信息 {}'.format(result.stdout.strip()))
-                        os.environ['PATH'] = os.environ.get('PATH', '') + os.pathsep + self.perl_path
-                        need_perl = False
-                except Exception as e:
-                    print('执行 {} 失败：{}'.format(cmd, e))
-            if self.mingw_path and os.path.isdir(self.mingw_path):
-                cmd = [os.path.join(self.mingw_path, self.make_tools), '--version']
-                try:
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    if result.returncode == 0:
-                        print('{} 版本信息 {}'.format(self.make_tools, result.stdout[0:result.stdout.find('\n')].strip()))
-                        os.environ['PATH'] = os.environ.get('PATH', '') + os.pathsep + self.mingw_path
-                        need_mingw = False
-                except Exception as e:
-                    print('执行 {} 失败：{}'.format(cmd, e))
+            need_perl = not self.check_perl()
+            need_mingw = not self.check_mingw()
         else:
             cmd = None
             try:
@@ -162,52 +337,16 @@ class Config:
                 if self.system == 'Darwin':
                     print('请从 App Store 安装最新的 Xcode 以安装编译工具')
                 exit(1)
-        if self.ohos_sdk_path and os.path.isdir(self.ohos_sdk_path):
-            # 检查 native\oh-uni-package.json 是否存在
-            package_json_path = os.path.join(self.ohos_sdk_path, 'native', 'oh-uni-package.json')
-            if os.path.isfile(package_json_path):
-                # 尝试读取 JSON 文件，检查是否能正确解析
-                try:
-                    with open(package_json_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        print('OHOS SDK 版本信息 {}  {}'.format(data.get('apiVersion'), data.get('version')))
-                        os.environ['OHOS_SDK_PATH'] = self.ohos_sdk_path
-                        need_ohos_sdk = False
-                except Exception as e:
-                    print('警告: 无法解析 {}，文件可能损坏或格式不正确。错误: {}'.format(package_json_path, e))
-        temp_dir = os.path.join(self.get_working_dir(), '.temp')
-        if need_perl and self.system == 'Windows':
-            perl_url = self.get_depends().get('perl').get('url')
-            perl_checksum = ('sha256', self.get_depends().get('perl').get('sha256'))
-            download_path = os.path.join(temp_dir, 'perl5.7z')
-            print('正在下载并安装 Perl...')
-            zip_path = download_component(perl_url, download_path, perl_checksum)
-            perl_extracted_path = os.path.join(self.get_working_dir(), 'perl')
-            extract_archive(zip_path, perl_extracted_path)
-            if os.path.isdir(perl_extracted_path):
-                self.perl_path = os.path.join(perl_extracted_path, 'bin')
+        need_ohos_sdk = not self.check_ohos_sdk()
 
+        components = {}
+        if need_perl and self.system == 'Windows':
+            components['perl'] = (self.install_perl, self.check_perl)
         if need_mingw and self.system == 'Windows':
-            mingw_url = self.get_depends().get('mingw').get('url')
-            mingw_checksum = ('sha256', self.get_depends().get('mingw').get('sha256'))
-            download_path = os.path.join(temp_dir, 'mingw64-x86_64-8.1.0-release-posix-seh-rt_v6-rev0.7z')
-            print('正在下载并安装 MinGW...')
-            zip_path = download_component(mingw_url, download_path, mingw_checksum)
-            mingw_extracted_path = os.path.join(self.get_working_dir(), 'mingw')
-            extract_archive(zip_path, mingw_extracted_path)
-            if os.path.isdir(mingw_extracted_path):
-                self.mingw_path = os.path.join(mingw_extracted_path, 'bin')
-
+            components['mingw'] = (self.install_mingw, self.check_mingw)
         if need_ohos_sdk:
-            api_version = self.ohos_version()
-            print('正在下载并安装 OpenHarmony SDK...')
-            saved = self.ohos_sdk_downloader.download_component_by_name(api_version=api_version,
-                                                                        component_name='native',
-                                                                        dest_dir=temp_dir)
-            extract_archive(saved, self.ohos_sdk_path)
-
-        if need_perl or need_mingw or need_ohos_sdk:
-            self.dev_env_check()
+            components['ohos_sdk'] = (self.install_ohos_sdk, self.check_ohos_sdk)
+        self.provision(components)
 
     def get_working_dir(self):
         working_dir = self.get_config_value('working_dir')
@@ -242,6 +381,17 @@ class Config:
         _ohos_sdk_path = os.path.abspath(os.path.expanduser(_ohos_sdk_path))
         return _ohos_sdk_path
 
+    def get_sdk_list_cache_path(self):
+        _cache_path = self.get_config_value('sdk_list_cache')
+        if not _cache_path:
+            return None
+        if '${pwd}' in _cache_path:
+            _cache_path = _cache_path.replace('${pwd}', self.root_path)
+        return os.path.abspath(os.path.expanduser(_cache_path))
+
+    def sdk_list_cache_ttl(self):
+        return int(self.get_config_value('sdk_list_cache_ttl') or 0)
+
     def ohos_support_version(self):
         return self.get_depends().get('ohos_sdk').get('support_version')
 
@@ -280,12 +430,110 @@ class Config:
     def clone_depth(self):
         return int(self.get_config_value('clone_depth'))
 
+    def clone_filter(self):
+        """部分克隆过滤器，例如 blob:none；空表示不使用。"""
+        return self.get_config_value('clone_filter') or None
+
+    def qt_source_dir(self):
+        """Qt 源码目录：默认 <working_dir>/qt5；启用 worktrees 时每个 tag 使用独立的工作树 <working_dir>/qt5-<tag>。"""
+        if self.worktrees():
+            return self.qt_worktree_dir(self.tag())
+        return os.path.join(self.get_working_dir(), 'qt5')
+
+    def worktrees(self):
+        return bool(self.get_config_value('worktrees'))
+
+    def qt_worktree_dir(self, tag):
+        """worktrees 模式下 tag 对应的工作树目录 <working_dir>/qt5-<tag>。"""
+        return os.path.join(self.get_working_dir(), 'qt5-{}'.format(tag))
+
+    def patch_snapshots(self):
+        return bool(self.get_config_value('patch_snapshots'))
+
+    def clone_jobs(self):
+        return max(1, int(self.get_config_value('clone_jobs') or 1))
+
+    def skip_modules(self):
+        """当前 tag 在 configure.json 中配置的 -skip 模块列表。"""
+        return list(self.config.get(self.tag(), {}).get('-skip', []))
+
     def build_jobs(self):
         jobs = int(self.get_config_value('jobs'))
         if jobs <= os.cpu_count():
             return jobs
         return os.cpu_count()
 
+    def pack_format(self):
+        """打包格式：zip/tar.gz/tar.xz/tar.zst，auto 时 Windows 为 zip，其他为 tar.gz。"""
+        _format = self.get_config_value('pack_format') or 'auto'
+        if _format == 'auto':
+            return 'zip' if self.system == 'Windows' else 'tar.gz'
+        return _format
+
+    def pack_level(self):
+        level = self.get_config_value('pack_level')
+        return int(level) if level is not None else None
+
+    def pack_zstd_long(self):
+        return bool(self.get_config_value('pack_zstd_long'))
+
+    def pack_incremental(self):
+        return bool(self.get_config_value('pack_incremental'))
+
+    def stream_extract(self):
+        return bool(self.get_config_value('stream_extract'))
+
+    def ohos_sdk_profile(self):
+        """OHOS SDK 解压方式：full（默认）解压整个 native 包，qt 只解压当前 ABI 编译所需组件。"""
+        return self.get_config_value('ohos_sdk_profile') or 'full'
+
+    def download_connections(self):
+        return max(1, int(self.get_config_value('download_connections')))
+
+    def get_artifact_cache_path(self):
+        _cache_path = self.get_config_value('artifact_cache')
+        if not _cache_path:
+            return None
+        if '${pwd}' in _cache_path:
+            _cache_path = _cache_path.replace('${pwd}', self.root_path)
+        return os.path.abspath(os.path.expanduser(_cache_path))
+
+    def artifact_cache(self):
+        """返回共享构件缓存，未配置 artifact_cache 时返回 None。"""
+        if getattr(self, '_artifact_cache', None) is None:
+            cache_path = self.get_artifact_cache_path()
+            if not cache_path:
+                return None
+            max_size_gb = self.get_config_value('artifact_cache_max_size_gb')
+            max_size = int(float(max_size_gb) * 1024 ** 3) if max_size_gb else None
+            try:
+                self._artifact_cache = ArtifactCache(cache_path, max_size=max_size)
+            except ArtifactCacheError as e:
+                print('警告: {}，不使用构件缓存'.format(e))
+                return None
+        return self._artifact_cache
+
+    def get_git_mirror_path(self):
+        _mirror_path = self.get_config_value('git_mirror_cache')
+        if not _mirror_path:
+            return None
+        if '${pwd}' in _mirror_path:
+            _mirror_path = _mirror_path.replace('${pwd}', self.root_path)
+        return os.path.abspath(os.path.expanduser(_mirror_path))
+
+    def git_mirror(self):
+        """返回本地 Git 镜像缓存，未配置 git_mirror_cache 时返回 None。"""
+        if getattr(self, '_git_mirror', None) is None:
+            mirror_path = self.get_git_mirror_path()
+            if not mirror_path:
+                return None
+            try:
+                self._git_mirror = GitMirrorCache(mirror_path)
+            except GitMirrorError as e:
+                print('警告: {}，不使用 Git 镜像缓存'.format(e))
+                return None
+        return self._git_mirror
+
     def get_repos(self):
         return self.config.get('repositories', {})
 
@@ -311,7 +559,7 @@ class Config:
         with open(usr_config_path, 'w', encoding='utf-8') as f:
             json.dump(obj, f, ensure_ascii=False, indent=4)
 
-    def build_configure_options(self):
+    def build_configure_options(self, source_dir=None):
         options = self.config['qt-config']
         result = []
         if options['license'] in ['opensource', 'commercial']:
@@ -334,8 +582,12 @@ class Config:
             result.append('-disable-rpath')
         for nomake in options['-nomake']:
             result += ['-nomake', nomake]
-        skips = self.config[self.tag()]['-skip']
-        for skip in skips:
+        for skip in self.skip_modules():
+            # 克隆时未检出的子模块目录为空，Qt configure 对不存在的模块使用 -skip 会报错
+            if source_dir:
+                module_dir = os.path.join(source_dir, skip)
+                if not os.path.isdir(module_dir) or not os.listdir(module_dir):
+                    continue
             result += ['-skip', skip]
         result += ['-prefix', self.build_prefix()]
         result += ['-{}'.format(self.build_type())]
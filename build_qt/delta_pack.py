@@ -0,0 +1,378 @@
+"""
+两次打包产物（安装前缀）之间的差量包
+
+提供：
+- scan_tree(root): 遍历目录，记录每个文件的 sha256/大小/权限、符号链接目标与目录
+- create_delta(source_dir, baseline, delta_path): 以 baseline（目录、产物包或 zip 清单）为基线生成差量包
+- apply_delta_package(delta_path, target_dir): 将差量包应用到已解压的基线目录
+
+差量包为 tar.zst，内含：
+    delta.json          变更描述（删除的路径、新增/替换的文件、补丁、符号链接、目录、权限）
+    files/<path>        新增文件，或基线中无内容可比对时的完整文件
+    patches/<path>      以基线文件为 zstd 原始内容字典压缩的新文件（等价于 zstd --patch-from）
+
+基线为 zip 清单（<package>.zip.manifest.json）时只有文件摘要而没有内容，变化的文件整体写入 files/，
+且清单不含目录条目，基线中被删除的空目录不会被删除。
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import shutil
+import stat
+import sys
+import tarfile
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .parallel_pack import MANIFEST_SUFFIX, _file_sha256
+
+DELTA_SUFFIX = '.delta.tar.zst'
+DELTA_META = 'delta.json'
+DELTA_VERSION = 1
+# 补丁不小于新文件大小的该比例时改为存完整文件
+PATCH_MAX_RATIO = 0.9
+# 小于该大小的文件不做补丁，直接存完整文件
+PATCH_MIN_SIZE = 4 * 1024
+# 超过该大小的文件不做补丁（基线文件需整体读入内存作为字典）
+PATCH_MAX_SIZE = 512 * 1024 * 1024
+# 并发生成补丁时同时读入内存的基线文件总大小上限；单个超过上限的文件独占执行
+PATCH_MEMORY_BUDGET = 1024 * 1024 * 1024
+
+
+class DeltaError(Exception):
+    pass
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise DeltaError('差量包需要 zstandard 模块，请执行 pip install zstandard')
+    return zstandard
+
+
+def scan_tree(root: str, workers: int = 1) -> Dict[str, dict]:
+    """遍历 root，返回 {相对路径: 条目}。
+
+    条目为 {'type': 'file', 'size', 'mode', 'sha256'}、{'type': 'link', 'target'} 或 {'type': 'dir', 'mode'}，
+    路径统一使用 '/' 分隔。
+    """
+    entries: Dict[str, dict] = {}
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        rel_dir = os.path.relpath(dirpath, root)
+        for name in list(dirnames):
+            path = os.path.join(dirpath, name)
+            rel = os.path.normpath(os.path.join(rel_dir, name)).replace(os.sep, '/')
+            if os.path.islink(path):
+                # 指向目录的符号链接不再深入
+                dirnames.remove(name)
+                entries[rel] = {'type': 'link', 'target': os.readlink(path)}
+            else:
+                entries[rel] = {'type': 'dir', 'mode': stat.S_IMODE(os.stat(path).st_mode)}
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            rel = os.path.normpath(os.path.join(rel_dir, name)).replace(os.sep, '/')
+            if os.path.islink(path):
+                entries[rel] = {'type': 'link', 'target': os.readlink(path)}
+                continue
+            st = os.stat(path)
+            entries[rel] = {'type': 'file', 'size': st.st_size, 'mode': stat.S_IMODE(st.st_mode)}
+            files.append((rel, path))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for (rel, _), digest in zip(files, pool.map(lambda item: _file_sha256(item[1]), files)):
+            entries[rel]['sha256'] = digest
+    return entries
+
+
+def _manifest_entries(manifest_path: str) -> Dict[str, dict]:
+    """将 zip 打包清单转换为 scan_tree 的条目格式（无权限信息）。"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        entries = manifest['entries']
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise DeltaError('无法读取打包清单 {}: {}'.format(manifest_path, e))
+    return {name: {'type': 'file', 'size': e['size'], 'sha256': e['sha256']} for name, e in entries.items()}
+
+
+def _patch_params(zstandard, base_size: int, new_size: int, level: int):
+    # 窗口需覆盖字典与新文件；哈希表与链表按字典大小放大，否则远处的匹配找不到
+    window_log = min(max((base_size + new_size).bit_length(), 10), 31)
+    hash_log = min(max(window_log - 1, 20), 26)
+    return zstandard.ZstdCompressionParameters.from_level(level, window_log=window_log, hash_log=hash_log,
+                                                          chain_log=min(hash_log + 1, 27), enable_ldm=True)
+
+
+def make_patch(base_path: str, new_path: str, out, level: int = 9, chunk_size: int = 1024 * 1024) -> int:
+    """以 base_path 的内容为字典压缩 new_path，补丁写入 out，返回补丁字节数。
+
+    基线文件整体读入内存作为字典，新文件按块流式压缩。
+    """
+    zstandard = _import_zstandard()
+    with open(base_path, 'rb') as f:
+        base = f.read()
+    new_size = os.path.getsize(new_path)
+    dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    params = _patch_params(zstandard, len(base), new_size, level)
+    compressor = zstandard.ZstdCompressor(dict_data=dict_data, compression_params=params)
+    start = out.tell()
+    with compressor.stream_writer(out, size=new_size, closefd=False) as writer, open(new_path, 'rb') as f:
+        shutil.copyfileobj(f, writer, chunk_size)
+    return out.tell() - start
+
+
+class _MemoryBudget:
+    """按字节数限制同时进行的任务：已占用加上本次超过上限时等待；单个任务超过上限时等其他任务结束后独占。"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.cond = threading.Condition()
+
+    @contextmanager
+    def hold(self, size: int):
+        size = min(size, self.limit)
+        with self.cond:
+            self.cond.wait_for(lambda: self.used + size <= self.limit)
+            self.used += size
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.used -= size
+                self.cond.notify_all()
+
+
+def apply_patch(base_path: str, patch: bytes, out) -> None:
+    """以 base_path 的内容为字典解压补丁，写入 out。"""
+    zstandard = _import_zstandard()
+    with open(base_path, 'rb') as f:
+        base = f.read()
+    dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    out.write(zstandard.ZstdDecompressor(dict_data=dict_data, max_window_size=2 ** 31).decompress(patch))
+
+
+def _open_baseline(baseline: str, tmp_dir: str, workers: int) -> tuple[Dict[str, dict], Optional[str]]:
+    """返回 (基线条目, 基线内容目录)；基线为清单时内容目录为 None。"""
+    if os.path.isdir(baseline):
+        return scan_tree(baseline, workers), baseline
+    if baseline.endswith(MANIFEST_SUFFIX):
+        return _manifest_entries(baseline), None
+    if not os.path.isfile(baseline):
+        raise DeltaError('基线不存在: {}'.format(baseline))
+    from .utils import extract_archive
+    base_dir = os.path.join(tmp_dir, 'baseline')
+    extract_archive(baseline, base_dir, workers=workers)
+    return scan_tree(base_dir, workers), base_dir
+
+
+def create_delta(source_dir: str, baseline: str, delta_path: str, workers: int = 1, level: int = 9) -> dict:
+    """以 baseline 为基线，为 source_dir 生成差量包 delta_path（先写入 .part 再改名）。
+
+    baseline 可以是已解压的目录、create_archive 生成的产物包，或 zip 产物包旁的 .manifest.json。
+
+    Returns delta.json 的内容。
+    """
+    if not os.path.isdir(source_dir):
+        raise ValueError('Source directory does not exist: {}'.format(source_dir))
+    zstandard = _import_zstandard()
+    out_dir = os.path.dirname(os.path.abspath(delta_path))
+    tmp_dir = tempfile.mkdtemp(prefix='.delta-', dir=out_dir)
+    tmp_path = delta_path + '.part'
+    try:
+        base_entries, base_dir = _open_baseline(baseline, tmp_dir, workers)
+        entries = scan_tree(source_dir, workers)
+        meta = {
+            'version': DELTA_VERSION,
+            'baseline': os.path.basename(baseline.rstrip('/\\')),
+            'removed': sorted(p for p in base_entries if p not in entries),
+            'files': {},
+            'patches': {},
+            'links': {},
+            'dirs': {},
+            'modes': {},
+        }
+        candidates = []
+        for rel, entry in entries.items():
+            old = base_entries.get(rel)
+            if entry['type'] == 'dir':
+                if old is None or old['type'] != 'dir':
+                    meta['dirs'][rel] = entry['mode']
+                continue
+            if entry['type'] == 'link':
+                if old != entry:
+                    meta['links'][rel] = entry['target']
+                continue
+            record = {'sha256': entry['sha256'], 'size': entry['size'], 'mode': entry['mode']}
+            if old is not None and old['type'] == 'file' and old['sha256'] == entry['sha256']:
+                # 清单基线没有权限信息，一律记录
+                if old.get('mode') != entry['mode']:
+                    meta['modes'][rel] = entry['mode']
+                continue
+            if (old is not None and old['type'] == 'file' and base_dir is not None
+                    and PATCH_MIN_SIZE <= entry['size'] <= PATCH_MAX_SIZE):
+                record['base_sha256'] = old['sha256']
+                candidates.append((rel, record))
+            else:
+                meta['files'][rel] = record
+        # 类型发生变化的路径（文件 <-> 目录/链接）先删除再重建
+        meta['removed'] += sorted(p for p, e in entries.items()
+                                  if p in base_entries and base_entries[p]['type'] != e['type'])
+
+        budget = _MemoryBudget(PATCH_MEMORY_BUDGET)
+
+        def build_patch(item):
+            rel, record = item
+            base_path = os.path.join(base_dir, rel)
+            patch_path = os.path.join(tmp_dir, 'patches', rel)
+            os.makedirs(os.path.dirname(patch_path), exist_ok=True)
+            # 内存占用主要是整体读入的基线文件（字典）
+            with budget.hold(os.path.getsize(base_path)), open(patch_path, 'wb') as f:
+                size = make_patch(base_path, os.path.join(source_dir, rel), f, level)
+            if size >= record['size'] * PATCH_MAX_RATIO:
+                os.remove(patch_path)
+                return rel, record, None
+            return rel, record, patch_path
+
+        patch_paths = {}
+        # 补丁生成需持有基线文件内容，并发数不宜过高，且受 PATCH_MEMORY_BUDGET 限制
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, 4))) as pool:
+            for rel, record, patch_path in pool.map(build_patch, candidates):
+                if patch_path is None:
+                    record.pop('base_sha256')
+                    meta['files'][rel] = record
+                else:
+                    meta['patches'][rel] = record
+                    patch_paths[rel] = patch_path
+
+        params = zstandard.ZstdCompressionParameters.from_level(10, threads=workers if workers > 1 else 0)
+        with open(tmp_path, 'wb') as f:
+            with zstandard.ZstdCompressor(compression_params=params).stream_writer(f, closefd=False) as writer:
+                with tarfile.open(fileobj=writer, mode='w|') as t:
+                    data = json.dumps(meta, indent=1, sort_keys=True).encode('utf-8')
+                    info = tarfile.TarInfo(DELTA_META)
+                    info.size = len(data)
+                    t.addfile(info, io.BytesIO(data))
+                    for rel in sorted(meta['files']):
+                        t.add(os.path.join(source_dir, rel), arcname='files/' + rel, recursive=False)
+                    for rel in sorted(patch_paths):
+                        t.add(patch_paths[rel], arcname='patches/' + rel, recursive=False)
+        os.replace(tmp_path, delta_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return meta
+
+
+def _target_path(target_dir: str, rel: str) -> str:
+    parts = [p for p in rel.split('/') if p not in ('', '.')]
+    if rel.startswith('/') or os.path.splitdrive(rel)[0] or '..' in parts:
+        raise DeltaError('Unsafe path in delta package: {}'.format(rel))
+    return os.path.join(target_dir, *parts)
+
+
+def _remove_path(path: str) -> None:
+    if os.path.islink(path) or os.path.isfile(path):
+        os.remove(path)
+    elif os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def _chmod(path: str, mode: Optional[int]) -> None:
+    if mode is not None and not sys.platform.startswith('win'):
+        os.chmod(path, mode)
+
+
+def _write_verified(path: str, record: dict, write) -> None:
+    """调用 write(f) 写入临时文件，校验 sha256 后替换 path。"""
+    tmp_path = path + '.delta-tmp'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        if _file_sha256(tmp_path) != record['sha256']:
+            raise DeltaError('差量包应用后文件校验失败: {}'.format(path))
+        _chmod(tmp_path, record.get('mode'))
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def apply_delta_package(delta_path: str, target_dir: str) -> dict:
+    """将差量包应用到 target_dir（其内容应与生成差量包时的基线一致）。
+
+    应用前先校验所有待打补丁文件的 sha256，不一致时抛出 DeltaError 且不修改目录；
+    每个写出的文件都先写临时文件并校验 sha256 后再替换。
+
+    Returns delta.json 的内容。
+    """
+    zstandard = _import_zstandard()
+    if not os.path.isdir(target_dir):
+        raise DeltaError('目标目录不存在: {}'.format(target_dir))
+    with open(delta_path, 'rb') as f:
+        with zstandard.ZstdDecompressor(max_window_size=2 ** 31).stream_reader(f) as reader:
+            with tarfile.open(fileobj=reader, mode='r|') as t:
+                first = t.next()
+                if first is None or first.name != DELTA_META:
+                    raise DeltaError('不是有效的差量包: {}'.format(delta_path))
+                meta = json.load(t.extractfile(first))
+                if meta.get('version') != DELTA_VERSION:
+                    raise DeltaError('不支持的差量包版本: {}'.format(meta.get('version')))
+
+                for rel, record in meta['patches'].items():
+                    path = _target_path(target_dir, rel)
+                    if not os.path.isfile(path) or _file_sha256(path) != record['base_sha256']:
+                        raise DeltaError('基线文件与差量包不符: {}'.format(rel))
+
+                for rel in meta['removed']:
+                    path = _target_path(target_dir, rel)
+                    if os.path.lexists(path):
+                        _remove_path(path)
+                for rel in sorted(meta['dirs']):
+                    os.makedirs(_target_path(target_dir, rel), exist_ok=True)
+
+                applied = set()
+                for m in t:
+                    kind, _, rel = m.name.partition('/')
+                    if not m.isfile() or kind not in ('files', 'patches'):
+                        continue
+                    record = meta[kind].get(rel)
+                    if record is None:
+                        raise DeltaError('差量包中存在未声明的成员: {}'.format(m.name))
+                    path = _target_path(target_dir, rel)
+                    src = t.extractfile(m)
+                    if kind == 'files':
+                        _write_verified(path, record, lambda out: shutil.copyfileobj(src, out, 1024 * 1024))
+                    else:
+                        _write_verified(path, record, lambda out: apply_patch(path, src.read(), out))
+                    applied.add(m.name)
+                missing = ['{}/{}'.format(kind, rel) for kind in ('files', 'patches') for rel in meta[kind]
+                           if '{}/{}'.format(kind, rel) not in applied]
+                if missing:
+                    raise DeltaError('差量包不完整，缺少: {}'.format(', '.join(missing[:5])))
+
+    for rel, target in meta['links'].items():
+        path = _target_path(target_dir, rel)
+        if os.path.lexists(path):
+            _remove_path(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.symlink(target, path)
+    for rel, mode in meta['modes'].items():
+        _chmod(_target_path(target_dir, rel), mode)
+    for rel, mode in meta['dirs'].items():
+        _chmod(_target_path(target_dir, rel), mode)
+    return meta
@@ -0,0 +1,108 @@
+"""
+本地 Git 镜像缓存
+
+提供 GitMirrorCache 类：
+- mirror_path(url): 远端 URL 对应的本地裸镜像路径
+- update(url): 镜像不存在时 git clone --mirror，存在时 git fetch --prune；返回镜像路径
+
+多个工作目录、并行构建任务共享同一镜像目录，同一镜像的更新通过锁文件串行化。
+网络不可用但镜像已存在时沿用旧镜像（离线初始化）。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+from typing import Optional
+from urllib.parse import urlsplit
+
+from .utils import FileLock
+
+
+class GitMirrorError(Exception):
+    pass
+
+
+def _sanitize(part: str) -> str:
+    return re.sub(r'[^A-Za-z0-9._-]', '_', part) or '_'
+
+
+class GitMirrorCache:
+    """按远端 URL 组织的裸镜像缓存。
+
+    目录结构：
+        <root>/<host>/<path>.git        例如 gitcode.com/qtforohos/qt5.git
+        <root>/local/<hash>-<name>.git  本地路径或 file:// 远端
+        <root>/<...>.git.lock           更新镜像时的锁文件
+
+    Example:
+        mirrors = GitMirrorCache('~/.cache/build-qt-ohos/git-mirrors')
+        path = mirrors.update('https://gitcode.com/qtforohos/qt5.git')
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.git_exe = shutil.which('git')
+        if not self.git_exe:
+            raise GitMirrorError('系统中未找到 git 可执行文件')
+        try:
+            os.makedirs(self.root, exist_ok=True)
+        except OSError as e:
+            raise GitMirrorError('无法创建镜像目录 {}: {}'.format(self.root, e))
+
+    def mirror_path(self, url: str) -> str:
+        scp = re.match(r'^[\w.-]+@([\w.-]+):(.*)$', url)
+        parsed = urlsplit(url)
+        if scp:
+            parts = [scp.group(1)] + scp.group(2).strip('/').split('/')
+        elif parsed.scheme in ('http', 'https', 'ssh', 'git') and parsed.netloc:
+            parts = [parsed.hostname or parsed.netloc] + parsed.path.strip('/').split('/')
+        else:
+            local = os.path.abspath(parsed.path if parsed.scheme == 'file' else url)
+            digest = hashlib.sha1(local.encode('utf-8')).hexdigest()[:12]
+            parts = ['local', '{}-{}'.format(digest, os.path.basename(local.rstrip('/\\')))]
+        parts = [_sanitize(p) for p in parts if p]
+        if not parts[-1].endswith('.git'):
+            parts[-1] += '.git'
+        return os.path.join(self.root, *parts)
+
+    def _git(self, *args, cwd: Optional[str] = None) -> None:
+        subprocess.run([self.git_exe] + list(args), cwd=cwd, check=True)
+
+    def _configure(self, path: str) -> None:
+        # 子模块按 depth=1 克隆时需要直接请求 gitlink 记录的提交；部分克隆需要服务端支持 --filter
+        self._git('-C', path, 'config', 'uploadpack.allowAnySHA1InWant', 'true')
+        self._git('-C', path, 'config', 'uploadpack.allowFilter', 'true')
+
+    def update(self, url: str) -> str:
+        """创建或更新 url 的裸镜像，返回镜像路径。
+
+        Raises:
+            GitMirrorError: 镜像不存在且克隆失败时抛出；已有镜像 fetch 失败时只打印警告
+        """
+        path = self.mirror_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with FileLock(path + '.lock'):
+            if os.path.isfile(os.path.join(path, 'HEAD')):
+                try:
+                    self._git('-C', path, 'remote', 'set-url', 'origin', url)
+                    self._git('-C', path, 'fetch', '--prune', '--quiet', 'origin')
+                    self._configure(path)
+                    print('已更新镜像: {}'.format(path))
+                except subprocess.CalledProcessError as e:
+                    print('警告: 更新镜像 {} 失败，使用已有镜像: {}'.format(path, e))
+                return path
+            tmp_path = path + '.tmp'
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            try:
+                print('正在创建镜像: {} -> {}'.format(url, path))
+                self._git('clone', '--mirror', '--quiet', url, tmp_path)
+                self._configure(tmp_path)
+                os.replace(tmp_path, path)
+            except (subprocess.CalledProcessError, OSError) as e:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                raise GitMirrorError('创建镜像 {} 失败: {}'.format(url, e))
+        return path
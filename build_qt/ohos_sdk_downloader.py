@@ -5,22 +5,73 @@ OpenHarmony SDK 下载器
 - get_sdk_list(os_type, os_arch, support_version): 请求 SDK 列表
 - parse_download_links(sdk_list, components=None): 解析并返回组件到下载 URL 的映射
 - download_component(url, dest_path, expected_checksum=None, chunk_size=8192): 下载并校验 sha256
+- resolve_component(api_version, component_name): 查找指定组件的下载地址、大小与校验和
 - download_component_by_name(api_version, component_name, os_type, os_arch, support_version, dest_dir): 高层 API，指定 apiVersion 和组件名称下载
+- native_profile(abi): Qt 编译指定 ABI 所需的 native 包成员过滤规则，用于按需解压
+
+SDK 列表按 (osType, osArch, supportVersion) 在进程内和磁盘上缓存：TTL 内直接使用，
+过期后重新请求，网络不可用时回退到已缓存的列表。过期请求会携带 ETag/Last-Modified 条件头，
+但列表接口是 POST，条件请求语义只对 GET/HEAD 有定义，服务端多半忽略这些头并返回完整列表，
+因此实际效果以 TTL 缓存为主，304 只是服务端支持时的额外收益。
 
 设计原则：模块化、易于测试、清晰的异常与日志输出
 """
 from __future__ import annotations
 
+import copy
+import hashlib
+import json
 import os
+import time
 from dataclasses import dataclass
 from typing import Dict, Iterable, List, Optional
 
-from .utils import download_component
+from .artifact_cache import ArtifactCache
+from .utils import DOWNLOAD_CONNECTIONS, download_component
 
 import requests
 
 
 SDK_LIST_URL = 'https://repo.harmonyos.com/sdkmanager/v5/ohos/getSdkList'
+SDK_LIST_CACHE_TTL = 24 * 60 * 60
+
+# build_ohos_abi -> native 包中按目标划分的目录名
+OHOS_ABI_TRIPLES = {
+    'arm64-v8a': 'aarch64-linux-ohos',
+    'armeabi-v7a': 'arm-linux-ohos',
+    'x86_64': 'x86_64-linux-ohos',
+}
+# native 包 llvm/ 与 sysroot/ 下可能出现的全部目标目录
+NATIVE_TRIPLES = ('aarch64-linux-ohos', 'arm-linux-ohos', 'x86_64-linux-ohos',
+                  'mipsel-linux-ohos', 'riscv64-linux-ohos', 'loongarch64-linux-ohos')
+
+
+def _triple_patterns(triple: str) -> List[str]:
+    return ['native/llvm/*/{}/*'.format(triple), 'native/sysroot/*/{}/*'.format(triple)]
+
+
+def native_triple_patterns(abi: str) -> List[str]:
+    """native 包中只属于指定 ABI 的成员 glob（llvm 运行库与 sysroot 中该目标的目录）。"""
+    if abi not in OHOS_ABI_TRIPLES:
+        raise DownloadError('Unsupported OHOS ABI: {}'.format(abi))
+    return _triple_patterns(OHOS_ABI_TRIPLES[abi])
+
+
+def native_profile(abi: str) -> tuple[List[str], List[str]]:
+    """返回 oh-clang mkspec 编译指定 ABI 所需的 native 包成员 (include, exclude) glob 列表。
+
+    只保留 LLVM 工具链、目标 ABI 的 sysroot 与 build-tools/build 下的 cmake 文件，
+    其他 ABI 的运行库与 sysroot、docs 等不解压。
+    """
+    if abi not in OHOS_ABI_TRIPLES:
+        raise DownloadError('Unsupported OHOS ABI: {}'.format(abi))
+    include = ['native/oh-uni-package.json', 'native/llvm/*', 'native/sysroot/*',
+               'native/build-tools/cmake/*', 'native/build/cmake/*']
+    exclude = []
+    for triple in NATIVE_TRIPLES:
+        if triple != OHOS_ABI_TRIPLES[abi]:
+            exclude += _triple_patterns(triple)
+    return include, exclude
 
 
 class DownloadError(Exception):
@@ -46,12 +97,18 @@ class OhosSdkDownloader:
         downloader.download_component(links['native'], 'C:/tmp/native.zip', expected_checksum=None)
     """
 
-    def __init__(self, os_type: str, os_arch: str, support_version: str, timeout: int = 30):
+    # 进程内缓存：(osType, osArch, supportVersion) -> 缓存条目
+    _sdk_list_memo: Dict[tuple, Dict] = {}
+
+    def __init__(self, os_type: str, os_arch: str, support_version: str, timeout: int = 30,
+                 cache_dir: Optional[str] = None, cache_ttl: int = SDK_LIST_CACHE_TTL):
         self.session = requests.Session()
         self.timeout = timeout
         self.os_type = os_type
         self.os_arch = os_arch
         self.support_version = support_version
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir)) if cache_dir else None
+        self.cache_ttl = cache_ttl
 
     def build_request_body(self) -> Dict:
         return {
@@ -60,24 +117,91 @@ class OhosSdkDownloader:
             'supportVersion': self.support_version,
         }
 
-    def get_sdk_list(self) -> List[Dict]:
-        """从远程获取 SDK 列表，返回 JSON 列表结构。
+    def _cache_key(self) -> tuple:
+        return self.os_type, self.os_arch, self.support_version
+
+    def _cache_path(self) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha256(json.dumps(self.build_request_body(), sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, 'sdk_list_{}.json'.format(digest))
+
+    def _load_cached_entry(self) -> Optional[Dict]:
+        entry = self._sdk_list_memo.get(self._cache_key())
+        if entry is not None:
+            return entry
+        cache_path = self._cache_path()
+        if not cache_path:
+            return None
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get('request') != self.build_request_body() or not isinstance(entry.get('data'), list):
+            return None
+        self._sdk_list_memo[self._cache_key()] = entry
+        return entry
+
+    def _store_cached_entry(self, entry: Dict) -> None:
+        self._sdk_list_memo[self._cache_key()] = entry
+        cache_path = self._cache_path()
+        if not cache_path:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print('Warning: unable to write SDK list cache {}: {}'.format(cache_path, e))
+
+    def get_sdk_list(self, force_refresh: bool = False) -> List[Dict]:
+        """获取 SDK 列表，返回 JSON 列表结构。
+
+        TTL 内直接返回缓存；过期或 force_refresh 时发送条件请求，304 时沿用缓存（POST 接口多半不支持，见模块说明）；
+        网络请求失败但存在缓存时返回缓存内容（离线模式）。返回的是缓存的副本，调用方可以随意修改。
 
         Raises:
-            DownloadError: 网络或解析错误时抛出
+            DownloadError: 网络或解析错误且没有可用缓存时抛出
         """
+        entry = self._load_cached_entry()
+        if entry is not None and not force_refresh and time.time() - entry.get('fetched_at', 0) < self.cache_ttl:
+            return copy.deepcopy(entry['data'])
+
         body = self.build_request_body()
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
         try:
-            resp = self.session.post(SDK_LIST_URL, json=body, timeout=self.timeout)
+            resp = self.session.post(SDK_LIST_URL, json=body, headers=headers, timeout=self.timeout)
+            if resp.status_code == 304 and entry is not None:
+                entry = dict(entry, fetched_at=time.time())
+                self._store_cached_entry(entry)
+                return copy.deepcopy(entry['data'])
             resp.raise_for_status()
             data = resp.json()
             if not isinstance(data, list):
                 raise DownloadError('Unexpected response format: expected a list')
-            return data
         except requests.RequestException as e:
+            if entry is not None:
+                print('Warning: 获取 SDK 列表失败，使用缓存数据: {}'.format(e))
+                return copy.deepcopy(entry['data'])
             raise DownloadError('Failed to fetch SDK list: {}'.format(e))
         except ValueError as e:
             raise DownloadError('Failed to parse JSON: {}'.format(e))
+        self._store_cached_entry({
+            'request': body,
+            'fetched_at': time.time(),
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'data': data,
+        })
+        return copy.deepcopy(data)
 
     def get_supported_versions(self) -> List[str]:
         """获取支持的 apiVersion 列表。
@@ -120,31 +244,45 @@ class OhosSdkDownloader:
                 result[path] = ComponentArchive(url=url, size=size_int, checksum=checksum, os_arch=os_arch)
         return result
 
-    def download_component_by_name(self, api_version: str, component_name: str, dest_dir: str) -> str:
+    def resolve_component(self, api_version: str, component_name: str) -> ComponentArchive:
+        """在 SDK 列表中查找指定 apiVersion 和组件名的存档信息。
+
+        Raises:
+            DownloadError: 未找到组件或缺少下载地址时抛出
+        """
+        sdk_list = self.get_sdk_list()
+        # filter by apiVersion then by path
+        matches = [e for e in sdk_list if str(e.get('apiVersion')) == str(api_version) and e.get('path') == component_name]
+        if not matches:
+            raise DownloadError('No matching component found for apiVersion={}, component={}'.format(api_version, component_name))
+        archive = self.parse_download_links(matches[:1]).get(component_name)
+        if archive is None:
+            raise DownloadError('No download URL found in archive')
+        return archive
+
+    def download_component_by_name(self, api_version: str, component_name: str, dest_dir: str,
+                                   connections: int = DOWNLOAD_CONNECTIONS, cache: Optional[ArtifactCache] = None,
+                                   progress=None) -> str:
         """高层 API：请求 SDK 列表并下载指定 apiVersion 和组件名的组件。
 
         - api_version: apiVersion 字符串（例如 '20'）用于匹配 entry['apiVersion']
         - component_name: 组件名称，如 'native'、'js'、'ets'、'previewer'、'toolchains'
         - os_type/os_arch/support_version: 请求参数
         - dest_dir: 保存目录
+        - connections: 分段并发下载的连接数，1 表示单连接下载
+        - cache: 共享构件缓存，命中 sha256 时不再访问网络下载
+        - progress: 共享的 rich 进度条，并发下载多个组件时使用
 
         Returns 保存的文件路径
         """
-        sdk_list = self.get_sdk_list()
-        # filter by apiVersion then by path
-        matches = [e for e in sdk_list if str(e.get('apiVersion')) == str(api_version) and e.get('path') == component_name]
-        if not matches:
-            raise DownloadError('No matching component found for apiVersion={}, component={}'.format(api_version, component_name))
-        entry = matches[0]
-        archive = entry.get('archive') or {}
-        url = archive.get('url')
-        checksum = ('sha256', archive.get('checksum'))
-        if not url:
-            raise DownloadError('No download URL found in archive')
+        archive = self.resolve_component(api_version, component_name)
+        url = archive.url
+        checksum = ('sha256', archive.checksum)
         file_name = os.path.basename(url.split('?')[0])
         dest_path = os.path.join(dest_dir, file_name)
         print(url)
-        saved_path = download_component(url=url, dest_path=dest_path, expected_checksum=checksum)
+        saved_path = download_component(url=url, dest_path=dest_path, expected_checksum=checksum, connections=connections, cache=cache,
+                                        progress=progress)
         return saved_path
 
     
@@ -0,0 +1,342 @@
+"""
+并行压缩引擎
+
+- ParallelGzipWriter: pigz 风格的分块并行 gzip，输出单个标准 gzip 成员
+- create_tar_gz(source_dir, archive_path): tar 流写入 ParallelGzipWriter
+- create_zip(source_dir, archive_path): 每个成员按块并行 deflate，按原顺序写入 zip；
+  指定上一次打包的 zip 及其清单时，未变化的成员直接复制已压缩的数据（增量打包）
+
+分块压缩使用 raw deflate：非末块以 Z_SYNC_FLUSH 结束并以前一块末尾 32 KiB 作为字典，
+末块以 Z_FINISH 结束，拼接结果即为一个合法的 deflate 流，标准解压工具可直接读取。
+zlib 压缩时释放 GIL，因此使用线程池即可利用多核。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import stat
+import struct
+import tarfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+BLOCK_SIZE = 1024 * 1024
+DICT_SIZE = 32 * 1024
+
+
+def _compress_block(data: bytes, level: int, zdict: Optional[bytes], last: bool) -> bytes:
+    if zdict:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class _BlockPipeline:
+    """按提交顺序输出压缩结果的线程池，限制同时在途的块数以控制内存。"""
+
+    def __init__(self, workers: int, level: int):
+        self.level = level
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_inflight = workers * 2
+        self.queue = deque()
+
+    def submit(self, data: bytes, zdict: Optional[bytes], last: bool, sink) -> None:
+        """提交一个块；sink(compressed) 在该块按顺序轮到时调用。"""
+        self.queue.append((self.executor.submit(_compress_block, data, self.level, zdict, last), sink))
+        while len(self.queue) > self.max_inflight:
+            self._pop()
+
+    def call_in_order(self, func) -> None:
+        """在之前提交的块全部输出后调用 func（用于写入头部等有序操作）。"""
+        self.queue.append((None, func))
+
+    def _pop(self) -> None:
+        future, sink = self.queue.popleft()
+        if future is None:
+            sink()
+        else:
+            sink(future.result())
+
+    def drain(self) -> None:
+        while self.queue:
+            self._pop()
+
+    def close(self) -> None:
+        self.drain()
+        self.executor.shutdown()
+
+
+class ParallelGzipWriter:
+    """可写文件对象：写入的数据按块并行压缩，输出单个 gzip 成员。"""
+
+    def __init__(self, fileobj, workers: int, level: int = 6, block_size: int = BLOCK_SIZE):
+        self.fileobj = fileobj
+        self.block_size = block_size
+        self.pipeline = _BlockPipeline(workers, level)
+        self.buffer = bytearray()
+        self.zdict = None
+        self.crc = 0
+        self.size = 0
+        self.closed = False
+        # gzip 头：无文件名，MTIME 为当前时间，OS=255(unknown)
+        self.fileobj.write(struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, 0, int(time.time()), 0, 255))
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        while len(self.buffer) > self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]), last=False)
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def _submit(self, block: bytes, last: bool) -> None:
+        self.pipeline.submit(block, self.zdict, last, self.fileobj.write)
+        self.zdict = block[-DICT_SIZE:]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._submit(bytes(self.buffer), last=True)
+        self.buffer.clear()
+        self.pipeline.close()
+        self.fileobj.write(struct.pack('<II', self.crc & 0xFFFFFFFF, self.size & 0xFFFFFFFF))
+
+
+def create_tar_gz(source_dir: str, archive_path: str, workers: int, level: int = 6) -> str:
+    """将 source_dir 的内容（成员名以 ./ 开头，与 shutil.make_archive 一致）打包为 tar.gz。"""
+    with open(archive_path, 'wb') as f:
+        writer = ParallelGzipWriter(f, workers, level)
+        try:
+            with tarfile.open(fileobj=writer, mode='w|') as t:
+                t.add(source_dir, arcname='.')
+        finally:
+            writer.close()
+    return archive_path
+
+
+def _dos_datetime(mtime: float) -> tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        t = time.localtime(315532800)
+    dos_date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dos_date, dos_time
+
+
+class _ZipWriter:
+    """最小化的 zip 写入器：先写 local header，数据写完后回填 CRC 与大小。"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.entries = []
+
+    def begin(self, name: str, mode: int, mtime: float, method: int, zip64: bool) -> dict:
+        entry = {
+            'name': name.encode('utf-8'),
+            'mode': mode,
+            'method': method,
+            'date_time': _dos_datetime(mtime),
+            'offset': self.fileobj.tell(),
+            'zip64': zip64,
+            'crc': 0,
+            'csize': 0,
+            'usize': 0,
+        }
+        self._write_local_header(entry)
+        entry['data_offset'] = self.fileobj.tell()
+        self.entries.append(entry)
+        return entry
+
+    def _write_local_header(self, entry: dict) -> None:
+        dos_date, dos_time = entry['date_time']
+        extra = b''
+        csize, usize = entry['csize'], entry['usize']
+        if entry['zip64']:
+            extra = struct.pack('<HHQQ', 0x0001, 16, usize, csize)
+            csize = usize = 0xFFFFFFFF
+        self.fileobj.write(struct.pack('<4sHHHHHIIIHH', b'PK\x03\x04', 45 if entry['zip64'] else 20, 0x800,
+                                       entry['method'], dos_time, dos_date, entry['crc'], csize, usize,
+                                       len(entry['name']), len(extra)))
+        self.fileobj.write(entry['name'])
+        self.fileobj.write(extra)
+
+    def finish(self, entry: dict) -> None:
+        """数据写完后回到 local header 回填 CRC 与大小。"""
+        end = self.fileobj.tell()
+        self.fileobj.seek(entry['offset'])
+        self._write_local_header(entry)
+        self.fileobj.seek(end)
+
+    def close(self) -> None:
+        cd_offset = self.fileobj.tell()
+        for entry in self.entries:
+            dos_date, dos_time = entry['date_time']
+            csize, usize, offset = entry['csize'], entry['usize'], entry['offset']
+            fields = []
+            if usize >= 0xFFFFFFFF:
+                fields.append(usize)
+                usize = 0xFFFFFFFF
+            if csize >= 0xFFFFFFFF:
+                fields.append(csize)
+                csize = 0xFFFFFFFF
+            if offset >= 0xFFFFFFFF:
+                fields.append(offset)
+                offset = 0xFFFFFFFF
+            extra = struct.pack('<HH', 0x0001, 8 * len(fields)) + b''.join(struct.pack('<Q', v) for v in fields) if fields else b''
+            external_attr = (entry['mode'] & 0xFFFF) << 16
+            if stat.S_ISDIR(entry['mode']):
+                external_attr |= 0x10
+            self.fileobj.write(struct.pack('<4sHHHHHHIIIHHHHHII', b'PK\x01\x02', (3 << 8) | 45, 45 if fields else 20, 0x800,
+                                           entry['method'], dos_time, dos_date, entry['crc'], csize, usize,
+                                           len(entry['name']), len(extra), 0, 0, 0, external_attr, offset))
+            self.fileobj.write(entry['name'])
+            self.fileobj.write(extra)
+        cd_end = self.fileobj.tell()
+        cd_size = cd_end - cd_offset
+        count = len(self.entries)
+        if count >= 0xFFFF or cd_offset >= 0xFFFFFFFF or cd_size >= 0xFFFFFFFF:
+            self.fileobj.write(struct.pack('<4sQHHIIQQQQ', b'PK\x06\x06', 44, (3 << 8) | 45, 45, 0, 0,
+                                           count, count, cd_size, cd_offset))
+            self.fileobj.write(struct.pack('<4sIQI', b'PK\x06\x07', 0, cd_end, 1))
+            count = min(count, 0xFFFF)
+            cd_size = min(cd_size, 0xFFFFFFFF)
+            cd_offset = min(cd_offset, 0xFFFFFFFF)
+        self.fileobj.write(struct.pack('<4sHHHHIIH', b'PK\x05\x06', 0, 0, count, count, cd_size, cd_offset, 0))
+
+
+def _iter_zip_members(source_dir: str):
+    """按 shutil.make_archive 的方式遍历目录，产出 (arcname, path, stat)。"""
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames.sort()
+        rel_dir = os.path.relpath(dirpath, source_dir)
+        if rel_dir != '.':
+            yield rel_dir.replace(os.sep, '/') + '/', dirpath, os.stat(dirpath)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if os.path.isfile(path):
+                arcname = os.path.normpath(os.path.join(rel_dir, name)).replace(os.sep, '/')
+                yield arcname, path, os.stat(path)
+
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+def load_zip_manifest(archive_path: str) -> Optional[dict]:
+    """读取 archive_path + MANIFEST_SUFFIX；清单缺失、损坏或与存档大小不符时返回 None。"""
+    try:
+        with open(archive_path + MANIFEST_SUFFIX, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('archive_size') != os.path.getsize(archive_path) or not isinstance(manifest.get('entries'), dict):
+            return None
+        return manifest
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _file_sha256(path: str, block_size: int = BLOCK_SIZE) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def create_zip(source_dir: str, archive_path: str, workers: int, level: int = 6, block_size: int = BLOCK_SIZE,
+               baseline: Optional[str] = None) -> dict:
+    """将 source_dir 的内容打包为 zip，成员数据按块并行 deflate 后按顺序写入。
+
+    baseline 为上一次打包的 zip（需存在同名清单）：大小与 mtime 一致，或大小一致且 sha256 一致的成员
+    直接从 baseline 复制已压缩数据，其余成员重新压缩。
+
+    Returns 本次打包的清单（每个成员的大小、mtime、sha256、CRC、压缩数据偏移），
+    调用方应将其保存为 archive_path + MANIFEST_SUFFIX；reused/compressed 为复用与重新压缩的成员数。
+    """
+    base = load_zip_manifest(baseline) if baseline else None
+    base_entries = base['entries'] if base else {}
+    entries = {}
+    reused = 0
+    compressed = 0
+    pipeline = _BlockPipeline(workers, level)
+    base_f = open(baseline, 'rb') if base else None
+    with open(archive_path, 'wb') as f:
+        writer = _ZipWriter(f)
+
+        def sink(data):
+            f.write(data)
+            writer.entries[-1]['csize'] += len(data)
+
+        def finish(arcname, record, crc, size):
+            entry = writer.entries[-1]
+            entry['crc'] = crc & 0xFFFFFFFF
+            entry['usize'] = size
+            writer.finish(entry)
+            record.update(crc=entry['crc'], csize=entry['csize'], data_offset=entry['data_offset'])
+            entries[arcname] = record
+
+        def copy_raw(old):
+            # 从 baseline 复制已压缩的数据
+            base_f.seek(old['data_offset'])
+            remaining = old['csize']
+            while remaining > 0:
+                data = base_f.read(min(block_size, remaining))
+                if not data:
+                    raise OSError('Unexpected end of baseline archive {}'.format(baseline))
+                sink(data)
+                remaining -= len(data)
+
+        try:
+            for arcname, path, st in _iter_zip_members(source_dir):
+                if arcname.endswith('/'):
+                    pipeline.call_in_order(lambda a=arcname, s=st: writer.begin(a, s.st_mode, s.st_mtime, 0, False))
+                    continue
+                # 大小接近 4 GiB 的成员预留 zip64 扩展字段
+                zip64 = st.st_size >= 0xFFFFFFFF - 0xFFFF
+                record = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+                old = base_entries.get(arcname)
+                if old and old.get('size') == st.st_size:
+                    if old.get('mtime_ns') == st.st_mtime_ns:
+                        record['sha256'] = old['sha256']
+                    else:
+                        record['sha256'] = _file_sha256(path, block_size)
+                    if record['sha256'] == old.get('sha256'):
+                        reused += 1
+                        pipeline.call_in_order(lambda a=arcname, s=st, z=zip64: writer.begin(a, s.st_mode, s.st_mtime, 8, z))
+                        pipeline.call_in_order(lambda o=old: copy_raw(o))
+                        pipeline.call_in_order(lambda a=arcname, r=record, o=old: finish(a, r, o['crc'], o['size']))
+                        continue
+                compressed += 1
+                pipeline.call_in_order(lambda a=arcname, s=st, z=zip64: writer.begin(a, s.st_mode, s.st_mtime, 8, z))
+                crc = 0
+                size = 0
+                zdict = None
+                h = hashlib.sha256()
+                with open(path, 'rb') as src:
+                    block = src.read(block_size)
+                    while True:
+                        next_block = src.read(block_size)
+                        last = not next_block
+                        crc = zlib.crc32(block, crc)
+                        h.update(block)
+                        size += len(block)
+                        pipeline.submit(block, zdict, last, sink)
+                        if last:
+                            break
+                        zdict = block[-DICT_SIZE:]
+                        block = next_block
+                record['sha256'] = h.hexdigest()
+                pipeline.call_in_order(lambda a=arcname, r=record, c=crc, n=size: finish(a, r, c, n))
+            pipeline.drain()
+            writer.close()
+            archive_size = f.tell()
+        finally:
+            pipeline.close()
+            if base_f:
+                base_f.close()
+    return {'archive_size': archive_size, 'entries': entries, 'reused': reused, 'compressed': compressed}
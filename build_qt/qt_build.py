@@ -1,10 +1,13 @@
 import platform
 import os
 import subprocess
-from .utils import create_archive
+from .utils import TRASH_DIR_NAME, create_archive, remove_tree
 from .config import Config
+from .qt_repo import QtRepo
 import shutil
 import datetime
+import time
+import glob
 
 class QtBuild:
     def __init__(self, source_dir: str, config: Config):
@@ -13,8 +16,6 @@ class QtBuild:
         self.build_dir = os.path.join(self.source_dir, 'build', config.build_type())
         self.system = platform.system()
         self.make_tools = 'mingw32-make' if self.system == 'Windows' else 'make'
-        self.rmdir_cmd = ['rmdir', '/S', '/Q'] if self.system == 'Windows' else ['rm', '-rf']
-        self.rmdir_cmd += self.build_dir
         self.supported_systems = ['Windows', 'Linux', 'Darwin']
         if self.system not in self.supported_systems:
             raise EnvironmentError('Unsupported system: {}'.format(self.system))
@@ -23,7 +24,7 @@ class QtBuild:
     
     def configure(self):
         configure_script = os.path.join(self.source_dir, 'configure.bat' if self.system == 'Windows' else 'configure')
-        cmd = [configure_script] + self.config.build_configure_options()
+        cmd = [configure_script] + self.config.build_configure_options(self.source_dir)
         print('配置命令：', ' '.join(cmd))
         result = subprocess.run(cmd, cwd=self.build_dir, check=True)
         if result.returncode == 0:
@@ -61,32 +62,60 @@ class QtBuild:
     def clean(self):
         if os.path.exists(self.build_dir):
             print('正在删除构建目录: {}'.format(self.build_dir))
-            result = subprocess.run(self.rmdir_cmd, check=True)
-            if result.returncode == 0:
+            try:
+                # 构建目录改名后立即返回，文件在后台线程中删除；回收目录放在源码树之外（工作目录下）
+                trash_dir = os.path.join(os.path.dirname(os.path.abspath(self.source_dir)), TRASH_DIR_NAME)
+                remove_tree(self.build_dir, instant=True, trash_dir=trash_dir)
                 print('构建目录已删除')
-            else:
-                print('删除构建目录失败')
+            except OSError as e:
+                print('删除构建目录失败: {}'.format(e))
         else:
             print('构建目录不存在，无需删除')
 
-    def pack(self):
+    def package_basename(self):
+        """产物包名中时间戳之前的部分，同一配置的历次打包共用。"""
+        return 'Qt{}_OHOS{}_{}_{}'.format(
+            self.config.qt_version(),
+            self.config.ohos_version(),
+            self.config.build_ohos_abi(),
+            self.system.lower()
+        )
+
+    def find_previous_package(self, suffix):
+        """查找同一配置最近一次带清单的产物包，用作增量打包的基线。"""
+        from .parallel_pack import MANIFEST_SUFFIX
+        pattern = os.path.join(glob.escape(self.config.get_output_path()), '{}_*.{}'.format(glob.escape(self.package_basename()), suffix))
+        candidates = [p for p in glob.glob(pattern) if os.path.isfile(p + MANIFEST_SUFFIX)]
+        if not candidates:
+            return None
+        return max(candidates, key=os.path.getmtime)
+
+    def pack(self, delta_base=None):
+        """打包安装前缀；delta_base 为基线（产物包、目录或 zip 清单）时额外生成差量包。"""
         prefix = self.config.build_prefix()
         if not prefix:
             raise ValueError('安装路径未设置，无法打包')
             
         timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M")
     
-        suffix = 'zip' if self.system == 'Windows' else 'tar.gz'
-        package_name = 'Qt{}_OHOS{}_{}_{}_{}.{}'.format(
-            self.config.qt_version(),
-            self.config.ohos_version(),
-            self.config.build_ohos_abi(),
-            self.system.lower(),
-            timestamp,
-            suffix
-        )
+        suffix = self.config.pack_format()
+        package_name = '{}_{}.{}'.format(self.package_basename(), timestamp, suffix)
         package_name = os.path.join(self.config.get_output_path(), package_name)
-        create_archive(prefix, package_name, _format=suffix)
+        baseline = None
+        if suffix == 'zip' and self.config.pack_incremental():
+            baseline = self.find_previous_package(suffix)
+            if baseline:
+                print('增量打包基线: {}'.format(baseline))
+        create_archive(prefix, package_name, _format=suffix, workers=self.config.build_jobs(),
+                       level=self.config.pack_level(), long_distance=self.config.pack_zstd_long(),
+                       baseline=baseline)
+        if delta_base:
+            from .delta_pack import DELTA_SUFFIX, create_delta
+            delta_name = package_name[:-len(suffix) - 1] + DELTA_SUFFIX
+            print('生成差量包: {}（基线: {}）'.format(delta_name, delta_base))
+            meta = create_delta(prefix, delta_base, delta_name, workers=self.config.build_jobs())
+            print('差量包: 补丁 {} 个，完整文件 {} 个，删除 {} 个'.format(
+                len(meta['patches']), len(meta['files']), len(meta['removed'])))
 
     def print_build_info(self):
         print('构建信息:')
@@ -99,4 +128,7 @@ class QtBuild:
         print('  OHOS ABI: {}'.format(self.config.build_ohos_abi()))
         print('  构建类型: {}'.format(self.config.build_type()))
         print('  使用的 make 工具: {}'.format(self.make_tools))
+        started = time.perf_counter()
+        fingerprint = QtRepo(self.source_dir).fingerprint(self.config.tag())
+        print('  源码指纹: {} ({:.1f}ms)'.format(fingerprint or '未知（源码未初始化）', (time.perf_counter() - started) * 1000))
         print('  支持的系统: {}'.format(', '.join(self.supported_systems)))
\ No newline at end of file
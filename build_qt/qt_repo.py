@@ -5,25 +5,197 @@
 功能：
 - 克隆（指定分支或 tag）
 - 支持克隆深度（depth）
-- 子模块初始化与更新（可递归、可浅克隆）
+- 子模块初始化与并行更新（可递归、浅克隆，按 -skip 列表跳过不需要的模块）
 - 切换/创建/删除分支
 - fetch/pull/reset_hard
 - 设置/查询远端 URL
+- 可选的本地镜像缓存（GitMirrorCache）：主仓库、子模块与补丁仓库均从本地裸镜像克隆
+- git worktree：多个 Qt tag/补丁版本的源码树共享同一对象库（含子模块）
 
 设计要点：
 - 使用 GitPython (git CLI 作为后端)，行为与系统 git 一致
 - 对于大型仓库（如 Qt），默认尽量使用浅克隆并在需要时按需更新子模块
 """
 from typing import Optional, List
+import filecmp
+import hashlib
+import json
 import os
 import shutil
+import struct
 import subprocess
-from git import Repo, GitCommandError
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from git import Repo
+from .git_mirror import GitMirrorCache, GitMirrorError
+from .utils import remove_tree
+
+# 记录上次打过补丁的模块，位于主仓库（或工作树）的 git 目录下
+PATCH_STATE_FILE = 'build-qt-patched.json'
+# 打补丁后的快照引用：refs/build-qt/snapshots/<Qt tag>/<补丁仓库提交>，主仓库与各子模块各一个
+SNAPSHOT_REF_PREFIX = 'refs/build-qt/snapshots/'
+SNAPSHOT_IDENTITY = {
+    'GIT_AUTHOR_NAME': 'build-qt-ohos', 'GIT_AUTHOR_EMAIL': 'build-qt-ohos@localhost',
+    'GIT_COMMITTER_NAME': 'build-qt-ohos', 'GIT_COMMITTER_EMAIL': 'build-qt-ohos@localhost',
+}
+
+
+# 未指定 Qt tag 时使用的补丁目录
+DEFAULT_PATCH_TAG = 'v5.15.12'
+# 主仓库中不属于源码的目录（QtBuild 的构建目录），检查改动与 git clean 时保留
+KEEP_DIRS = ['build']
+
 
 class QtRepoError(Exception):
     pass
 
 
+def _patch_dir_name(tag: Optional[str]) -> str:
+    """Qt tag 对应的补丁目录名，例如 v5.15.12-lts-lgpl -> v5.15.12。"""
+    return tag.replace('-lts-lgpl', '') if tag else DEFAULT_PATCH_TAG
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _git_dir(work_path: str) -> Optional[str]:
+    """工作目录对应的 git 目录；.git 为文件（子模块、工作树）时按其中的 gitdir: 解析。"""
+    dot_git = os.path.join(work_path, '.git')
+    if os.path.isdir(dot_git):
+        return dot_git
+    content = _read_text(dot_git)
+    if not content or not content.startswith('gitdir:'):
+        return None
+    git_dir = content[len('gitdir:'):].strip()
+    return os.path.normpath(os.path.join(work_path, git_dir))
+
+
+def _resolve_ref(git_dir: str, ref: str, depth: int = 0) -> Optional[str]:
+    """不调用 git，按松散引用、packed-refs 的顺序解析引用（工作树的共享目录由 commondir 指定）。"""
+    common = _read_text(os.path.join(git_dir, 'commondir'))
+    common_dir = os.path.normpath(os.path.join(git_dir, common)) if common else git_dir
+    for base in (git_dir, common_dir):
+        value = _read_text(os.path.join(base, ref))
+        if value:
+            if value.startswith('ref:') and depth < 5:
+                return _resolve_ref(git_dir, value[4:].strip(), depth + 1)
+            return value
+    packed = _read_text(os.path.join(common_dir, 'packed-refs')) or ''
+    for line in packed.splitlines():
+        if line and line[0] not in '#^':
+            sha, _, name = line.partition(' ')
+            if name == ref:
+                return sha
+    return None
+
+
+def _read_head(work_path: str) -> Optional[str]:
+    git_dir = _git_dir(work_path)
+    if not git_dir:
+        return None
+    head = _read_text(os.path.join(git_dir, 'HEAD'))
+    if head and head.startswith('ref:'):
+        return _resolve_ref(git_dir, head[4:].strip())
+    return head
+
+
+def _read_gitlinks(index_path: str) -> dict:
+    """直接解析 git 索引文件（版本 2-4），返回其中 gitlink（mode 160000）条目的 路径 -> 提交。
+
+    不支持的格式（如 split index）抛出 ValueError。
+    """
+    with open(index_path, 'rb') as f:
+        data = f.read()
+    if data[:4] != b'DIRC':
+        raise ValueError('不是 git 索引文件')
+    version, count = struct.unpack('>II', data[4:12])
+    if version not in (2, 3, 4):
+        raise ValueError('不支持的索引版本 {}'.format(version))
+    links = {}
+    offset = 12
+    previous = b''
+    for _ in range(count):
+        mode = struct.unpack('>I', data[offset + 24:offset + 28])[0]
+        sha = data[offset + 40:offset + 60].hex()
+        flags = struct.unpack('>H', data[offset + 60:offset + 62])[0]
+        pos = offset + 62 + (2 if version >= 3 and flags & 0x4000 else 0)
+        if version == 4:
+            # 路径前缀压缩：先是需从上一路径末尾去掉的字节数（git 的 offset varint），再是以 NUL 结尾的后缀
+            byte = data[pos]
+            pos += 1
+            strip = byte & 0x7f
+            while byte & 0x80:
+                byte = data[pos]
+                pos += 1
+                strip = ((strip + 1) << 7) | (byte & 0x7f)
+            end = data.index(b'\0', pos)
+            name = previous[:len(previous) - strip] + data[pos:end]
+            offset = end + 1
+        else:
+            end = data.index(b'\0', pos)
+            name = data[pos:end]
+            offset += (end - offset + 8) & ~7
+        previous = name
+        if mode & 0o170000 == 0o160000:
+            links[name.decode('utf-8', errors='surrogateescape')] = sha
+    if data[offset:offset + 4] == b'link':
+        raise ValueError('不支持 split index')
+    return links
+
+
+def _sync_tree(src: str, dst: str, keep: Optional[set] = None) -> int:
+    """把 src 目录同步到 dst，只写入内容不同的文件并删除 dst 中多余的文件，返回改写/删除的文件数。
+
+    写入的文件使用当前时间作为 mtime（不沿用 src 的 mtime），保证依赖它的目标会被重新编译；
+    内容相同的文件不写入，mtime 不变。keep 为 dst 顶层需要保留的条目。
+    """
+    changed = 0
+    expected = set()
+    for root, dirs, files in os.walk(src):
+        rel_root = os.path.relpath(root, src)
+        target_root = dst if rel_root == '.' else os.path.join(dst, rel_root)
+        if os.path.isfile(target_root) or os.path.islink(target_root):
+            os.remove(target_root)
+        os.makedirs(target_root, exist_ok=True)
+        expected.add(os.path.normpath(target_root))
+        for name in files:
+            source = os.path.join(root, name)
+            target = os.path.join(target_root, name)
+            expected.add(os.path.normpath(target))
+            if os.path.isdir(target) and not os.path.islink(target):
+                remove_tree(target)
+            elif os.path.isfile(target) and os.path.getsize(target) == os.path.getsize(source) \
+                    and filecmp.cmp(source, target, shallow=False):
+                continue
+            shutil.copyfile(source, target, follow_symlinks=False)
+            shutil.copymode(source, target)
+            changed += 1
+    keep = {os.path.normpath(os.path.join(dst, name)) for name in (keep or ())}
+    for root, dirs, files in os.walk(dst, topdown=True):
+        for name in list(dirs):
+            path = os.path.normpath(os.path.join(root, name))
+            if path in keep:
+                dirs.remove(name)
+            elif path not in expected:
+                remove_tree(path)
+                dirs.remove(name)
+                changed += 1
+        for name in files:
+            path = os.path.normpath(os.path.join(root, name))
+            if path not in expected and path not in keep:
+                os.remove(path)
+                changed += 1
+    return changed
+
+
 class QtRepo:
     """用 GitPython 封装的仓库管理类。
 
@@ -37,45 +209,200 @@ class QtRepo:
         self.repo = None
         self.patch_repo = None
 
-        if os.path.isdir(os.path.join(self.repo_path, '.git')):
+        if os.path.exists(os.path.join(self.repo_path, '.git')):
             try:
                 self.repo = Repo(self.repo_path)
             except Exception as e:
                 raise QtRepoError('打开仓库失败: {}'.format(e))
 
     # ---------- 克隆相关 ----------
-    def clone(self, url: str, depth: int = 0, branch: Optional[str] = None) -> None:
+    @staticmethod
+    def _git_exe() -> str:
+        git_exe = shutil.which('git')
+        if not git_exe:
+            raise QtRepoError('系统中未找到 git 可执行文件')
+        return git_exe
+
+    def _git_output(self, *args) -> str:
+        return subprocess.run([self._git_exe()] + list(args), check=True, capture_output=True, text=True).stdout
+
+    def _read_gitmodules(self, repo_path: str) -> dict:
+        """解析 .gitmodules，返回 子模块名 -> {'path', 'url', 'update', ...}。"""
+        if not os.path.isfile(os.path.join(repo_path, '.gitmodules')):
+            return {}
+        try:
+            out = self._git_output('config', '-f', os.path.join(repo_path, '.gitmodules'), '--get-regexp', r'^submodule\.')
+        except subprocess.CalledProcessError:
+            return {}
+        modules = {}
+        for line in out.splitlines():
+            key, _, value = line.partition(' ')
+            name, _, var = key[len('submodule.'):].rpartition('.')
+            modules.setdefault(name, {})[var] = value
+        return modules
+
+    @staticmethod
+    def _mirror_url(path: str, transport: bool) -> str:
+        # 浅克隆/部分克隆需要走 file:// 传输；完整克隆使用本地路径，对象以硬链接共享
+        if transport:
+            return 'file://' + path.replace(os.sep, '/') if path.startswith('/') else 'file:///' + path.replace(os.sep, '/')
+        return path
+
+    def _deactivate_submodules(self, repo_path: str, modules: dict) -> None:
+        """把跳过的子模块标记为 inactive，之后不带路径的 submodule init/update/foreach 不再处理它们。
+
+        除 submodule.<name>.active=false 外，还设置 submodule.active 路径规则排除这些子模块，
+        否则不带路径的 git submodule init 会把它们重新激活。
+        """
+        if not modules:
+            return
+        git_exe = self._git_exe()
+        subprocess.run([git_exe, '-C', repo_path, 'config', '--unset-all', 'submodule.active'], capture_output=True)
+        subprocess.run([git_exe, '-C', repo_path, 'config', '--add', 'submodule.active', '.'], check=True)
+        for name, module in modules.items():
+            subprocess.run([git_exe, '-C', repo_path, 'config', 'submodule.{}.active'.format(name), 'false'], check=True)
+            if module.get('path'):
+                subprocess.run([git_exe, '-C', repo_path, 'config', '--add', 'submodule.active',
+                                ':(exclude){}'.format(module['path'])], check=True)
+
+    def _submodule_worker(self, repo_path: str, name: str, module: dict,
+                          mirror: Optional[GitMirrorCache], clone_filter: Optional[str]) -> float:
+        """检出单个子模块，返回耗时（秒）。嵌套子模块在同一线程内串行处理。
+
+        未指定 clone_filter 时按 depth=1 浅克隆；指定时改为部分克隆（保留完整历史，按需下载对象）。
+        """
+        started = time.monotonic()
+        git_exe = self._git_exe()
+        url = self._git_output('-C', repo_path, 'config', '--get', 'submodule.{}.url'.format(name)).strip()
+        cmd = [git_exe, '-c', 'protocol.file.allow=always']
+        if mirror is not None:
+            # 仅对本次命令把 URL 指向镜像，不改写 .git/config，多个线程互不干扰
+            cmd += ['-c', 'submodule.{}.url={}'.format(name, self._mirror_url(mirror.update(url), True))]
+        cmd += ['-C', repo_path, 'submodule', 'update', '--init']
+        cmd += ['--filter', clone_filter] if clone_filter else ['--depth', '1']
+        cmd += ['--', module['path']]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise QtRepoError((result.stderr or result.stdout).strip())
+        sub_path = os.path.join(repo_path, module['path'])
+        if mirror is not None:
+            subprocess.run([git_exe, '-C', sub_path, 'remote', 'set-url', 'origin', url], check=True)
+        self.update_submodules(sub_path, jobs=1, mirror=mirror, clone_filter=clone_filter)
+        return time.monotonic() - started
+
+    def update_submodules(self, repo_path: Optional[str] = None, jobs: int = 4,
+                          skip: Optional[List[str]] = None, mirror: Optional[GitMirrorCache] = None,
+                          clone_filter: Optional[str] = None) -> None:
+        """初始化并并行检出子模块（默认浅克隆，depth=1）。
+
+        repo_path: 仓库目录，默认主仓库
+        jobs: 同时检出的子模块数
+        skip: 不初始化、不下载的子模块（按名称或路径匹配，即 configure.json 中该 tag 的 -skip 列表）
+        mirror: 本地镜像缓存；指定时子模块从镜像检出，完成后 origin 仍指向远端
+        clone_filter: 部分克隆过滤器（如 blob:none），替代 depth=1
+        """
+        repo_path = repo_path or self.repo_path
+        modules = self._read_gitmodules(repo_path)
+        skip = set(skip or [])
+        selected = {name: module for name, module in modules.items()
+                    if module.get('update') != 'none' and 'path' in module
+                    and name not in skip and module['path'] not in skip}
+        skipped = sorted(name for name in modules if name not in selected)
+        if skipped and repo_path == self.repo_path:
+            print('跳过子模块: {}'.format(', '.join(skipped)))
+        self._deactivate_submodules(repo_path, {name: modules[name] for name in skipped})
+        if not selected:
+            return
+        try:
+            subprocess.run([self._git_exe(), '-C', repo_path, 'submodule', 'init', '--']
+                           + [module['path'] for module in selected.values()], check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            raise QtRepoError('子模块初始化失败: {}'.format(e.stderr.decode(errors='replace').strip() or e))
+
+        total = len(selected)
+        failed = {}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, total))) as executor:
+            futures = {executor.submit(self._submodule_worker, repo_path, name, module, mirror, clone_filter): name
+                       for name, module in selected.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                name = futures[future]
+                try:
+                    elapsed = future.result()
+                    print('[{}/{}] 子模块 {} 完成 ({:.1f}s)'.format(done, total, name, elapsed))
+                except (QtRepoError, GitMirrorError, subprocess.CalledProcessError) as e:
+                    failed[name] = e
+                    print('[{}/{}] 子模块 {} 失败: {}'.format(done, total, name, e))
+        if failed:
+            raise QtRepoError('子模块检出失败: {}'.format(', '.join(sorted(failed))))
+        if repo_path == self.repo_path:
+            print('子模块检出完成: {} 个，耗时 {:.1f}s'.format(total, time.monotonic() - started))
+
+    def _clone_from_mirror(self, url: str, dest: str, depth: int, branch: Optional[str], mirror: GitMirrorCache,
+                           clone_filter: Optional[str] = None, no_checkout: bool = False) -> None:
+        """从本地镜像克隆 url 到 dest，并把 origin 设回远端 URL。"""
+        git_exe = self._git_exe()
+        mirror_path = mirror.update(url)
+        cmd = [git_exe, 'clone', '--single-branch'] + (['--no-checkout'] if no_checkout else [])
+        if depth and depth > 0:
+            cmd += ['--depth', str(depth)]
+        if clone_filter:
+            cmd += ['--filter', clone_filter]
+        if branch:
+            cmd += ['--branch', branch]
+        cmd += [self._mirror_url(mirror_path, bool(depth and depth > 0 or clone_filter)), dest]
+        print('Cloning {} to {} from mirror {}'.format(url, dest, mirror_path))
+        subprocess.run(cmd, check=True)
+        subprocess.run([git_exe, '-C', dest, 'remote', 'set-url', 'origin', url], check=True)
+
+    def clone(self, url: str, depth: int = 0, branch: Optional[str] = None, mirror: Optional[GitMirrorCache] = None,
+              jobs: int = 4, skip: Optional[List[str]] = None, clone_filter: Optional[str] = None,
+              no_checkout: bool = False) -> None:
         """克隆仓库。
 
-        depth: 0 表示完整克隆；>0 表示使用 --depth
+        depth: 0 表示完整克隆；>0 表示使用 --depth（仅主仓库，子模块始终为浅克隆）
         branch: 若指定，传递给 git clone 的 --branch
+        mirror: 本地镜像缓存；指定时主仓库与各子模块先更新镜像，再从镜像克隆（不再直接访问远端）
+        jobs: 并行检出的子模块数
+        skip: 不下载的子模块列表；这些子模块同时被标记为 inactive
+        clone_filter: 部分克隆过滤器（如 blob:none），主仓库与子模块均按需下载对象；子模块不再限制 depth
+        no_checkout: 只克隆对象库，不检出工作区与子模块（worktrees 模式下主仓库仅作为 add_worktree 的共享对象库）
         """
         if os.path.exists(self.repo_path) and os.listdir(self.repo_path):
             print('目录已存在: {}, 跳过克隆'.format(self.repo_path))
             self.repo = Repo(self.repo_path)
             return 
 
-        git_exe = shutil.which('git')
-        if not git_exe:
-            raise QtRepoError('系统中未找到 git 可执行文件')
+        git_exe = self._git_exe()
 
-        cmd = [git_exe, 'clone', '--recurse-submodules', '--single-branch', '--shallow-submodules']
-        if depth and depth > 0:
-            cmd += ['--depth', str(depth)]
-        if branch:
-            cmd += ['--branch', branch]
-        cmd += [url, self.repo_path]
+        if mirror is not None:
+            try:
+                self._clone_from_mirror(url, self.repo_path, depth, branch, mirror, clone_filter, no_checkout)
+            except (subprocess.CalledProcessError, GitMirrorError) as e:
+                raise QtRepoError('从镜像克隆失败: {}'.format(e))
+        else:
+            cmd = [git_exe, 'clone', '--single-branch'] + (['--no-checkout'] if no_checkout else [])
+            if depth and depth > 0:
+                cmd += ['--depth', str(depth)]
+            if clone_filter:
+                cmd += ['--filter', clone_filter]
+            if branch:
+                cmd += ['--branch', branch]
+            cmd += [url, self.repo_path]
+            try:
+                print('Cloning {} to {} with depth={}'.format(url, self.repo_path, depth))
+                subprocess.run(cmd, check=True)
+            except subprocess.CalledProcessError as e:
+                raise QtRepoError('git clone 失败: {}'.format(e))
 
-        try:
-            print('Cloning {} to {} with depth={}'.format(url, self.repo_path, depth))
-            subprocess.run(cmd, check=True)
-            self.repo = Repo(self.repo_path)
-            print('Clone succeeded. Remote URL: {}'.format(self.repo.remotes[self.remote_name].url))
-        except subprocess.CalledProcessError as e:
-            raise QtRepoError('git clone 失败: {}'.format(e))
+        self.repo = Repo(self.repo_path)
+        if not no_checkout:
+            self.update_submodules(jobs=jobs, skip=skip, mirror=mirror, clone_filter=clone_filter)
+        print('Clone succeeded. Remote URL: {}'.format(self.repo.remotes[self.remote_name].url))
         print('Local branches: {}'.format(self.list_branches(local=True)))
 
-    def clone_patch_repo(self, url: str, depth: int = 0, branch: Optional[str] = None) -> None:
+    def clone_patch_repo(self, url: str, depth: int = 0, branch: Optional[str] = None,
+                         mirror: Optional[GitMirrorCache] = None) -> None:
         """克隆补丁仓库，位于主仓库同级目录的 repo_path + '_patch' 目录下。"""
         patch_path = self.repo_path + '_patch'
         if os.path.exists(patch_path) and os.listdir(patch_path):
@@ -83,9 +410,15 @@ class QtRepo:
             self.patch_repo = Repo(patch_path)
             return
 
-        git_exe = shutil.which('git')
-        if not git_exe:
-            raise QtRepoError('系统中未找到 git 可执行文件')
+        git_exe = self._git_exe()
+
+        if mirror is not None:
+            try:
+                self._clone_from_mirror(url, patch_path, depth, branch, mirror)
+                self.patch_repo = Repo(patch_path)
+            except (subprocess.CalledProcessError, GitMirrorError) as e:
+                raise QtRepoError('从镜像克隆补丁仓库失败: {}'.format(e))
+            return
 
         cmd = [git_exe, 'clone', '--single-branch']
         if depth and depth > 0:
@@ -102,30 +435,280 @@ class QtRepo:
         except subprocess.CalledProcessError as e:
             raise QtRepoError('git clone 补丁仓库失败: {}'.format(e))
     
-    def apply_patches(self, tag_dir: Optional[str] = None) -> None:
+    def _patch_state_path(self) -> str:
+        # 工作树（git worktree）的 .git 是文件，记录放在各自的 git 目录下
+        path = self._git_output('-C', self.repo_path, 'rev-parse', '--git-path', PATCH_STATE_FILE).strip()
+        return path if os.path.isabs(path) else os.path.join(self.repo_path, path)
+
+    def _load_patch_state(self) -> dict:
+        """上次 apply_patches 的记录：modules 为修改过的模块目录（'.' 表示主仓库），added 为各模块补丁新增的文件。"""
+        try:
+            with open(self._patch_state_path(), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {'modules': [], 'added': {}}
+        return {'modules': list(state.get('modules', [])), 'added': dict(state.get('added', {}))}
+
+    def _save_patch_state(self, modules: List[str], added: dict) -> None:
+        with open(self._patch_state_path(), 'w', encoding='utf-8') as f:
+            json.dump({'modules': sorted(modules), 'added': {m: sorted(p) for m, p in added.items() if p}},
+                      f, ensure_ascii=False, indent=2)
+
+    def _patch_added_files(self, module_path: str, patch_path: Optional[str]) -> List[str]:
+        """补丁新增的文件（git apply --summary 中的 create mode 行）。"""
+        if patch_path is None:
+            return []
+        out = self._git_output('-C', module_path, 'apply', '--summary', patch_path)
+        return [line.split(None, 3)[3] for line in out.splitlines()
+                if line.strip().startswith('create mode') and len(line.split(None, 3)) == 4]
+
+    def _apply_module_patch(self, module: str, patch_path: Optional[str]) -> tuple:
+        """重置并清理单个模块后应用其补丁，返回 (耗时, 改写文件数, 新增文件)。patch_path 为 None 时只重置。"""
+        started = time.monotonic()
+        git_exe = self._git_exe()
+        module_path = self.repo_path if module == '.' else os.path.join(self.repo_path, module)
+        if not os.path.exists(os.path.join(module_path, '.git')):
+            if patch_path is None:
+                return time.monotonic() - started, None, []
+            raise QtRepoError('模块 {} 未检出'.format(module))
+        cmds = [['reset', '--hard', '-q'], self._clean_args(module)]
+        if patch_path is not None:
+            cmds.append(['apply', patch_path] if module == '.' else ['apply', patch_path, '--whitespace=nowarn'])
+        for args in cmds:
+            result = subprocess.run([git_exe, '-C', module_path] + args, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise QtRepoError('git {} 失败: {}'.format(args[0], (result.stderr or result.stdout).strip()))
+        return time.monotonic() - started, None, self._patch_added_files(module_path, patch_path)
+
+    @contextmanager
+    def _scratch_index(self, module_path: str, copy_index: bool = True):
+        """在模块 .git 目录下创建临时索引，产出在该索引上执行 git 子命令的函数 git(*args, stdin=None, index=True, check=True)。
+
+        copy_index 为 True 时临时索引复制自当前索引，保留 stat 信息；index=False 的命令使用实际索引。
+        """
+        git_exe = self._git_exe()
+        index_path = self._git_output('-C', module_path, 'rev-parse', '--git-path', 'index').strip()
+        if not os.path.isabs(index_path):
+            index_path = os.path.join(module_path, index_path)
+        fd, scratch_index = tempfile.mkstemp(prefix=os.path.basename(index_path) + '.build-qt-',
+                                             dir=os.path.dirname(index_path))
+        os.close(fd)
+        if copy_index and os.path.isfile(index_path):
+            shutil.copyfile(index_path, scratch_index)
+        else:
+            os.remove(scratch_index)
+        env = dict(os.environ, GIT_INDEX_FILE=scratch_index, **SNAPSHOT_IDENTITY)
+
+        def git(*args, stdin=None, index=True, check=True) -> str:
+            result = subprocess.run([git_exe, '--literal-pathspecs', '-C', module_path] + list(args),
+                                    env=env if index else None, input=stdin, capture_output=True)
+            if check and result.returncode != 0:
+                raise QtRepoError('git {} 失败: {}'.format(args[0], result.stderr.decode(errors='replace').strip()))
+            return result.stdout.decode('utf-8', errors='surrogateescape')
+
+        try:
+            yield git
+        finally:
+            if os.path.exists(scratch_index):
+                os.remove(scratch_index)
+
+    def _reapply_module_patch(self, module: str, patch_path: Optional[str], stale_added: List[str],
+                              snapshot: Optional[str] = None) -> tuple:
+        """在临时索引中计算打补丁后的结果，只改写内容与之不同的文件，返回 (耗时, 改写文件数, 新增文件)。
+
+        临时索引由当前索引复制而来并 read-tree --reset HEAD，未改动文件的 stat 信息得以保留，
+        对比工作区时只需重新计算补丁涉及文件与被修改文件的哈希。内容相同的文件不会被写入，mtime 不变。
+        不执行 git clean：只删除补丁删除的文件与上次补丁新增、本次不再新增的文件（stale_added）。
+        snapshot: 快照提交；指定时目标内容取自快照，完成后 HEAD 移到快照的父提交（打补丁前的提交）
+        """
+        started = time.monotonic()
+        module_path = self.repo_path if module == '.' else os.path.join(self.repo_path, module)
+        if not os.path.exists(os.path.join(module_path, '.git')):
+            if patch_path is None and snapshot is None:
+                return time.monotonic() - started, 0, []
+            raise QtRepoError('模块 {} 未检出'.format(module))
+
+        base = snapshot + '^' if snapshot else 'HEAD'
+        with self._scratch_index(module_path) as git:
+            git('read-tree', '--reset', snapshot or 'HEAD')
+            if patch_path is not None:
+                git('apply', '--cached', patch_path, *([] if module == '.' else ['--whitespace=nowarn']))
+            git('update-index', '-q', '--refresh', check=False)
+            changed = [p for p in git('diff-files', '--name-only', '-z', '--ignore-submodules').split('\0') if p]
+            added = [p for p in git('diff-index', '--cached', '--name-only', '-z', '--diff-filter=A',
+                                    '--ignore-submodules', base).split('\0') if p]
+            removed = [p for p in git('diff-index', '--cached', '--name-only', '-z', '--diff-filter=D',
+                                      '--ignore-submodules', 'HEAD').split('\0') if p]
+            if stale_added:
+                tracked = set(p for p in git('ls-files', '-z', '--', *stale_added).split('\0') if p)
+                removed += [p for p in stale_added if p not in tracked]
+            if changed:
+                git('checkout-index', '-f', '-z', '--stdin',
+                    stdin=('\0'.join(changed) + '\0').encode('utf-8', errors='surrogateescape'))
+            deleted = 0
+            for rel in removed:
+                target = os.path.join(module_path, rel)
+                if os.path.isfile(target) or os.path.islink(target):
+                    os.remove(target)
+                    deleted += 1
+            # 实际索引回到 HEAD（与 git apply 不带 --cached 时一致），保留未改动文件的 stat 信息
+            git('reset', '-q', base, index=False, check=snapshot is not None)
+        return time.monotonic() - started, len(changed) + deleted, added
+
+    # ---------- 补丁快照 ----------
+    def _snapshot_key(self, tag: str, patch_dir: str) -> Optional[str]:
+        """快照键 <Qt tag>/<补丁仓库提交>；补丁目录有未提交的修改时返回 None（内容与提交不一致，不能缓存）。"""
+        patch_root = self.patch_repo.working_tree_dir
+        try:
+            revision = self._git_output('-C', patch_root, 'rev-parse', 'HEAD').strip()
+            dirty = self._git_output('-C', patch_root, 'status', '--porcelain', '--', patch_dir).strip()
+        except subprocess.CalledProcessError:
+            return None
+        if dirty:
+            return None
+        return '{}/{}'.format(tag, revision)
+
+    def _load_snapshot(self, key: str) -> Optional[dict]:
+        """读取主仓库中的快照记录，返回 {'commit': 主仓库快照提交, 'modules': {模块: 快照提交}}；任一引用缺失时返回 None。"""
+        ref = SNAPSHOT_REF_PREFIX + key
+        try:
+            commit = self._git_output('-C', self.repo_path, 'rev-parse', '--verify', '-q', ref + '^{commit}').strip()
+            message = self._git_output('-C', self.repo_path, 'log', '-1', '--format=%B', commit)
+            modules = json.loads(message.split('\n', 1)[1])['modules']
+        except (subprocess.CalledProcessError, IndexError, ValueError, KeyError):
+            return None
+        for module, module_commit in modules.items():
+            module_path = os.path.join(self.repo_path, module)
+            if not os.path.exists(os.path.join(module_path, '.git')):
+                return None
+            try:
+                self._git_output('-C', module_path, 'cat-file', '-e', module_commit + '^{commit}')
+            except subprocess.CalledProcessError:
+                return None
+        modules['.'] = commit
+        return {'commit': commit, 'modules': modules}
+
+    def _write_module_snapshot(self, module: str, patch_path: Optional[str], key: str,
+                               message: str, extras_dir: Optional[str] = None) -> str:
+        """把 HEAD 加补丁的结果写成以 HEAD 为父提交的快照提交，并更新 refs/build-qt/snapshots/<key>。"""
+        module_path = self.repo_path if module == '.' else os.path.join(self.repo_path, module)
+        with self._scratch_index(module_path, copy_index=False) as git:
+            git('read-tree', 'HEAD')
+            if patch_path is not None:
+                git('apply', '--cached', patch_path, *([] if module == '.' else ['--whitespace=nowarn']))
+            if extras_dir:
+                # qtohextras 随主仓库快照保存在 qtohextras/ 子目录，切换时与补丁内容一起恢复
+                with self._scratch_index(module_path, copy_index=False) as extras_git:
+                    extras_git('--work-tree', extras_dir, 'add', '-A', '-f', '--', '.')
+                    extras_tree = extras_git('write-tree').strip()
+                git('read-tree', '--prefix=qtohextras/', extras_tree)
+            tree = git('write-tree').strip()
+            commit = git('commit-tree', tree, '-p', 'HEAD', '-m', message).strip()
+            git('update-ref', SNAPSHOT_REF_PREFIX + key, commit)
+        return commit
+
+    def save_snapshot(self, key: str, patches: dict, extras_dir: Optional[str] = None,
+                      jobs: Optional[int] = None) -> None:
+        """为当前 Qt tag 与补丁版本保存快照：每个打补丁的子模块一个提交，主仓库提交的说明中记录各子模块的快照提交。"""
+        modules = {module: patch_path for module, patch_path in patches.items() if patch_path and module != '.'}
+        message = 'build-qt snapshot {}'.format(key)
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs or os.cpu_count() or 1, len(modules) or 1))) as executor:
+            commits = dict(zip(modules, executor.map(
+                lambda module: self._write_module_snapshot(module, modules[module], key, message), modules)))
+        self._write_module_snapshot('.', patches.get('.'), key,
+                                    message + '\n' + json.dumps({'modules': commits}, indent=2), extras_dir)
+        print('已保存补丁快照 {}'.format(key))
+
+    def list_snapshots(self) -> List[str]:
+        """已保存的快照键（<Qt tag>/<补丁仓库提交>）。"""
+        try:
+            out = self._git_output('-C', self.repo_path, 'for-each-ref', '--format=%(refname)', SNAPSHOT_REF_PREFIX)
+        except subprocess.CalledProcessError:
+            return []
+        return [ref[len(SNAPSHOT_REF_PREFIX):] for ref in out.split()]
+
+    def _checkout_gitlinks(self, repo_path: str, jobs: Optional[int] = None, keep: frozenset = frozenset()) -> None:
+        """把 repo_path 中已检出的子模块（递归）强制检出到当前 HEAD 记录的 gitlink，本地缺少的提交按需浅获取。
+
+        keep 中的子模块保持当前 HEAD（如已检出快照的模块），只处理其嵌套子模块。
+        """
+        modules = [m for m in self._read_gitmodules(repo_path).values()
+                   if m.get('path') and os.path.exists(os.path.join(repo_path, m['path'], '.git'))]
+        if not modules:
+            return
+        gitlinks = {}
+        out = self._git_output('-C', repo_path, 'ls-tree', '-z', 'HEAD', '--', *[m['path'] for m in modules])
+        for record in out.split('\0'):
+            info, _, path = record.partition('\t')
+            if info.split()[1:2] == ['commit']:
+                gitlinks[path] = info.split()[2]
+
+        def checkout(path: str) -> None:
+            module_path = os.path.join(repo_path, path)
+            if path not in keep:
+                commit = self._ensure_commit(module_path, gitlinks[path])
+                if _read_head(module_path) != commit:
+                    result = subprocess.run([self._git_exe(), '-C', module_path, 'checkout', '-q', '-f', '--detach',
+                                             commit], capture_output=True, text=True)
+                    if result.returncode != 0:
+                        raise QtRepoError('检出 {} 失败: {}'.format(path, (result.stderr or result.stdout).strip()))
+            self._checkout_gitlinks(module_path, jobs=1)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs or os.cpu_count() or 1, len(gitlinks) or 1))) as executor:
+            list(executor.map(checkout, gitlinks))
+
+    def _checkout_tag(self, tag: str, jobs: Optional[int] = None) -> None:
+        """主仓库 HEAD 不在 tag 时切换到 tag（reset --hard，未跟踪的 build/ 等保留），并把子模块检出到新的 gitlink。
+
+        打补丁前调用，保证补丁作用于其对应的 Qt 版本，而不是上一次检出的版本。
+        """
+        try:
+            commit = self._ensure_commit(self.repo_path, tag, tag=True)
+        except (QtRepoError, subprocess.CalledProcessError) as e:
+            raise QtRepoError('找不到 Qt tag {}: {}'.format(tag, e))
+        if self._git_output('-C', self.repo_path, 'rev-parse', 'HEAD').strip() == commit:
+            return
+        started = time.monotonic()
+        print('切换 Qt 源码到 {}'.format(tag))
+        result = subprocess.run([self._git_exe(), '-C', self.repo_path, 'reset', '-q', '--hard', commit],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise QtRepoError('切换到 {} 失败: {}'.format(tag, (result.stderr or result.stdout).strip()))
+        self._checkout_gitlinks(self.repo_path, jobs)
+        print('已切换到 {} ({:.1f}s)'.format(tag, time.monotonic() - started))
+
+    def apply_patches(self, tag_dir: Optional[str] = None, jobs: Optional[int] = None, incremental: bool = False,
+                      snapshots: bool = False) -> None:
         """应用补丁仓库中的补丁文件到主仓库。
 
-        patch_dir: 补丁文件所在目录，默认使用补丁仓库根目录
+        tag_dir: 补丁目录名（Qt tag），默认 v5.15.12
+        jobs: 并行处理的模块数，默认 CPU 核心数
+        incremental: 为 True 时不 reset/clean，而是在临时索引中计算打补丁后的结果，只改写内容不同的文件，
+            未变化的文件保留原 mtime，补丁未变时重新应用不会触发重新编译
+        snapshots: 为 True 时按 (Qt tag, 补丁仓库提交) 缓存打补丁后的结果（refs/build-qt/snapshots/）；
+            已有快照时直接检出快照（主仓库与子模块的 HEAD 随之移到该 tag），不再应用补丁
+
+        指定 tag_dir 且没有可用快照时，主仓库不在该 tag 则先切换到该 tag（见 _checkout_tag），再应用补丁。
+
+        各模块的补丁作用于互不相关的子模块仓库，因此并行执行；本次有补丁的模块与上次打过补丁的模块（记录在
+        .git/build-qt-patched.json）在应用前单独 reset --hard/clean（incremental 除外），其余仓库由 reset_hard
+        并行检查，只重置有改动的仓库。主仓库的构建目录（KEEP_DIRS）始终保留。
         """
 
         if not self.repo:
-            if os.path.isdir(os.path.join(self.repo_path, '.git')):
+            if os.path.exists(os.path.join(self.repo_path, '.git')):
                 self.repo = Repo(self.repo_path)
             else:
                 raise QtRepoError('主仓库未初始化')
 
         if not self.patch_repo:
-            if os.path.isdir(os.path.join(self.repo_path + '_patch', '.git')):
+            if os.path.exists(os.path.join(self.repo_path + '_patch', '.git')):
                 self.patch_repo = Repo(self.repo_path + '_patch')
             else:
                 raise QtRepoError('补丁仓库未初始化')
 
-        self.reset_hard()
-        if tag_dir:
-            tag_dir = tag_dir.replace('-lts-lgpl', '')
-        else:
-            tag_dir = 'v5.15.12'  # 默认使用 v5.15.12 目录
-        patch_dir = os.path.join(self.patch_repo.working_tree_dir, 'patch', tag_dir)
+        qt_tag = tag_dir or DEFAULT_PATCH_TAG
+        patch_dir = os.path.join(self.patch_repo.working_tree_dir, 'patch', _patch_dir_name(tag_dir))
         if not os.path.isdir(patch_dir):
             raise QtRepoError('补丁目录不存在: {}'.format(patch_dir))
 
@@ -133,29 +716,329 @@ class QtRepo:
         if not patch_files:
             raise QtRepoError('补丁目录中没有 .patch 文件: {}'.format(patch_dir))
 
+        # root.patch 作用于主仓库，<module>.patch 作用于同名子模块
+        patches = {}
         for patch_file in sorted(patch_files):
-            patch_path = os.path.join(patch_dir, patch_file)
-            if patch_file == 'root.patch':
-                self.repo.git.apply(patch_path)
-            else:
-                try:
-                    module_repo = Repo(self.repo_path + '/' + patch_file.split('.')[0])
-                    module_repo.git.apply(patch_path, '--whitespace=nowarn')
-                    print('应用补丁 {} 成功'.format(patch_file))
-                except GitCommandError as e:
-                    raise QtRepoError('应用补丁 {} 失败: {}'.format(patch_file, e))
-        # 拷贝patch目录下的qtohextras到qt源码根目录
+            module = '.' if patch_file == 'root.patch' else patch_file.split('.')[0]
+            patches[module] = os.path.join(patch_dir, patch_file)
         qtohextras_dir = os.path.join(patch_dir, 'qtohextras')
-        if os.path.isdir(qtohextras_dir):
-            dest_dir = os.path.join(self.repo_path, 'qtohextras')
-            if os.path.exists(dest_dir):
-                shutil.rmtree(dest_dir)
-            shutil.copytree(qtohextras_dir, dest_dir)
+
+        snapshot_key = self._snapshot_key(qt_tag, patch_dir) if snapshots else None
+        snapshot = self._load_snapshot(snapshot_key) if snapshot_key else None
+        if snapshot:
+            print('使用补丁快照 {}'.format(snapshot_key))
+            tasks = {module: (None, commit) for module, commit in snapshot['modules'].items()}
+        else:
+            if tag_dir:
+                self._checkout_tag(tag_dir, jobs)
+            tasks = {module: (patch_path, None) for module, patch_path in patches.items()}
+        state = self._load_patch_state()
+        for module in state['modules']:
+            tasks.setdefault(module, (None, None))
+        # 补丁不涉及的仓库只在有改动时 reset/clean；打补丁的模块由下面的任务各自处理
+        self.reset_hard(jobs, skip=set(tasks))
+        head_before = self._git_output('-C', self.repo_path, 'rev-parse', 'HEAD').strip()
+
+        def worker(module: str, patch_path: Optional[str], commit: Optional[str]) -> tuple:
+            if incremental or snapshot:
+                return self._reapply_module_patch(module, patch_path, state['added'].get(module, []), commit)
+            return self._apply_module_patch(module, patch_path)
+
+        # 先记录本次将修改的全部模块，中途失败时下次仍会重置它们
+        self._save_patch_state(list(tasks), state['added'])
+        total = len(tasks)
+        timings = {}
+        added = {}
+        failed = {}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs or os.cpu_count() or 1, total))) as executor:
+            futures = {executor.submit(worker, module, patch_path, commit): module
+                       for module, (patch_path, commit) in tasks.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                module = futures[future]
+                patch_path, commit = tasks[module]
+                if patch_path:
+                    name = os.path.basename(patch_path)
+                else:
+                    name = '{} ({})'.format('root' if module == '.' else module, '快照' if commit else '仅重置')
+                try:
+                    timings[module], written, added[module] = future.result()
+                    detail = '' if written is None else '，改写 {} 个文件'.format(written)
+                    print('[{}/{}] 应用补丁 {} 成功{} ({:.1f}s)'.format(done, total, name, detail, timings[module]))
+                except QtRepoError as e:
+                    failed[module] = e
+                    print('[{}/{}] 应用补丁 {} 失败: {}'.format(done, total, name, e))
+        if failed:
+            raise QtRepoError('应用补丁失败: {}'.format(', '.join(sorted(failed))))
+        # qtohextras 不由补丁新增，单独同步
+        added['.'] = [p for p in added.get('.', []) if not p.startswith('qtohextras/')]
+        self._save_patch_state([module for module, (patch_path, commit) in tasks.items() if patch_path or commit], added)
+        print('补丁应用耗时 {:.1f}s，最慢: {}'.format(
+            time.monotonic() - started,
+            ', '.join('{} {:.1f}s'.format('root' if m == '.' else m, t) for m, t in sorted(timings.items(), key=lambda i: -i[1])[:5])))
+
+        if snapshot and self._git_output('-C', self.repo_path, 'rev-parse', 'HEAD').strip() != head_before:
+            # 主仓库切换了 tag：没有快照的子模块及快照模块的嵌套子模块按新的 gitlink 检出
+            self._checkout_gitlinks(self.repo_path, jobs, keep=frozenset(snapshot['modules']))
+
+        # 同步patch目录下的qtohextras到qt源码根目录，只改写有变化的文件；使用快照时已随主仓库恢复
+        dest_dir = os.path.join(self.repo_path, 'qtohextras')
+        if os.path.isdir(qtohextras_dir) and not snapshot:
+            written = _sync_tree(qtohextras_dir, dest_dir, keep={'.git'})
+            print('同步 qtohextras 目录成功，改写 {} 个文件'.format(written))
+        if os.path.isdir(dest_dir):
             qtohextras_git = os.path.join(dest_dir, '.git')
-            with open(qtohextras_git, "w") as f:
-                f.write('gitdir: ../.git/modules/qtohextras')
-            print('拷贝 qtohextras 目录成功')
+            gitdir_line = 'gitdir: ../.git/modules/qtohextras'
+            if _read_text(qtohextras_git) != gitdir_line:
+                with open(qtohextras_git, "w") as f:
+                    f.write(gitdir_line)
+        if snapshot_key and not snapshot:
+            self.save_snapshot(snapshot_key, patches, qtohextras_dir if os.path.isdir(qtohextras_dir) else None, jobs)
         print('所有补丁应用完成')
+
+    # ---------- 工作树 ----------
+    def _ensure_commit(self, repo_path: str, rev: str, mirror: Optional[GitMirrorCache] = None,
+                       tag: bool = False) -> str:
+        """确保 rev 在 repo_path 中存在（不存在时从远端或镜像浅获取），返回提交哈希。"""
+        try:
+            return self._git_output('-C', repo_path, 'rev-parse', '--verify', '-q', rev + '^{commit}').strip()
+        except subprocess.CalledProcessError:
+            pass
+        source = self.remote_name
+        if mirror is not None:
+            url = self._git_output('-C', repo_path, 'remote', 'get-url', self.remote_name).strip()
+            source = self._mirror_url(mirror.update(url), True)
+        cmd = [self._git_exe(), '-c', 'protocol.file.allow=always', '-C', repo_path, 'fetch', '-q']
+        shallow = self._git_output('-C', repo_path, 'rev-parse', '--is-shallow-repository').strip() == 'true'
+        # 新建的子模块对象库（_module_store）没有任何提交，同样只获取所需提交
+        empty = subprocess.run([self._git_exe(), '-C', repo_path, 'rev-parse', '-q', '--verify', 'HEAD'],
+                               capture_output=True).returncode != 0
+        if shallow or empty:
+            cmd += ['--depth', '1']
+        cmd += [source, 'refs/tags/{0}:refs/tags/{0}'.format(rev) if tag else rev]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise QtRepoError('获取 {} 失败: {}'.format(rev, result.stderr.strip()))
+        return self._git_output('-C', repo_path, 'rev-parse', '--verify', '-q',
+                                (rev if tag else 'FETCH_HEAD') + '^{commit}').strip()
+
+    def _resolve_submodule_url(self, url: str, base: Optional[str] = None) -> str:
+        """把 .gitmodules 中的相对 URL（./、../）按 base（默认主仓库 origin）解析为绝对 URL。"""
+        if not url.startswith(('./', '../')):
+            return url
+        if base is None:
+            base = self._git_output('-C', self.repo_path, 'remote', 'get-url', self.remote_name).strip()
+        base = base.rstrip('/')
+        while url.startswith(('./', '../')):
+            if url.startswith('../'):
+                base = base.rsplit('/', 1)[0]
+                url = url[3:]
+            else:
+                url = url[2:]
+        return base + '/' + url
+
+    def _module_store(self, parent_git_dir: str, name: str, url: str) -> str:
+        """子模块 name 的共享对象库 <parent_git_dir>/modules/<name>（与 git submodule 的布局一致）。
+
+        主仓库已检出该子模块时即为其 git 目录；否则创建裸仓库，origin 指向 url，所需提交由 _ensure_commit 按需浅获取。
+        不执行 submodule init，共享的配置保持不变。
+        """
+        store = os.path.join(parent_git_dir, 'modules', name)
+        if not os.path.isfile(os.path.join(store, 'HEAD')):
+            git_exe = self._git_exe()
+            subprocess.run([git_exe, 'init', '-q', '--bare', store], check=True, capture_output=True)
+            subprocess.run([git_exe, '--git-dir', store, 'remote', 'add', self.remote_name, url],
+                           check=True, capture_output=True)
+        return store
+
+    def _add_submodule_worktree(self, worktree_path: str, parent_git_dir: str, base_url: str, name: str,
+                                module: dict, mirror: Optional[GitMirrorCache]) -> float:
+        """以 parent_git_dir 下的共享对象库为子模块创建工作树（嵌套子模块同样处理），返回耗时（秒）。"""
+        started = time.monotonic()
+        entry = self._git_output('-C', worktree_path, 'ls-tree', 'HEAD', '--', module['path']).split()
+        if len(entry) < 3 or entry[1] != 'commit':
+            raise QtRepoError('{} 不是子模块'.format(module['path']))
+        url = self._resolve_submodule_url(module['url'], base_url)
+        store = self._module_store(parent_git_dir, name, url)
+        commit = self._ensure_commit(store, entry[2], mirror)
+        target = os.path.join(worktree_path, module['path'])
+        remove_tree(target)
+        result = subprocess.run([self._git_exe(), '--git-dir', store, 'worktree', 'add', '-f', '--detach', target, commit],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise QtRepoError((result.stderr or result.stdout).strip())
+        self._add_module_worktrees(target, store, url, mirror=mirror, jobs=1)
+        return time.monotonic() - started
+
+    def _add_module_worktrees(self, worktree_path: str, parent_git_dir: str, base_url: str,
+                              skip: Optional[List[str]] = None, mirror: Optional[GitMirrorCache] = None,
+                              jobs: int = 4) -> None:
+        """为 worktree_path 中的子模块并行创建工作树；parent_git_dir 为其共享 git 目录，base_url 用于解析相对 URL。"""
+        modules = self._read_gitmodules(worktree_path)
+        skip = set(skip or [])
+        selected = {name: module for name, module in modules.items()
+                    if module.get('update') != 'none' and 'path' in module
+                    and name not in skip and module['path'] not in skip}
+        if not selected:
+            return
+        total = len(selected)
+        failed = {}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, total))) as executor:
+            futures = {executor.submit(self._add_submodule_worktree, worktree_path, parent_git_dir, base_url,
+                                       name, module, mirror): name
+                       for name, module in selected.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                name = futures[future]
+                try:
+                    print('[{}/{}] 子模块 {} 完成 ({:.1f}s)'.format(done, total, name, future.result()))
+                except (QtRepoError, GitMirrorError, subprocess.CalledProcessError) as e:
+                    failed[name] = e
+                    print('[{}/{}] 子模块 {} 失败: {}'.format(done, total, name, e))
+        if failed:
+            raise QtRepoError('子模块检出失败: {}'.format(', '.join(sorted(failed))))
+        if parent_git_dir == _git_dir(self.repo_path):
+            print('工作树子模块检出完成: {} 个，耗时 {:.1f}s'.format(total, time.monotonic() - started))
+
+    def add_worktree(self, path: str, tag: str, patch_ref: Optional[str] = None, jobs: int = 4,
+                     skip: Optional[List[str]] = None, mirror: Optional[GitMirrorCache] = None) -> 'QtRepo':
+        """以当前仓库为对象库，在 path 创建检出 tag 的工作树并返回对应的 QtRepo。
+
+        主仓库与各子模块（含嵌套子模块）均通过 git worktree 共享本仓库 .git/modules 下的对象库，额外的版本几乎不占用
+        磁盘与下载时间；本仓库可以只是 clone(no_checkout=True) 得到的对象库，缺少的子模块对象库按需创建。
+        补丁仓库同样以工作树形式检出到 path + '_patch'（patch_ref 为空时使用当前提交）。skip 中的子模块不检出。
+        """
+        path = os.path.abspath(path)
+        if os.path.exists(path) and os.listdir(path):
+            print('目录已存在: {}, 跳过创建工作树'.format(path))
+            return QtRepo(path, self.remote_name)
+        git_exe = self._git_exe()
+        commit = self._ensure_commit(self.repo_path, tag, mirror, tag=True)
+        print('创建工作树 {} ({})'.format(path, tag))
+        try:
+            subprocess.run([git_exe, '-C', self.repo_path, 'worktree', 'add', '--detach', path, commit],
+                           check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            raise QtRepoError('git worktree add 失败: {}'.format(e.stderr.decode(errors='replace').strip()))
+        base_url = self._git_output('-C', self.repo_path, 'remote', 'get-url', self.remote_name).strip()
+        self._add_module_worktrees(path, _git_dir(self.repo_path), base_url, skip=skip, mirror=mirror, jobs=jobs)
+
+        patch_main = self.repo_path + '_patch'
+        if os.path.exists(os.path.join(patch_main, '.git')) and not os.path.exists(path + '_patch'):
+            patch_commit = self._ensure_commit(patch_main, patch_ref or 'HEAD', mirror)
+            try:
+                subprocess.run([git_exe, '-C', patch_main, 'worktree', 'add', '--detach', path + '_patch', patch_commit],
+                               check=True, capture_output=True)
+            except subprocess.CalledProcessError as e:
+                raise QtRepoError('补丁仓库 git worktree add 失败: {}'.format(e.stderr.decode(errors='replace').strip()))
+        return QtRepo(path, self.remote_name)
+
+    def list_worktrees(self) -> List[dict]:
+        """本仓库的工作树列表，每项为 {'path', 'head'}（不含主工作目录）。"""
+        out = self._git_output('-C', self.repo_path, 'worktree', 'list', '--porcelain')
+        worktrees = []
+        for block in out.strip().split('\n\n'):
+            fields = dict(line.partition(' ')[::2] for line in block.splitlines())
+            if 'worktree' in fields and os.path.abspath(fields['worktree']) != self.repo_path:
+                worktrees.append({'path': os.path.abspath(fields['worktree']), 'head': fields.get('HEAD')})
+        return worktrees
+
+    def remove_worktree(self, path: str) -> None:
+        """删除 add_worktree 创建的工作树（含子模块工作树与补丁仓库工作树），共享的对象库保持不变。"""
+        path = os.path.abspath(path)
+        if path == self.repo_path:
+            raise QtRepoError('不能删除主工作目录')
+        if not os.path.exists(path):
+            raise QtRepoError('工作树不存在: {}'.format(path))
+        git_exe = self._git_exe()
+        # 由深到浅从各自的对象库中注销子模块工作树
+        for module in sorted(self._checked_out_modules(path), key=lambda m: -m.count('/')):
+            module_path = os.path.join(path, module)
+            # 不用 --path-format=absolute（需要 git 2.31+）：相对路径按 module_path 解析
+            result = subprocess.run([git_exe, '-C', module_path, 'rev-parse', '--git-common-dir'],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print('Warning: 无法定位 {} 的对象库，跳过注销: {}'.format(module, result.stderr.strip()))
+                continue
+            common_dir = os.path.normpath(os.path.join(module_path, result.stdout.strip()))
+            subprocess.run([git_exe, '--git-dir', common_dir, 'worktree', 'remove', '--force', module_path],
+                           capture_output=True)
+        remove_tree(path)
+        remove_tree(path + '_patch')
+        subprocess.run([git_exe, '-C', self.repo_path, 'worktree', 'prune'], check=True)
+        if os.path.exists(os.path.join(self.repo_path + '_patch', '.git')):
+            subprocess.run([git_exe, '-C', self.repo_path + '_patch', 'worktree', 'prune'], check=True)
+        print('已删除工作树 {}'.format(path))
+
+    # ---------- 源码指纹 ----------
+    # 路径 -> (size, mtime_ns, inode, sha256)，文件 stat 不变时复用摘要；进程内各 QtRepo 共享
+    _digest_memo = {}
+    _digest_memo_lock = threading.Lock()
+
+    @classmethod
+    def _file_digest(cls, path: str) -> str:
+        st = os.stat(path)
+        stat_key = (st.st_size, st.st_mtime_ns, st.st_ino)
+        with cls._digest_memo_lock:
+            memo = cls._digest_memo.get(path)
+        if memo and memo[:3] == stat_key:
+            return memo[3]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with cls._digest_memo_lock:
+            cls._digest_memo[path] = stat_key + (digest,)
+        return digest
+
+    def _tree_digests(self, root: str, label: str, lines: List[str]) -> None:
+        if not os.path.isdir(root):
+            lines.append('{} -'.format(label))
+            return
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d != '.git')
+            for name in sorted(filenames):
+                if name == '.git':
+                    continue
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, root).replace(os.sep, '/')
+                lines.append('{} {} {}'.format(label, rel, self._file_digest(path)))
+
+    def _submodule_heads(self, work_path: str, prefix: str, lines: List[str]) -> None:
+        git_dir = _git_dir(work_path)
+        if not git_dir:
+            return
+        try:
+            links = _read_gitlinks(os.path.join(git_dir, 'index'))
+        except FileNotFoundError:
+            return
+        except ValueError:
+            out = self._git_output('-C', work_path, 'ls-files', '--stage')
+            links = {line.split('\t', 1)[1]: line.split()[1] for line in out.splitlines() if line.startswith('160000 ')}
+        for path in sorted(links):
+            sub_path = os.path.join(work_path, path)
+            lines.append('module {}{} {}'.format(prefix, path, _read_head(sub_path) or '-'))
+            if _git_dir(sub_path):
+                self._submodule_heads(sub_path, prefix + path + '/', lines)
+
+    def fingerprint(self, tag: Optional[str] = None) -> Optional[str]:
+        """源码指纹：主仓库 HEAD、各子模块实际检出的提交、补丁目录与 qtohextras 的内容摘要，返回 sha256。
+
+        直接读取 .git/HEAD、packed-refs 与索引中的 gitlink，不为每个子模块启动 git；文件摘要按 stat 缓存，
+        重复调用只需 stat。补丁以外的手工修改不计入（源码树假定由 apply_patches 生成）。
+        tag: Qt tag，决定使用的补丁目录；仓库不存在时返回 None。
+        """
+        head = _read_head(self.repo_path)
+        if not head:
+            return None
+        lines = ['qt5 {}'.format(head)]
+        self._submodule_heads(self.repo_path, '', lines)
+        patch_path = self.repo_path + '_patch'
+        self._tree_digests(os.path.join(patch_path, 'patch', _patch_dir_name(tag)), 'patch', lines)
+        self._tree_digests(os.path.join(self.repo_path, 'qtohextras'), 'qtohextras', lines)
+        return hashlib.sha256('\n'.join(lines).encode('utf-8', errors='surrogateescape')).hexdigest()
+
     # ---------- 远端/fetch/pull ----------
     def fetch(self, remote_name: Optional[str] = None) -> None:
         if not self.repo:
@@ -186,47 +1069,93 @@ class QtRepo:
             raise QtRepoError('checkout 失败: {}'.format(e))
 
     # ---------- 重置 ----------
-    def reset_hard(self):
-        try:
-            # 1. 重置主仓库
-            git_exe = shutil.which('git')
-            if not git_exe:
-                raise QtRepoError('系统中未找到 git 可执行文件')
-            cmd = [git_exe, '-C', self.repo_path, 'reset', '--hard']
+    def _checked_out_modules(self, repo_path: Optional[str] = None, prefix: str = '') -> List[str]:
+        """递归列出已检出的子模块（相对主仓库的路径），直接读取 .gitmodules 与 <path>/.git，不调用 submodule foreach。"""
+        repo_path = repo_path or self.repo_path
+        result = []
+        for module in self._read_gitmodules(repo_path).values():
+            path = module.get('path')
+            if not path or not os.path.exists(os.path.join(repo_path, path, '.git')):
+                continue
+            rel = prefix + path
+            result.append(rel)
+            result += self._checked_out_modules(os.path.join(repo_path, path), rel + '/')
+        return result
 
-            try:
-                subprocess.run(cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                raise QtRepoError('重置主仓库 失败: {}'.format(e))
-            
-            cmd = [git_exe, '-C', self.repo_path, 'submodule', 'foreach', '--recursive', 'git', 'reset', '--hard']
-            try:
-                subprocess.run(cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                raise QtRepoError('重置子仓库 失败: {}'.format(e))
-            self.clean()
-        except Exception as e:
-            raise QtRepoError('重置失败: {}'.format(e))
-        
-    def clean(self):
-        try:
-            # 1. 清理主仓库
-            git_exe = shutil.which('git')
-            if not git_exe:
-                raise QtRepoError('系统中未找到 git 可执行文件')
-            cmd = [git_exe, '-C', self.repo_path, 'clean' , '-fdx']
-            try:
-                subprocess.run(cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                raise QtRepoError('清理主仓库 失败: {}'.format(e))
-            
-            cmd = [git_exe, '-C', self.repo_path, 'submodule', 'foreach', '--recursive', 'git', 'clean' , '-fdx']
-            try:
-                subprocess.run(cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                raise QtRepoError('清理子仓库 失败: {}'.format(e))
-        except Exception as e:
-            raise QtRepoError('清理失败: {}'.format(e))
+    @staticmethod
+    def _clean_args(module: str) -> List[str]:
+        """git clean -fdx 的参数；主仓库保留 KEEP_DIRS（-e 规则在 -x 时仍然生效）。"""
+        args = ['clean', '-fdx', '-q']
+        if module == '.':
+            for name in KEEP_DIRS:
+                args += ['-e', '/' + name]
+        return args
+
+    def _is_dirty(self, module: str) -> bool:
+        """模块工作区是否有修改、未跟踪或被忽略的文件（子模块自身的变化与主仓库的 KEEP_DIRS 不计入）。"""
+        module_path = self.repo_path if module == '.' else os.path.join(self.repo_path, module)
+        cmd = [self._git_exe(), '-C', module_path, 'status', '--porcelain', '--ignored', '--ignore-submodules=all']
+        if module == '.':
+            cmd += ['--', '.'] + [':(exclude){}'.format(name) for name in KEEP_DIRS]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise QtRepoError('git status 失败: {}'.format(result.stderr.strip()))
+        return bool(result.stdout.strip())
+
+    def _restore_dirty(self, reset: bool, what: str, jobs: Optional[int] = None,
+                       skip: Optional[set] = None) -> None:
+        """并行检查主仓库与全部已检出子模块，只对有改动的模块执行 clean（reset 为 True 时先 reset --hard）。
+
+        skip: 不处理的模块（例如 apply_patches 中另行重置的打补丁模块）
+        """
+        started = time.monotonic()
+        modules = [m for m in ['.'] + self._checked_out_modules() if m not in (skip or ())]
+        if not modules:
+            return
+        workers = max(1, min(jobs or os.cpu_count() or 1, len(modules)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            dirty_flags = list(executor.map(self._is_dirty, modules))
+        dirty = [module for module, flag in zip(modules, dirty_flags) if flag]
+        scanned = time.monotonic() - started
+        if not dirty:
+            print('{}: 共 {} 个仓库，均无改动 (扫描 {:.1f}s)'.format(what, len(modules), scanned))
+            return
+
+        git_exe = self._git_exe()
+
+        def restore(module: str) -> float:
+            module_started = time.monotonic()
+            module_path = self.repo_path if module == '.' else os.path.join(self.repo_path, module)
+            commands = ([['reset', '--hard', '-q']] if reset else []) + [self._clean_args(module)]
+            for args in commands:
+                result = subprocess.run([git_exe, '-C', module_path] + args, capture_output=True, text=True)
+                if result.returncode != 0:
+                    raise QtRepoError('git {} 失败: {}'.format(args[0], (result.stderr or result.stdout).strip()))
+            return time.monotonic() - module_started
+
+        failed = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(dirty)))) as executor:
+            futures = {executor.submit(restore, module): module for module in dirty}
+            for future in as_completed(futures):
+                module = futures[future]
+                name = '主仓库' if module == '.' else module
+                try:
+                    print('{} {} ({:.1f}s)'.format(what, name, future.result()))
+                except QtRepoError as e:
+                    failed[module] = e
+                    print('{} {} 失败: {}'.format(what, name, e))
+        if failed:
+            raise QtRepoError('{}失败: {}'.format(what, ', '.join(sorted(failed))))
+        print('{}: 共 {} 个仓库，处理 {} 个有改动的仓库，耗时 {:.1f}s (扫描 {:.1f}s)'.format(
+            what, len(modules), len(dirty), time.monotonic() - started, scanned))
+
+    def reset_hard(self, jobs: Optional[int] = None, skip: Optional[set] = None):
+        """对主仓库与有改动的子模块执行 git reset --hard 与 git clean -fdx（保留主仓库的 KEEP_DIRS）。"""
+        self._restore_dirty(True, '重置', jobs, skip)
+
+    def clean(self, jobs: Optional[int] = None, skip: Optional[set] = None):
+        """对主仓库与有改动的子模块执行 git clean -fdx（保留主仓库的 KEEP_DIRS）。"""
+        self._restore_dirty(False, '清理', jobs, skip)
 
 
 if __name__ == '__main__':
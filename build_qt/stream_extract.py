@@ -0,0 +1,487 @@
+"""
+流式解压：在下载数据到达的同时解压 tar(.gz/.bz2/.xz) 与 zip 包
+
+提供：
+- HashingReader: 将字节块迭代器包装为 read(n) 接口，并对经过的全部字节计算摘要
+- extract_tar_members(fileobj, dest_dir, include, exclude): 单遍解压 tar，小文件批量交给线程池写出，
+  权限与修改时间统一在最后设置；支持 include/exclude glob 过滤成员
+- member_filter(include, exclude): 由 glob 列表构造成员过滤函数
+- extract_zip_stream(reader, dest_dir): 按 local header 逐个成员解压，结束后与 central directory 比对
+- extract_stream(reader, dest_dir, archive_name): 按存档名选择 zip 或 tar 流式解压（download_and_extract 使用）
+
+zip 流式解压不支持加密条目、非 stored/deflate 压缩方式，以及带 data descriptor 的 stored 条目，
+遇到时抛出 StreamUnsupported，调用方应回退为先下载后解压。
+"""
+from __future__ import annotations
+
+import fnmatch
+import os
+import shutil
+import stat
+import struct
+import sys
+import tarfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+from .ziptools.ziplongpaths import FWP
+
+
+class StreamExtractError(Exception):
+    pass
+
+
+class StreamUnsupported(StreamExtractError):
+    """存档使用了无法流式解压的特性。"""
+    pass
+
+
+class HashingReader:
+    """将字节块迭代器包装为只读文件对象，所有取出的字节依次送入 hasher。"""
+
+    def __init__(self, chunks: Iterator[bytes], hasher=None, on_read=None):
+        self.chunks = iter(chunks)
+        self.hasher = hasher
+        self.on_read = on_read
+        self.buffer = bytearray()
+        self.eof = False
+
+    def _fill(self, size: int) -> None:
+        while not self.eof and (size < 0 or len(self.buffer) < size):
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.eof = True
+                break
+            if not chunk:
+                continue
+            if self.hasher is not None:
+                self.hasher.update(chunk)
+            if self.on_read is not None:
+                self.on_read(len(chunk))
+            self.buffer += chunk
+
+    def read(self, size: int = -1) -> bytes:
+        self._fill(size)
+        if size < 0 or size >= len(self.buffer):
+            data = bytes(self.buffer)
+            self.buffer.clear()
+        else:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+    def unread(self, data: bytes) -> None:
+        """将多读的字节放回缓冲区头部（不会重复计入摘要）。"""
+        if data:
+            self.buffer[:0] = data
+
+    def drain(self) -> None:
+        """读完剩余数据，使摘要覆盖完整的存档。"""
+        while not self.eof:
+            self.buffer.clear()
+            self._fill(1024 * 1024)
+        self.buffer.clear()
+
+
+def _safe_join(dest_dir: str, name: str) -> str:
+    """拼接成员路径，拒绝绝对路径与跳出目标目录的成员。"""
+    name = name.replace('\\', '/')
+    parts = [p for p in name.split('/') if p not in ('', '.')]
+    if name.startswith('/') or os.path.splitdrive(name)[0] or '..' in parts:
+        raise StreamExtractError('Unsafe member path in archive: {}'.format(name))
+    return os.path.join(dest_dir, *parts)
+
+
+def _check_inside(dest_real: str, path: str, name: str) -> None:
+    """解析已创建的符号链接后 path 仍须位于目标目录（dest_real 为其 realpath）内。"""
+    real = os.path.realpath(path)
+    if real != dest_real and not real.startswith(dest_real.rstrip(os.sep) + os.sep):
+        raise StreamExtractError('Unsafe link in archive (escapes destination): {}'.format(name))
+
+
+def member_filter(include: Optional[Sequence[str]] = None,
+                  exclude: Optional[Sequence[str]] = None) -> Optional[Callable[[str], bool]]:
+    """由 glob 列表构造成员过滤函数，include/exclude 都为空时返回 None。
+
+    成员名去掉开头的 './' 后匹配（fnmatch，'*' 可跨越 '/'）；
+    include 非空时只保留匹配任一 include 的成员，再排除匹配任一 exclude 的成员。
+    """
+    if not include and not exclude:
+        return None
+    include = list(include or ())
+    exclude = list(exclude or ())
+
+    def select(name: str) -> bool:
+        name = member_name(name)
+        if include and not any(fnmatch.fnmatchcase(name, p) for p in include):
+            return False
+        return not any(fnmatch.fnmatchcase(name, p) for p in exclude)
+    return select
+
+
+def member_name(name: str) -> str:
+    """规范化成员名：统一使用 '/'，去掉开头的 './'。"""
+    name = name.replace('\\', '/')
+    while name.startswith('./'):
+        name = name[2:]
+    return name
+
+
+# 不超过该大小的文件读入内存后交给线程池写出
+TAR_SMALL_FILE = 1024 * 1024
+# 每批提交给线程池的文件数与总字节数上限
+TAR_BATCH_FILES = 64
+TAR_BATCH_BYTES = 8 * 1024 * 1024
+
+
+def _open_for_write(path: str):
+    """以 wb 打开 path；已存在的只读文件（例如重新解压时）先去掉只读属性。"""
+    try:
+        return open(FWP(path), 'wb')
+    except PermissionError:
+        os.chmod(FWP(path), stat.S_IWRITE | stat.S_IREAD)
+        return open(FWP(path), 'wb')
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with _open_for_write(path) as f:
+        f.write(data)
+
+
+def _write_batch(batch) -> None:
+    for path, data in batch:
+        _write_file(path, data)
+
+
+def extract_tar_members(fileobj, dest_dir: str, include: Optional[Sequence[str]] = None,
+                        exclude: Optional[Sequence[str]] = None, workers: int = 4,
+                        mode: str = 'r|*', permissions: bool = True,
+                        select: Optional[Callable[[str], bool]] = None, names: Optional[list] = None) -> int:
+    """单遍流式解压 tar（自动识别 gz/bz2/xz 压缩），返回解压的成员数。
+
+    - 成员只迭代一次，不预先构建成员列表
+    - 小文件按批交给线程池写出，大文件在当前线程边读边写
+    - 符号链接与硬链接在全部文件写完后创建，避免经由链接写到目标目录之外；硬链接先于符号链接创建，
+      且链接位置与硬链接目标解析后必须位于目标目录内；目标未解压（被过滤）的硬链接跳过
+    - 权限与修改时间最后统一设置（目录按深度从深到浅），不受后续写入影响
+
+    select 给出时代替 include/exclude 过滤成员；names 给出时追加解压出的文件与链接的成员名。
+    """
+    if select is None:
+        select = member_filter(include, exclude)
+    created = set()
+    links = []
+    attrs = []
+    batch = []
+    batch_bytes = 0
+    count = 0
+
+    def ensure_dir(path):
+        if path not in created:
+            os.makedirs(FWP(path), exist_ok=True)
+            created.add(path)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        jobs = []
+
+        def flush():
+            nonlocal batch, batch_bytes
+            if batch:
+                jobs.append(pool.submit(_write_batch, batch))
+                batch = []
+                batch_bytes = 0
+
+        with tarfile.open(fileobj=fileobj, mode=mode) as t:
+            for m in t:
+                name = member_name(m.name)
+                if name in ('', '.') or (select is not None and not select(name)):
+                    continue
+                path = _safe_join(dest_dir, name)
+                if m.isdir():
+                    ensure_dir(path)
+                elif m.isfile():
+                    ensure_dir(os.path.dirname(path))
+                    src = t.extractfile(m)
+                    if m.size <= TAR_SMALL_FILE:
+                        batch.append((path, src.read()))
+                        batch_bytes += m.size
+                        if len(batch) >= TAR_BATCH_FILES or batch_bytes >= TAR_BATCH_BYTES:
+                            flush()
+                    else:
+                        flush()
+                        with _open_for_write(path) as out:
+                            while True:
+                                data = src.read(TAR_SMALL_FILE)
+                                if not data:
+                                    break
+                                out.write(data)
+                elif m.issym() or m.islnk():
+                    ensure_dir(os.path.dirname(path))
+                    links.append((path, name, m))
+                    continue
+                else:
+                    # 设备文件、FIFO 等不解压
+                    continue
+                if names is not None and not m.isdir():
+                    names.append(name)
+                attrs.append((path, m.mode, m.mtime, m.isdir()))
+                count += 1
+                # 及时回收已完成的批次，出错时尽早抛出
+                while jobs and jobs[0].done():
+                    jobs.pop(0).result()
+            flush()
+            for job in jobs:
+                job.result()
+
+    dest_real = os.path.realpath(dest_dir)
+    # 硬链接在前：其目标不会经过本次解压创建的符号链接
+    for path, name, m in sorted(links, key=lambda link: not link[2].islnk()):
+        _check_inside(dest_real, os.path.dirname(path), name)
+        if m.islnk():
+            target = _safe_join(dest_dir, member_name(m.linkname))
+            _check_inside(dest_real, target, name)
+            if not os.path.isfile(FWP(target)):
+                # 硬链接的目标被过滤掉（流式读取无法回头取其数据），跳过该链接
+                print('Warning: 硬链接 {} 的目标 {} 未解压，跳过'.format(name, member_name(m.linkname)))
+                continue
+        if os.path.lexists(FWP(path)):
+            os.remove(FWP(path))
+        if m.issym():
+            try:
+                os.symlink(m.linkname, FWP(path))
+            except (OSError, NotImplementedError):
+                # 不支持符号链接的平台保留为内容为目标路径的普通文件
+                _write_file(path, m.linkname.encode('utf-8'))
+        else:
+            try:
+                os.link(FWP(target), FWP(path))
+            except OSError:
+                shutil.copy2(FWP(target), FWP(path))
+        if names is not None:
+            names.append(name)
+        count += 1
+
+    files = [a for a in attrs if not a[3]]
+    dirs = sorted((a for a in attrs if a[3]), key=lambda a: a[0].count(os.sep), reverse=True)
+    for path, mode, mtime, _ in files + dirs:
+        if permissions and not sys.platform.startswith('win'):
+            try:
+                os.chmod(path, mode & 0o7777)
+            except OSError:
+                pass
+        try:
+            os.utime(FWP(path), (mtime, mtime))
+        except OSError:
+            pass
+    return count
+
+
+_LOCAL_SIG = b'PK\x03\x04'
+_CENTRAL_SIG = b'PK\x01\x02'
+_DESCRIPTOR_SIG = b'PK\x07\x08'
+_END_SIGS = (b'PK\x05\x06', b'PK\x06\x06', b'PK\x06\x07')
+_LOCAL_HEADER = struct.Struct('<HHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<HHHHHHIIIHHHHHII')
+
+
+def _read_exact(reader, size: int) -> bytes:
+    data = reader.read(size)
+    if len(data) != size:
+        raise StreamExtractError('Unexpected end of zip stream')
+    return data
+
+
+def _decode_name(raw: bytes, flags: int) -> str:
+    return raw.decode('utf-8') if flags & 0x800 else raw.decode('cp437')
+
+
+def _zip64_sizes(extra: bytes, usize: int, csize: int) -> tuple[int, int, bool]:
+    """解析 zip64 扩展字段，返回 (usize, csize, 是否含 zip64 字段)。"""
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, length = struct.unpack('<HH', extra[pos:pos + 4])
+        if tag == 0x0001:
+            data = extra[pos + 4:pos + 4 + length]
+            offset = 0
+            if usize == 0xFFFFFFFF and offset + 8 <= len(data):
+                usize = struct.unpack('<Q', data[offset:offset + 8])[0]
+                offset += 8
+            if csize == 0xFFFFFFFF and offset + 8 <= len(data):
+                csize = struct.unpack('<Q', data[offset:offset + 8])[0]
+            return usize, csize, True
+        pos += 4 + length
+    return usize, csize, False
+
+
+def _dos_time(mdate: int, mtime: int) -> float:
+    date_time = ((mdate >> 9) + 1980, (mdate >> 5) & 0xF, mdate & 0x1F,
+                 mtime >> 11, (mtime >> 5) & 0x3F, (mtime & 0x1F) * 2)
+    try:
+        return time.mktime(date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return time.time()
+
+
+def _extract_zip_member(reader, out, method: int, csize: int, has_descriptor: bool, chunk_size: int = 1024 * 1024) -> tuple[int, int]:
+    """解压单个成员的数据区写入 out，返回 (crc32, 解压后大小)。"""
+    crc = 0
+    size = 0
+    if method == 0:
+        remaining = csize
+        while remaining > 0:
+            data = _read_exact(reader, min(chunk_size, remaining))
+            remaining -= len(data)
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            if out is not None:
+                out.write(data)
+        return crc, size
+    d = zlib.decompressobj(-15)
+    remaining = None if has_descriptor else csize
+    while not d.eof:
+        want = chunk_size if remaining is None else min(chunk_size, remaining)
+        if want == 0:
+            break
+        data = reader.read(want)
+        if not data:
+            raise StreamExtractError('Unexpected end of zip stream')
+        if remaining is not None:
+            remaining -= len(data)
+        out_data = d.decompress(data)
+        crc = zlib.crc32(out_data, crc)
+        size += len(out_data)
+        if out is not None:
+            out.write(out_data)
+    tail = d.flush()
+    crc = zlib.crc32(tail, crc)
+    size += len(tail)
+    if out is not None:
+        out.write(tail)
+    # deflate 流结束后多读的字节属于下一个结构
+    reader.unread(d.unused_data)
+    if remaining:
+        _read_exact(reader, remaining)
+    return crc, size
+
+
+def extract_zip_stream(reader, dest_dir: str, permissions: bool = True,
+                       select: Optional[Callable[[str], bool]] = None) -> int:
+    """按 local header 顺序流式解压 zip，返回解压的成员数。
+
+    数据区写出时校验 CRC 与大小；读到 central directory 后逐项比对，
+    再根据其中的 external_attr 恢复符号链接与权限，最后设置修改时间。
+    select 为成员过滤函数，未选中的成员仍需解压以推进数据流，但不写出。
+    """
+    entries: Dict[str, Dict] = {}
+    central: Dict[str, int] = {}
+    while True:
+        sig = reader.read(4)
+        if sig == _LOCAL_SIG:
+            (_, flags, method, mtime, mdate, crc, csize, usize, nlen, xlen) = _LOCAL_HEADER.unpack(_read_exact(reader, _LOCAL_HEADER.size))
+            name = _decode_name(_read_exact(reader, nlen), flags)
+            extra = _read_exact(reader, xlen)
+            usize, csize, zip64 = _zip64_sizes(extra, usize, csize)
+            has_descriptor = bool(flags & 0x8)
+            if flags & 0x1:
+                raise StreamUnsupported('Encrypted zip member: {}'.format(name))
+            if method not in (0, 8):
+                raise StreamUnsupported('Unsupported compression method {} for {}'.format(method, name))
+            if method == 0 and has_descriptor:
+                raise StreamUnsupported('Stored zip member with data descriptor: {}'.format(name))
+            path = _safe_join(dest_dir, name)
+            if select is not None and not select(name):
+                path = None
+                actual_crc, actual_size = _extract_zip_member(reader, None, method, csize, has_descriptor)
+            elif name.endswith('/'):
+                os.makedirs(FWP(path), exist_ok=True)
+                actual_crc, actual_size = _extract_zip_member(reader, None, method, csize, has_descriptor)
+            else:
+                os.makedirs(FWP(os.path.dirname(path)), exist_ok=True)
+                with _open_for_write(path) as out:
+                    actual_crc, actual_size = _extract_zip_member(reader, out, method, csize, has_descriptor)
+            if has_descriptor:
+                head = _read_exact(reader, 4)
+                if head == _DESCRIPTOR_SIG:
+                    head = _read_exact(reader, 4)
+                crc = struct.unpack('<I', head)[0]
+                _read_exact(reader, 16 if zip64 else 8)
+                usize = actual_size
+            if actual_crc != crc or actual_size != usize:
+                raise StreamExtractError('CRC or size mismatch for zip member {}'.format(name))
+            entries[name] = {'path': path, 'crc': crc, 'size': usize, 'mtime': _dos_time(mdate, mtime)}
+        elif sig == _CENTRAL_SIG:
+            fields = _CENTRAL_HEADER.unpack(_read_exact(reader, _CENTRAL_HEADER.size))
+            flags, crc, usize, nlen, xlen, clen, external_attr = fields[2], fields[6], fields[8], fields[9], fields[10], fields[11], fields[14]
+            name = _decode_name(_read_exact(reader, nlen), flags)
+            extra = _read_exact(reader, xlen)
+            _read_exact(reader, clen)
+            usize = _zip64_sizes(extra, usize, 0)[0]
+            entry = entries.get(name)
+            if entry is None or entry['crc'] != crc or entry['size'] != usize:
+                raise StreamExtractError('Central directory does not match local entry: {}'.format(name))
+            central[name] = external_attr
+        elif sig in _END_SIGS or sig == b'':
+            break
+        else:
+            raise StreamExtractError('Unexpected zip record signature: {!r}'.format(sig))
+
+    missing = set(entries) - set(central)
+    if missing:
+        raise StreamExtractError('Zip members missing from central directory: {}'.format(', '.join(sorted(missing)[:5])))
+
+    dirs = []
+    count = 0
+    for name, entry in entries.items():
+        path = entry['path']
+        if path is None:
+            continue
+        count += 1
+        mode = central[name] >> 16
+        if stat.S_ISLNK(mode):
+            with open(FWP(path), 'r', encoding='utf-8') as f:
+                target = f.read()
+            try:
+                os.remove(FWP(path))
+                os.symlink(target, FWP(path))
+            except (OSError, NotImplementedError):
+                # 不支持符号链接的平台保留为内容为目标路径的普通文件
+                with open(FWP(path), 'w', encoding='utf-8') as f:
+                    f.write(target)
+            continue
+        if permissions and mode & 0o7777 and not sys.platform.startswith('win'):
+            try:
+                os.chmod(path, mode & 0o7777)
+            except OSError:
+                pass
+        if name.endswith('/'):
+            dirs.append((path, entry['mtime']))
+        else:
+            try:
+                os.utime(FWP(path), (entry['mtime'], entry['mtime']))
+            except OSError:
+                pass
+    # 目录修改时间在文件写入完成后再设置
+    for path, mtime in dirs:
+        try:
+            os.utime(FWP(path), (mtime, mtime))
+        except OSError:
+            pass
+    return count
+
+
+def extract_stream(reader, dest_dir: str, archive_name: str, include: Optional[Sequence[str]] = None,
+                   exclude: Optional[Sequence[str]] = None) -> int:
+    """根据存档文件名选择 zip 或 tar 流式解压，返回成员数；include/exclude 见 member_filter。"""
+    lower = archive_name.lower()
+    if lower.endswith('.zip'):
+        return extract_zip_stream(reader, dest_dir, select=member_filter(include, exclude))
+    if lower.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')):
+        return extract_tar_members(reader, dest_dir, include, exclude)
+    raise StreamUnsupported('Streaming extraction not supported for {}'.format(archive_name))
+
+
+def is_streamable(archive_name: Optional[str]) -> bool:
+    return bool(archive_name) and archive_name.lower().endswith(('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz'))
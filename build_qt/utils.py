@@ -2,14 +2,62 @@ import requests
 import shutil
 import os
 import hashlib
+import json
 import platform
-from typing import Optional, Dict
+import stat
+import tarfile
+import sys
+import threading
+from typing import TYPE_CHECKING, Optional, Dict
 from rich.progress import Progress, BarColumn, DownloadColumn, TextColumn, TimeRemainingColumn, TransferSpeedColumn
 
+if TYPE_CHECKING:
+    # artifact_cache 依赖本模块的 FileLock，只在类型检查时导入
+    from .artifact_cache import ArtifactCache
+
 
 class DownloadError(Exception):
     pass
 
+
+class FileLock:
+    """基于锁文件的跨进程互斥锁（POSIX 使用 flock，Windows 使用 msvcrt.locking）。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        if sys.platform.startswith('win'):
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK 最多重试 10 秒，超时后继续等待
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if sys.platform.startswith('win'):
+                import msvcrt
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self.fd)
+            self.fd = None
+        return False
+
+
 def detect_platform() -> Dict[str, str]:
     """探测本机 osType 和 osArch，返回用于请求的值。"""
     sys_os = platform.system().lower()
@@ -33,32 +81,509 @@ def detect_platform() -> Dict[str, str]:
 
     return {'osType': os_type, 'osArch': os_arch}
 
-def checksum(file_path: str, expected_checksum: tuple[str, str]) -> bool:
-    """计算文件的校验和，并可选与预期值对比。
+# 已校验摘要缓存文件名，集中存放在缓存目录中（Config 设置为 <working_dir>/.temp），不写入被校验文件所在目录
+HASH_CACHE_NAME = '.hashcache.json'
+_hash_cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'build-qt-ohos')
+_hash_cache_lock = threading.Lock()
 
-    Returns True if checksum matches or no expected_checksum provided.
-    Raises DownloadError on failure or mismatch.
-    """
+
+def set_hash_cache_dir(cache_dir: str) -> None:
+    """设置已校验摘要缓存所在目录。"""
+    global _hash_cache_dir
+    _hash_cache_dir = os.path.abspath(cache_dir)
+
+
+def _hash_cache_path() -> str:
+    return os.path.join(_hash_cache_dir, HASH_CACHE_NAME)
+
+
+def _hash_algo(expected_checksum: tuple[str, str]) -> str:
     algo = expected_checksum[0].lower()
     if algo not in ('sha256', 'sha1', 'md5'):
         raise ValueError('Unsupported checksum algorithm: ' + algo)
-    h = hashlib.new(algo)
+    return algo
+
+
+def _hash_file(file_path: str, hasher, limit: Optional[int] = None, chunk_size: int = 1024 * 1024):
+    """将文件内容（可选仅前 limit 字节）送入 hasher。"""
+    remaining = limit
+    with open(file_path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return hasher
+
+
+def _hash_cache_key(file_path: str) -> Optional[str]:
+    """以 (path, size, mtime_ns, inode) 作为缓存键，文件不存在时返回 None。"""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return '{}|{}|{}|{}'.format(os.path.abspath(file_path), st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _load_hash_cache(cache_path: str) -> Dict:
     try:
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(8192), b''):
-                h.update(chunk)
-    except Exception as e:
-        raise DownloadError('Failed to compute checksum for {}: {}'.format(file_path, e))
-    computed = h.hexdigest()
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def cached_digest(file_path: str, algo: str) -> Optional[str]:
+    """返回文件未变化时已记录的摘要，否则返回 None。"""
+    key = _hash_cache_key(file_path)
+    if key is None:
+        return None
+    with _hash_cache_lock:
+        entry = _load_hash_cache(_hash_cache_path()).get(key) or {}
+    return entry.get(algo)
+
+
+def record_digest(file_path: str, algo: str, digest: str) -> None:
+    """记录已校验文件的摘要，键中包含文件的 stat 信息，文件变化后自动失效。"""
+    key = _hash_cache_key(file_path)
+    if key is None:
+        return
+    abs_path = os.path.abspath(file_path)
+    cache_path = _hash_cache_path()
+    with _hash_cache_lock:
+        cache = _load_hash_cache(cache_path)
+        # 同一路径只保留最新的 stat 记录，已删除文件的记录一并清理
+        cache = {k: v for k, v in cache.items()
+                 if k.rsplit('|', 3)[0] != abs_path and os.path.exists(k.rsplit('|', 3)[0])}
+        cache[key] = {algo: digest.lower()}
+        tmp_path = cache_path + '.tmp'
+        try:
+            os.makedirs(_hash_cache_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, indent=1)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print('Warning: unable to update hash cache {}: {}'.format(cache_path, e))
+
+
+def checksum(file_path: str, expected_checksum: tuple[str, str], use_cache: bool = True) -> bool:
+    """计算文件的校验和，并可选与预期值对比。
+
+    use_cache 为 True 时，文件大小、mtime、inode 未变化则直接使用已记录的摘要。
+
+    Returns True if checksum matches or no expected_checksum provided.
+    Raises DownloadError on failure or mismatch.
+    """
+    algo = _hash_algo(expected_checksum)
+    computed = cached_digest(file_path, algo) if use_cache else None
+    if computed is None:
+        try:
+            computed = _hash_file(file_path, hashlib.new(algo)).hexdigest()
+        except Exception as e:
+            raise DownloadError('Failed to compute checksum for {}: {}'.format(file_path, e))
+        if use_cache:
+            record_digest(file_path, algo, computed)
     checksum_value = expected_checksum[1]
     if checksum_value:
         if computed.lower() != checksum_value.lower():
             raise DownloadError('Checksum mismatch: expected {}, got {}'.format(checksum_value, computed))
     return True
 
-def download_component(url: str, dest_path: str, expected_checksum: Optional[tuple[str, str]] = None, chunk_size: int = 8192) -> str:
+# 分段下载的默认连接数与单段最小字节数，小文件不值得拆分
+DOWNLOAD_CONNECTIONS = 4
+SEGMENT_MIN_SIZE = 8 * 1024 * 1024
+
+
+# 断点续传元数据的落盘间隔（字节）
+CHECKPOINT_INTERVAL = 4 * 1024 * 1024
+
+
+def create_download_progress() -> Progress:
+    """创建下载进度条，可传给 download_component 供多个并发下载共用。"""
+    return Progress(TextColumn('{task.fields[filename]}', justify='right'), BarColumn(), DownloadColumn(), TransferSpeedColumn(), TimeRemainingColumn())
+
+
+class _DownloadProgress:
+    """rich 进度条的线程安全封装，供单流与分段下载共享。
+
+    传入 progress 时在该共享进度条上新增任务，不负责其启动与关闭。
+    """
+
+    def __init__(self, filename: str, total: Optional[int], completed: int = 0, progress: Optional[Progress] = None):
+        self.filename = filename
+        self.total = total
+        self.completed = completed
+        self.shared = progress is not None
+        self.progress = progress
+        self.task_id = None
+
+    def __enter__(self):
+        try:
+            if not self.shared:
+                self.progress = create_download_progress()
+                self.progress.__enter__()
+            self.task_id = self.progress.add_task('download', filename=self.filename, total=self.total or 0, completed=self.completed)
+        except (ImportError, TypeError):
+            self.progress = None
+        return self
+
+    def advance(self, size: int):
+        if self.progress and self.task_id is not None:
+            try:
+                self.progress.update(self.task_id, advance=size)
+            except (KeyError, AttributeError):
+                pass
+
+    def reset(self):
+        if self.progress and self.task_id is not None:
+            try:
+                self.progress.update(self.task_id, completed=0)
+            except (KeyError, AttributeError):
+                pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.progress and not self.shared:
+            try:
+                self.progress.__exit__(exc_type, exc_val, exc_tb)
+            except AttributeError:
+                pass
+        return False
+
+
+class _RangeIgnored(DownloadError):
+    """服务器声明支持 Range，分段请求却返回了完整内容。"""
+
+
+class _PartState:
+    """.part 文件的断点续传元数据，保存在 <dest>.part.json。
+
+    segments 为 [start, end, done] 列表：end 为闭区间终点（长度未知时为 None），
+    done 为该段已落盘的字节数。
+    """
+
+    def __init__(self, path: str, url: str, validator: Optional[str], total_size: Optional[int], segments: list):
+        self.path = path
+        self.url = url
+        self.validator = validator
+        self.total_size = total_size
+        self.segments = segments
+        self.lock = threading.Lock()
+        # 单段下载时边下载边计算摘要，不写入元数据
+        self.hasher = None
+
+    @classmethod
+    def load(cls, path: str, url: str, validator: Optional[str], total_size: Optional[int]) -> Optional['_PartState']:
+        """读取已有元数据；URL、校验标识或文件大小不一致时返回 None。"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not validator or data.get('url') != url or data.get('validator') != validator or data.get('total_size') != total_size:
+            return None
+        segments = data.get('segments')
+        if not isinstance(segments, list) or not segments:
+            return None
+        return cls(path, url, validator, total_size, segments)
+
+    @property
+    def done(self) -> int:
+        with self.lock:
+            return sum(seg[2] for seg in self.segments)
+
+    def advance(self, index: int, size: int):
+        with self.lock:
+            self.segments[index][2] += size
+
+    def reset(self, index: int):
+        with self.lock:
+            self.segments[index][2] = 0
+
+    def save(self):
+        # 多个下载线程共用同一个临时文件名，整个写入过程需要持锁
+        with self.lock:
+            data = {
+                'url': self.url,
+                'validator': self.validator,
+                'total_size': self.total_size,
+                'segments': [list(seg) for seg in self.segments],
+            }
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def remove(self):
+        for path in (self.path, self.path + '.tmp'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _probe_remote(session: requests.Session, url: str, timeout: int = 30) -> tuple[Optional[int], bool, Optional[str]]:
+    """通过 HEAD 请求探测远端文件大小、是否支持 Range 以及 ETag/Last-Modified。
+
+    Returns (total_size, accept_ranges, validator)，探测失败时返回 (None, False, None)。
+    """
+    try:
+        r = session.head(url, allow_redirects=True, timeout=timeout)
+        r.raise_for_status()
+    except requests.RequestException:
+        return None, False, None
+    try:
+        total_size = int(r.headers.get('Content-Length')) if r.headers.get('Content-Length') else None
+    except (ValueError, TypeError):
+        total_size = None
+    accept_ranges = r.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    validator = r.headers.get('ETag') or r.headers.get('Last-Modified')
+    return total_size, accept_ranges, validator
+
+
+def _split_ranges(total_size: int, connections: int) -> list[tuple[int, int]]:
+    """将 [0, total_size) 切分为至多 connections 段闭区间 (start, end)。"""
+    count = max(1, min(connections, total_size // SEGMENT_MIN_SIZE))
+    step = -(-total_size // count)
+    return [(start, min(start + step, total_size) - 1) for start in range(0, total_size, step)]
+
+
+def _fetch_segment(url: str, tmp_path: str, state: _PartState, index: int, chunk_size: int, progress: _DownloadProgress) -> None:
+    """下载第 index 段的剩余字节，并按偏移写入 .part 文件。
+
+    单段且从头下载时不发送 Range；续传或多段时发送 Range 与 If-Range，
+    单段续传时服务器返回 200 说明远端已变化，改为从头下载。
+    state.hasher 存在时随数据流更新摘要，续传时先补算本地已有部分。
+    每个线程使用独立的 Session 与文件句柄，避免共享连接和文件指针。
+    """
+    start, end, done = state.segments[index]
+    offset = start + done
+    if end is not None and offset > end:
+        return
+    single = len(state.segments) == 1
+    headers = {}
+    if offset > 0 or not single:
+        headers['Range'] = 'bytes={}-{}'.format(offset, '' if end is None else end)
+        if state.validator:
+            headers['If-Range'] = state.validator
+    with requests.Session() as session:
+        with session.get(url, headers=headers, stream=True, timeout=30) as r:
+            r.raise_for_status()
+            if headers and r.status_code != 206:
+                if not single:
+                    raise _RangeIgnored('Server ignored range request for {}'.format(url))
+                print('Warning: 服务器不支持续传或文件已变化，重新下载 {}'.format(url))
+                state.reset(index)
+                offset = 0
+            if state.hasher is not None:
+                state.hasher = hashlib.new(state.hasher.name)
+                if offset > 0:
+                    _hash_file(tmp_path, state.hasher, limit=offset)
+            mode = 'r+b' if offset > 0 or not single else 'wb'
+            with open(tmp_path, mode) as f:
+                f.seek(offset)
+                pending = 0
+                try:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            if state.hasher is not None:
+                                state.hasher.update(chunk)
+                            pending += len(chunk)
+                            progress.advance(len(chunk))
+                            if pending >= CHECKPOINT_INTERVAL:
+                                # 先落盘再记录进度，保证元数据不超前于文件内容
+                                f.flush()
+                                state.advance(index, pending)
+                                pending = 0
+                                state.save()
+                finally:
+                    f.flush()
+                    state.advance(index, pending)
+    start, end, done = state.segments[index]
+    if end is not None and done != end - start + 1:
+        raise DownloadError('Incomplete segment {}-{} of {}: got {} bytes'.format(start, end, url, done))
+
+
+def _download_segments(url: str, tmp_path: str, state: _PartState, chunk_size: int, progress: _DownloadProgress) -> None:
+    """下载所有未完成的段；多段时使用线程池并发下载。"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    if len(state.segments) == 1:
+        _fetch_segment(url, tmp_path, state, 0, chunk_size, progress)
+        return
+    if not os.path.exists(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.truncate(state.total_size)
+    with ThreadPoolExecutor(max_workers=len(state.segments)) as executor:
+        futures = [executor.submit(_fetch_segment, url, tmp_path, state, index, chunk_size, progress) for index in range(len(state.segments))]
+        for future in futures:
+            future.result()
+
+
+def _remove_quietly(path: str):
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except (FileNotFoundError, PermissionError):
+            pass
+
+
+
+# 即时删除模式的默认回收目录名，位于被删除目录的上级目录（保证 rename 在同一文件系统内）
+TRASH_DIR_NAME = '.build-qt-trash'
+
+
+def _force_remove(func, path: str) -> None:
+    """删除文件或空目录，遇到只读属性时去掉后重试；已被删除时忽略。
+
+    POSIX 上删除权限取决于所在目录，因此同时为上级目录加上写与执行权限。
+    """
+    try:
+        func(path)
+    except FileNotFoundError:
+        pass
+    except PermissionError:
+        parent = os.path.dirname(path)
+        try:
+            os.chmod(parent, os.stat(parent).st_mode | stat.S_IWRITE | stat.S_IREAD | stat.S_IEXEC)
+        except OSError:
+            pass
+        if not os.path.islink(path):
+            os.chmod(path, stat.S_IWRITE | stat.S_IREAD | (stat.S_IEXEC if func is os.rmdir else 0))
+        func(path)
+
+
+def _scan_and_unlink(path: str) -> list[str]:
+    """删除目录中的文件与链接，返回子目录列表。"""
+    subdirs = []
+    try:
+        it = os.scandir(path)
+    except FileNotFoundError:
+        return subdirs
+    with it:
+        for entry in it:
+            if entry.is_symlink():
+                _force_remove(os.unlink, entry.path)
+            elif getattr(entry, 'is_junction', lambda: False)():
+                # Windows 目录联接：只删除联接本身
+                _force_remove(os.rmdir, entry.path)
+            elif entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            else:
+                _force_remove(os.unlink, entry.path)
+    return subdirs
+
+
+def _rmtree_parallel(path: str, workers: int) -> None:
+    """按目录并行扫描并删除文件，再从深到浅删除目录。"""
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    levels: Dict[int, list] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_and_unlink, path): (path, 0)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory, depth = pending.pop(future)
+                levels.setdefault(depth, []).append(directory)
+                for subdir in future.result():
+                    pending[pool.submit(_scan_and_unlink, subdir)] = (subdir, depth + 1)
+        for depth in sorted(levels, reverse=True):
+            list(pool.map(lambda d: _force_remove(os.rmdir, d), levels[depth]))
+
+
+# 本进程中正在被后台线程删除的回收目录条目；每个条目只由一个线程删除
+_purging = set()
+_purging_lock = threading.Lock()
+
+
+def _purge_in_background(trash_dir: str, entry: str, workers: int) -> threading.Thread:
+    """后台删除回收目录中的 entry，以及以往中断遗留、尚无线程认领的条目；回收目录清空后一并删除。"""
+    def run():
+        with _purging_lock:
+            try:
+                leftovers = [e.path for e in os.scandir(trash_dir) if e.path not in _purging]
+            except OSError:
+                leftovers = []
+            paths = [entry] + [p for p in leftovers if p != entry]
+            _purging.update(paths)
+        try:
+            for path in paths:
+                try:
+                    _rmtree_parallel(path, workers)
+                except OSError as e:
+                    print('Warning: 后台删除 {} 失败: {}'.format(path, e))
+        finally:
+            with _purging_lock:
+                _purging.difference_update(paths)
+                if not any(os.path.dirname(p) == trash_dir for p in _purging):
+                    try:
+                        # 仍有内容（其他进程刚移入的目录）时 rmdir 失败，留给下一次删除
+                        os.rmdir(trash_dir)
+                    except OSError:
+                        pass
+
+    # 非守护线程：进程退出前会等待删除完成
+    thread = threading.Thread(target=run, name='remove_tree')
+    thread.start()
+    return thread
+
+
+def remove_tree(path: str, instant: bool = False, workers: Optional[int] = None,
+                trash_dir: Optional[str] = None) -> Optional[threading.Thread]:
+    """删除目录树（或单个文件/链接），path 不存在时直接返回。
+
+    - 默认以 os.scandir 按目录并行扫描、并行删除文件，再从深到浅删除目录；只读文件自动去掉只读属性
+    - instant=True 时先将目录改名移入回收目录，立即返回，由后台线程删除移入的目录（以及以往中断遗留的内容）；
+      改名失败（例如回收目录在其他文件系统上）时退回同步删除
+    - trash_dir: 回收目录，默认为上级目录下的 TRASH_DIR_NAME；被删除目录位于源码树中时应指定源码树之外的目录
+
+    Returns 后台删除线程（instant 模式），同步删除时返回 None。
+    Raises OSError 同步删除失败时抛出。
+    """
+    from .ziptools.ziplongpaths import FWP
+
+    path = FWP(os.path.abspath(path), force=True)
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    if os.path.islink(path) or os.path.isfile(path):
+        _force_remove(os.unlink, path)
+        return None
+    if not os.path.isdir(path):
+        return None
+    if instant:
+        trash_dir = FWP(os.path.abspath(trash_dir), force=True) if trash_dir else os.path.join(os.path.dirname(path), TRASH_DIR_NAME)
+        import uuid
+        entry = os.path.join(trash_dir, '{}-{}'.format(os.path.basename(path), uuid.uuid4().hex[:8]))
+        # 回收目录可能在创建后被清空它的后台线程删除，此时重试一次
+        for _ in range(2):
+            try:
+                os.makedirs(trash_dir, exist_ok=True)
+                os.rename(path, entry)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                break
+            return _purge_in_background(trash_dir, entry, workers)
+    _rmtree_parallel(path, workers)
+    return None
+
+def download_component(url: str, dest_path: str, expected_checksum: Optional[tuple[str, str]] = None, chunk_size: int = 1024 * 1024,
+                       connections: int = DOWNLOAD_CONNECTIONS, resume: bool = True, cache: Optional['ArtifactCache'] = None,
+                       progress: Optional[Progress] = None) -> str:
     """下载单个组件到本地路径，并可选校验 sha256 校验和。
 
+    connections > 1 且服务器支持 Range 时，按 Content-Length 切分字节段并发下载；
+    否则回退为单连接顺序下载。
+    resume 为 True 时，失败后保留 .part 与 .part.json，下次调用在远端 ETag/Last-Modified
+    未变化时只请求缺失的字节段。
+    单连接下载时摘要随数据流计算，分段下载时在移动前对 .part 计算一次；
+    校验通过的摘要写入缓存，后续调用无需再次读取文件。
+    cache 为共享构件缓存，预期 sha256 已知时先从缓存获取，下载校验后发布到缓存。
+    progress 为共享进度条（见 create_download_progress），并发下载多个组件时使用。
+
     Returns saved file path.
     Raises DownloadError on failure.
     """
@@ -73,136 +598,416 @@ def download_component(url: str, dest_path: str, expected_checksum: Optional[tup
         else:
             return dest_path  # 文件已存在且不需要校验，直接返回
     os.makedirs(os.path.dirname(os.path.abspath(dest_path)) or '.', exist_ok=True)
+    cache_digest = None
+    if cache is not None and expected_checksum and expected_checksum[1] and _hash_algo(expected_checksum) == 'sha256':
+        cache_digest = expected_checksum[1].lower()
+        try:
+            if cache.fetch(cache_digest, dest_path):
+                record_digest(dest_path, 'sha256', cache_digest)
+                return dest_path
+        except OSError as e:
+            print('Warning: 读取构件缓存失败: {}'.format(e))
     tmp_path = dest_path + '.part'
+    state = None
     try:
-        session = requests.Session()
-        with session.get(url, stream=True, timeout=30) as r:
-            r.raise_for_status()
-            total = 0
-            # try to get total size from headers
+        with requests.Session() as session:
+            total_size, accept_ranges, validator = _probe_remote(session, url)
+        if resume and accept_ranges and os.path.exists(tmp_path):
+            state = _PartState.load(tmp_path + '.json', url, validator, total_size)
+            if state:
+                print('Info: 从 {} 继续下载，已完成 {} 字节'.format(tmp_path, state.done))
+        if state is None:
+            _remove_quietly(tmp_path)
+            if connections > 1 and accept_ranges and total_size:
+                segments = [[start, end, 0] for start, end in _split_ranges(total_size, connections)]
+            else:
+                segments = [[0, total_size - 1 if total_size else None, 0]]
+            state = _PartState(tmp_path + '.json', url, validator if accept_ranges else None, total_size, segments)
+        algo = _hash_algo(expected_checksum) if expected_checksum else None
+        if algo and len(state.segments) == 1:
+            state.hasher = hashlib.new(algo)
+        with _DownloadProgress(os.path.basename(dest_path), total_size, completed=state.done, progress=progress) as task_progress:
             try:
-                total_size = int(r.headers.get('Content-Length')) if r.headers.get('Content-Length') else None
-            except (ValueError, TypeError):
-                total_size = None
-            task_id = None
+                _download_segments(url, tmp_path, state, chunk_size, task_progress)
+            except _RangeIgnored:
+                print('Warning: 服务器忽略了 Range 请求，改为单连接下载 {}'.format(url))
+                state.remove()
+                _remove_quietly(tmp_path)
+                state = _PartState(tmp_path + '.json', url, None, total_size, [[0, total_size - 1 if total_size else None, 0]])
+                if algo:
+                    state.hasher = hashlib.new(algo)
+                task_progress.reset()
+                _download_segments(url, tmp_path, state, chunk_size, task_progress)
+        computed = None
+        if algo:
+            hasher = state.hasher or _hash_file(tmp_path, hashlib.new(algo))
+            computed = hasher.hexdigest()
+            if expected_checksum[1] and computed.lower() != expected_checksum[1].lower():
+                # 内容已损坏，不再保留续传数据
+                state.remove()
+                _remove_quietly(tmp_path)
+                raise DownloadError('Checksum mismatch: expected {}, got {}'.format(expected_checksum[1], computed))
+        state.remove()
+        # move to final location
+        shutil.move(tmp_path, dest_path)
+        if computed:
+            record_digest(dest_path, algo, computed)
+        if cache_digest:
             try:
-                rich_progress = Progress(TextColumn('{task.fields[filename]}', justify='right'), BarColumn(), DownloadColumn(), TransferSpeedColumn(), TimeRemainingColumn())
-                rich_progress.__enter__()
-                task_id = rich_progress.add_task('download', filename=os.path.basename(dest_path), total=total_size or 0)
-            except (ImportError, TypeError):
-                rich_progress = None
-
+                cache.publish(dest_path, cache_digest)
+            except OSError as e:
+                print('Warning: 发布到构件缓存失败: {}'.format(e))
+        return dest_path
+    except BaseException as e:
+        # 可续传时保留 .part 与元数据，否则清理
+        if resume and state is not None and state.validator and os.path.exists(tmp_path):
             try:
-                with open(tmp_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            total += len(chunk)
-                            # update rich progress if present
-                            if rich_progress and task_id is not None:
-                                try:
-                                    rich_progress.update(task_id, advance=len(chunk))
-                                except (KeyError, AttributeError):
-                                    pass
-            finally:
-                if rich_progress:
-                    try:
-                        rich_progress.__exit__(None, None, None)
-                    except AttributeError:
-                        pass
-            # move to final location
-            shutil.move(tmp_path, dest_path)
-            if expected_checksum:
-                if not checksum(dest_path, expected_checksum=expected_checksum):
-                    raise DownloadError('Checksum mismatch: expected {}'.format(expected_checksum[1]))
-            return dest_path
-    except requests.RequestException as e:
-        # cleanup
-        if os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except (FileNotFoundError, PermissionError):
-                pass
-        raise DownloadError('Failed to download {}: {}'.format(url, e))
-    except Exception:
-        if os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except (FileNotFoundError, PermissionError):
+                state.save()
+                print('Info: 下载中断，已保留 {}，再次执行将继续下载'.format(tmp_path))
+            except OSError:
                 pass
+        else:
+            _remove_quietly(tmp_path)
+            if state is not None:
+                state.remove()
+        if isinstance(e, requests.RequestException):
+            raise DownloadError('Failed to download {}: {}'.format(url, e))
         raise
 
-def extract_archive(archive_path: str, dest_dir: str, overwrite: bool = True) -> str:
-    """Extract a zip, tar, or 7z archive to dest_dir.
+def download_and_extract(url: str, dest_dir: str, expected_checksum: Optional[tuple[str, str]] = None, archive_name: Optional[str] = None,
+                         overwrite: bool = True, chunk_size: int = 1024 * 1024, progress: Optional[Progress] = None,
+                         include: Optional[list] = None, exclude: Optional[list] = None) -> str:
+    """边下载边解压 zip / tar 包到 dest_dir，存档本身不落盘。
 
-    Supports .zip, .tar, .tar.gz, .tgz, .7z
-    Returns the destination directory where files were extracted.
+    解压先写入 dest_dir + '.partial'，数据流结束后校验摘要，通过后再替换 dest_dir；
+    校验失败时删除已解压内容。存档使用无法流式处理的特性时抛出 StreamUnsupported，
+    此时目标目录保持不变，调用方可回退到 download_component + extract_archive。
+    include/exclude 为成员路径 glob 列表，只解压匹配的成员。
+
+    Returns the destination directory.
+    Raises DownloadError on failure.
     """
-    import os
-    import shutil
-    import stat
     import tarfile
-    import py7zr
+    from .stream_extract import HashingReader, StreamExtractError, StreamUnsupported, extract_stream
+
+    archive_name = archive_name or os.path.basename(url.split('?')[0])
+    if not overwrite and os.path.exists(dest_dir) and os.listdir(dest_dir):
+        print('Info: destination directory {} already exists and is not empty, skipping extraction'.format(dest_dir))
+        return dest_dir
+    algo = _hash_algo(expected_checksum) if expected_checksum else None
+    staging_dir = dest_dir + '.partial'
+    if os.path.exists(staging_dir):
+        remove_tree(staging_dir, instant=True)
+    os.makedirs(staging_dir)
+    try:
+        with requests.Session() as session:
+            with session.get(url, stream=True, timeout=30) as r:
+                r.raise_for_status()
+                try:
+                    total_size = int(r.headers.get('Content-Length')) if r.headers.get('Content-Length') else None
+                except (ValueError, TypeError):
+                    total_size = None
+                with _DownloadProgress(archive_name, total_size, progress=progress) as task_progress:
+                    reader = HashingReader(r.iter_content(chunk_size=chunk_size), hashlib.new(algo) if algo else None, task_progress.advance)
+                    count = extract_stream(reader, staging_dir, archive_name, include, exclude)
+                    reader.drain()
+        if algo:
+            computed = reader.hasher.hexdigest()
+            if expected_checksum[1] and computed.lower() != expected_checksum[1].lower():
+                raise DownloadError('Checksum mismatch: expected {}, got {}'.format(expected_checksum[1], computed))
+        remove_tree(dest_dir, instant=True)
+        _remove_extract_manifest(dest_dir)
+        os.replace(staging_dir, dest_dir)
+        print('解压完成: {} -> {}（{} 个成员）'.format(archive_name, dest_dir, count))
+        return dest_dir
+    except BaseException as e:
+        remove_tree(staging_dir, instant=True)
+        if isinstance(e, requests.RequestException):
+            raise DownloadError('Failed to download {}: {}'.format(url, e))
+        if isinstance(e, (StreamExtractError, tarfile.TarError)) and not isinstance(e, StreamUnsupported):
+            raise DownloadError('Failed to extract {}: {}'.format(archive_name, e))
+        raise
+
+# 解压清单放在目标目录旁：<dest_dir>.extract.json
+EXTRACT_MANIFEST_SUFFIX = '.extract.json'
+_ARCHIVE_FORMATS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.xz', '.txz', '.tar.zst', '.tzst', '.7z')
 
-    def on_rm_error(func, path, exc_info):
-        """处理只读文件的删除"""
+
+def _archive_sha256(archive_path: str) -> str:
+    digest = cached_digest(archive_path, 'sha256')
+    if digest is None:
+        digest = _hash_file(archive_path, hashlib.sha256()).hexdigest()
+        record_digest(archive_path, 'sha256', digest)
+    return digest
+
+
+def _extract_manifest_path(dest_dir: str) -> str:
+    return os.path.abspath(dest_dir) + EXTRACT_MANIFEST_SUFFIX
+
+
+def _load_extract_manifest(dest_dir: str, digest: str, filters: Optional[Dict]) -> Optional[Dict]:
+    """读取解压清单，存档摘要或成员过滤规则（filters 为 None 时不比较）不一致时返回 None。"""
+    try:
+        with open(_extract_manifest_path(dest_dir), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('archive_sha256') != digest or (filters is not None and manifest.get('filters') != filters):
+            return None
+        if not isinstance(manifest.get('members'), dict):
+            return None
+        return manifest
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _changed_members(dest_dir: str, members: Dict) -> list:
+    """按 lstat 比对大小与修改时间，返回缺失或被修改的成员名。"""
+    changed = []
+    for name, (size, mtime_ns, _) in members.items():
         try:
-            os.chmod(path, stat.S_IWRITE)
-            func(path)
-        except (PermissionError, FileNotFoundError):
-            print('Warning: unable to extract {} to {},{}'.format(archive_path, dest_dir, exc_info))
-            pass
+            st = os.lstat(os.path.join(dest_dir, *name.split('/')))
+        except OSError:
+            changed.append(name)
+            continue
+        if st.st_size != size or st.st_mtime_ns != mtime_ns:
+            changed.append(name)
+    return changed
+
+
+def _record_members(dest_dir: str, names: list, crcs: Dict, members: Dict) -> None:
+    for name in names:
+        try:
+            st = os.lstat(os.path.join(dest_dir, *name.split('/')))
+        except OSError:
+            continue
+        members[name] = [st.st_size, st.st_mtime_ns, crcs.get(name)]
+
+
+def _remove_extract_manifest(dest_dir: str) -> None:
+    _remove_quietly(_extract_manifest_path(dest_dir))
+
+
+def extract_archive(archive_path: str, dest_dir: str, overwrite: bool = True, workers: Optional[int] = None,
+                    include: Optional[list] = None, exclude: Optional[list] = None, merge: bool = False) -> str:
+    """Extract a zip, tar, or 7z archive to dest_dir.
+
+    Supports .zip, .tar, .tar.gz, .tgz, .tar.xz, .txz, .tar.zst, .tzst, .7z
+    workers: zip 解压的进程数，默认使用 CPU 核心数；1 为串行解压
+    include/exclude: 成员路径 glob 列表（见 stream_extract.member_filter），只解压匹配的成员
+    merge: 为 True 时解压到已有目录而不先清空（用于按需补充成员），忽略 overwrite
+
+    解压后在目标目录旁写入 <dest_dir>.extract.json，记录存档 sha256、过滤规则以及每个成员的大小、
+    修改时间与 CRC。再次以相同存档和过滤规则解压时只对成员做 lstat 比对：全部一致则跳过，
+    否则只重新解压缺失或被修改的成员，不再清空目录。
+    Returns the destination directory where files were extracted.
+    """
+    import py7zr
+    from .stream_extract import extract_tar_members, member_filter, member_name
 
     if not os.path.exists(archive_path):
         raise DownloadError('未找到存档: {}'.format(archive_path))
+    lower = archive_path.lower()
+    if not lower.endswith(_ARCHIVE_FORMATS):
+        raise DownloadError('Unsupported archive format: {}'.format(archive_path))
 
-    if not overwrite and os.path.exists(dest_dir) and os.listdir(dest_dir):
+    if not merge and not overwrite and os.path.exists(dest_dir) and os.listdir(dest_dir):
         print('Info: destination directory {} already exists and is not empty, skipping extraction'.format(dest_dir))
         return dest_dir
+
+    digest = _archive_sha256(archive_path)
+    filters = {'include': list(include or []), 'exclude': list(exclude or [])}
+    select = member_filter(include, exclude)
+    manifest = None
+    if os.path.isdir(dest_dir):
+        manifest = _load_extract_manifest(dest_dir, digest, None if merge else filters)
+    if merge:
+        # 补充解压的成员并入已有清单（清单与本次存档不符时不再记录）
+        if manifest is None:
+            _remove_extract_manifest(dest_dir)
+    elif manifest is not None:
+        changed = _changed_members(dest_dir, manifest['members'])
+        if not changed:
+            print('Info: {} 与上次解压结果一致，跳过解压'.format(dest_dir))
+            return dest_dir
+        print('Info: {} 中有 {} 个文件缺失或被修改，重新解压这些文件'.format(dest_dir, len(changed)))
+        repair = set(changed)
+        select = lambda name: member_name(name) in repair
     else:
-        if os.path.exists(dest_dir):
-            shutil.rmtree(dest_dir, onerror=on_rm_error)
+        remove_tree(dest_dir, instant=True)
+        _remove_extract_manifest(dest_dir)
+        manifest = {'archive': os.path.abspath(archive_path), 'archive_sha256': digest, 'filters': filters, 'members': {}}
     os.makedirs(dest_dir, exist_ok=True)
 
-    lower = archive_path.lower()
+    names = []
+    crcs = {}
     if lower.endswith('.zip'):
+        from zipfile import ZipFile
         from .ziptools import extractzipfile
-        extractzipfile(archive_path, dest_dir, trace=None, permissions=True)
+        stats = extractzipfile(archive_path, dest_dir, trace=None, permissions=True,
+                               workers=workers or os.cpu_count() or 1, select=select)
+        if stats.skipped:
+            # 不写入清单：全新解压时清单已删除，修复时旧清单保留，下次调用仍会重新解压这些成员
+            raise DownloadError('解压 {} 时有 {} 个成员失败: {}'.format(
+                archive_path, stats.skipped, ', '.join(stats.skippednames[:5])))
+        with ZipFile(archive_path) as z:
+            for info in z.infolist():
+                if not info.filename.endswith('/') and (select is None or select(info.filename)):
+                    names.append(member_name(info.filename))
+                    crcs[names[-1]] = info.CRC
         print('解压完成: {} -> {}'.format(archive_path, dest_dir))
 
-    elif lower.endswith('.tar') or lower.endswith('.tar.gz') or lower.endswith('.tgz'):
-        mode = 'r:gz' if (lower.endswith('.tar.gz') or lower.endswith('.tgz')) else 'r'
-        with tarfile.open(archive_path, mode) as t:
-            members = t.getmembers()
-            for m in members:
-                t.extract(m, dest_dir)
+    elif lower.endswith(('.tar', '.tar.gz', '.tgz', '.tar.xz', '.txz')):
+        # tarfile 流模式自动识别 gz/xz 压缩
+        with open(archive_path, 'rb') as f:
+            extract_tar_members(f, dest_dir, select=select, names=names)
+
+    elif lower.endswith(('.tar.zst', '.tzst')):
+        zstandard = _import_zstandard()
+        with open(archive_path, 'rb') as f:
+            # 解压窗口上限放宽到 2 GiB，兼容 long-distance matching 产生的大窗口
+            with zstandard.ZstdDecompressor(max_window_size=2 ** 31).stream_reader(f) as reader:
+                extract_tar_members(reader, dest_dir, mode='r|', select=select, names=names)
 
-    elif lower.endswith('.7z'):
-        with py7zr.SevenZipFile(archive_path, mode='r') as z:
-            z.extractall(path=dest_dir)
     else:
-        raise DownloadError('Unsupported archive format: {}'.format(archive_path))
+        with py7zr.SevenZipFile(archive_path, mode='r') as z:
+            for info in z.list():
+                if not info.is_directory and (select is None or select(info.filename)):
+                    names.append(member_name(info.filename))
+                    crcs[names[-1]] = info.crc32
+            if select is None:
+                z.extractall(path=dest_dir)
+            else:
+                z.extract(path=dest_dir, targets=[n for n in z.getnames() if select(n)])
 
+    if manifest is not None:
+        _record_members(dest_dir, names, crcs, manifest['members'])
+        tmp_path = _extract_manifest_path(dest_dir) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, _extract_manifest_path(dest_dir))
     return dest_dir
 
-def create_archive(source_dir: str, archive_path: str, _format: str = 'zip') -> str:
-    """Create an archive (zip or tar.gz) from source_dir.
+# create_archive 支持的格式及其输出后缀
+ARCHIVE_SUFFIXES = {
+    'zip': '.zip',
+    'tar.gz': '.tar.gz',
+    'tgz': '.tar.gz',
+    'tar.xz': '.tar.xz',
+    'txz': '.tar.xz',
+    'tar.zst': '.tar.zst',
+    'tzst': '.tar.zst',
+}
+# 各格式的默认压缩级别
+DEFAULT_LEVELS = {'.zip': 6, '.tar.gz': 6, '.tar.xz': 6, '.tar.zst': 10}
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise DownloadError('tar.zst 需要 zstandard 模块，请执行 pip install zstandard')
+    return zstandard
+
+
+def _create_tar_zst(source_dir: str, archive_path: str, level: int, workers: int, long_distance: bool) -> None:
+    """多线程 zstd 压缩 tar 流；long_distance 开启长距离匹配（128 MiB 窗口）。"""
+    zstandard = _import_zstandard()
+    params = zstandard.ZstdCompressionParameters.from_level(level, threads=workers if workers > 1 else 0,
+                                                            enable_ldm=long_distance,
+                                                            window_log=27 if long_distance else 0)
+    with open(archive_path, 'wb') as f:
+        with zstandard.ZstdCompressor(compression_params=params).stream_writer(f, closefd=False) as writer:
+            with tarfile.open(fileobj=writer, mode='w|') as t:
+                t.add(source_dir, arcname='.')
+
+
+# 并行压缩的数据量下限：更小的目录分块与线程调度的开销抵消了并行收益，使用单线程压缩
+PARALLEL_PACK_MIN_SIZE = 64 * 1024 * 1024
+
+
+def _pack_workers(source_dir: str, workers: int) -> int:
+    """实际使用的压缩线程数：不超过 CPU 核心数；单核或目录小于 PARALLEL_PACK_MIN_SIZE 时为 1。"""
+    workers = min(workers, os.cpu_count() or 1)
+    if workers <= 1:
+        return 1
+    total = 0
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+            if total >= PARALLEL_PACK_MIN_SIZE:
+                return workers
+    return 1
+
+
+def create_archive(source_dir: str, archive_path: str, _format: str = 'zip', workers: int = 1, level: Optional[int] = None,
+                   long_distance: bool = False, baseline: Optional[str] = None) -> str:
+    """Create an archive (zip, tar.gz, tar.xz or tar.zst) from source_dir.
+
+    zip/tar.gz 由 parallel_pack 分块压缩（输出仍为标准 zip/gzip），workers > 1 时并行；
+    tar.zst 使用 zstd 多线程压缩；tar.xz 使用标准库 lzma。workers 不超过 CPU 核心数，单核或目录小于
+    PARALLEL_PACK_MIN_SIZE 时按 1 处理（单核上并行没有收益，对比见 benchmarks/bench_pack.py）。
+    level 为空时使用各格式的默认级别，任何 workers 下都生效；long_distance 仅对 tar.zst 生效。
+    zip 格式同时写出 <archive>.manifest.json；baseline 为上一次的 zip，
+    其中未变化的成员直接复用已压缩数据（增量打包）。
 
     Returns the path to the created archive.
     """
-    import shutil
-    import os
-
     if not os.path.isdir(source_dir):
         raise ValueError('Source directory does not exist: {}'.format(source_dir))
 
     _format = _format.lower()
-    if _format not in ('zip', 'tar.gz', 'tgz'):
+    if _format not in ARCHIVE_SUFFIXES:
         raise ValueError('Unsupported archive format: {}'.format(_format))
 
-    base_name = os.path.splitext(archive_path)[0] if _format == 'zip' else os.path.splitext(os.path.splitext(archive_path)[0])[0]
+    suffix = ARCHIVE_SUFFIXES[_format]
+    level = DEFAULT_LEVELS[suffix] if level is None else level
+    base_name = archive_path
+    for known in set(ARCHIVE_SUFFIXES.values()) | {'.' + _format}:
+        if base_name.lower().endswith(known):
+            base_name = base_name[:-len(known)]
+            break
+    workers = _pack_workers(source_dir, workers)
     print('Creating archive {} in {}'.format(base_name, source_dir))
-    archive_full_path = shutil.make_archive(base_name, 'zip' if _format == 'zip' else 'gztar', root_dir=source_dir)
+    from .parallel_pack import MANIFEST_SUFFIX, create_tar_gz, create_zip
+    archive_full_path = base_name + suffix
+    tmp_path = archive_full_path + '.part'
+    manifest = None
+    try:
+        if suffix == '.zip':
+            manifest = create_zip(source_dir, tmp_path, workers, level, baseline=baseline)
+        elif suffix == '.tar.gz':
+            create_tar_gz(source_dir, tmp_path, workers, level)
+        elif suffix == '.tar.xz':
+            with tarfile.open(tmp_path, 'w:xz', preset=level) as t:
+                t.add(source_dir, arcname='.')
+        else:
+            _create_tar_zst(source_dir, tmp_path, level, workers, long_distance)
+        os.replace(tmp_path, archive_full_path)
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+    if manifest is not None:
+        with open(archive_full_path + MANIFEST_SUFFIX, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        if baseline:
+            print('增量打包: 复用 {} 个成员，重新压缩 {} 个成员'.format(manifest['reused'], manifest['compressed']))
 
     print('Created archive: {} from {}'.format(archive_full_path, source_dir))
-    return archive_full_path
\ No newline at end of file
+    return archive_full_path
+
+
+def apply_delta(delta_path: str, target_dir: str) -> dict:
+    """Apply a delta package (see delta_pack.create_delta) to target_dir.
+
+    target_dir 应为基线产物包解压后的目录；应用前校验基线文件，写出的每个文件都经过 sha256 校验。
+    Returns the delta description (delta.json).
+    """
+    from .delta_pack import apply_delta_package
+    if not os.path.exists(delta_path):
+        raise DownloadError('未找到差量包: {}'.format(delta_path))
+    meta = apply_delta_package(delta_path, target_dir)
+    print('差量包已应用: {} -> {}（补丁 {} 个，文件 {} 个，删除 {} 个）'.format(
+        delta_path, target_dir, len(meta['patches']), len(meta['files']), len(meta['removed'])))
+    return meta
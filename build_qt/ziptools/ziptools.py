@@ -16,7 +16,8 @@ points are these two (see ahead for more on their arguments):
                      
    extractzipfile(zipname, pathto='.',
            nofixlinks=False,  trace=print, 
-           permissions=False, nomangle=False)
+           permissions=False, nomangle=False,
+           workers=1,         select=None)
 
 Pass "trace=lambda *p, **k: None" to silence most messages from these calls.
 See also scripts zip-create.py and zip-extract.py for command-line clients,
@@ -74,17 +75,15 @@ _builtinprint = print
 
 def tryrmtree(folder, trace=print):
 
-    if os.path.exists(FWP(folder)):
+    if os.path.lexists(FWP(folder)):
         trace('Removing', folder)
         try:
-            if os.path.islink(FWP(folder)):
-                os.remove(FWP(folder))
-            else:
-                shutil.rmtree(FWP(folder, force=True))    # recurs: always \\?\
+            # build_qt's parallel deleter: links, read-only files, long paths
+            from ..utils import remove_tree
+            remove_tree(folder)
         except Exception as why:
-            print('shutil.rmtree (or os.remove) failed:', why)
-            input('Try running again, and press Enter to exit.')
-            sys.exit(1)
+            print('remove_tree failed:', why)
+            raise
 
 
 
@@ -182,14 +181,30 @@ class ExtractStats(CreateStats):
     """
     attrs = ['files', 'folders', 'symlinks', 'unknowns', 'mangled', 'skipped']
 
+    def __init__(self):
+        CreateStats.__init__(self)
+        self.workers = []      # parallel extracts: (files, bytes, seconds) per worker
+        self.skippednames = [] # zip names of items that failed and were skipped
+
+    def __iadd__(self, other):           # also merge skipped names from workers
+        CreateStats.__iadd__(self, other)
+        self.skippednames += other.skippednames
+        return self
+
     def __repr__(self, format='%s=%%d'):
         """
         Don't show mangled or skipped if 0: rare and too much info
+        Show per-worker throughput only for parallel extracts
         """
         self.attrs = ExtractStats.attrs[:]      # .copy(), but work in py 2.X 
         for attr in ['mangled', 'skipped']:
               if getattr(self, attr) == 0: self.attrs.remove(attr)
-        return CreateStats.__repr__(self, format)
+        display = CreateStats.__repr__(self, format)
+        if self.workers:
+            rates = ['%d files %.1fMB/s' % (files, nbytes / max(seconds, 1e-6) / 1e6)
+                     for (files, nbytes, seconds) in self.workers]
+            display += ', workers=[%s]' % '; '.join(rates)
+        return display
 
 
 
@@ -534,12 +549,200 @@ def trymangle(zipinfo, pathto, nomangle=False, trace=print):
 
 #===============================================================================
 
+def extractzipitem(zipfile,             # open zipfile.ZipFile object to extract from
+                   zipinfo,             # item to extract (may be mangled in place)
+                   pathto,              # \\?\-prefixed abs folder to extract to
+                   pathtoWasRelative,   # user gave relative pathto? (for display)
+                   stats,               # ExtractStats counters, updated in place
+                   dirmodtimes,         # deferred (path, modtime) for folders
+                   nofixlinks=False,    # do not translate symlink separators?
+                   trace=print,         # trace router (or lambda *p, **k: None)
+                   permissions=False,   # propagate saved permisssions?
+                   nomangle=False):     # don't mod bad filename chars to '_' on errors?
+    """
+    -----------------------------------------------------------------------
+    Extract one item with its permissions and modtime; split off from
+    extractzipfile so parallel workers can share it.  Folder modtimes are
+    deferred to dirmodtimes, to be reset after all files are added.
+    -----------------------------------------------------------------------
+    """
+    origname = zipinfo.filename                 # before trymangle mods
+
+    # 
+    # extract one item
+    #
+    try:
+        if isSymlink(zipinfo):
+            # read/save link path: stubs on non-mangle failures
+            trace('(Link)', end=' ')
+            try:
+                savepath = extractSymlink(
+                       zipinfo, pathto, zipfile, nofixlinks, trace)
+            except:
+                # retry with mangled name? [1.3]
+                if trymangle(zipinfo, pathto, nomangle, trace):
+                    savepath = extractSymlink(
+                           zipinfo, pathto, zipfile, nofixlinks, trace, origname)
+                    stats.mangled += 1
+                else:
+                    raise  # reraise
+
+        else:
+            # create file or dir: skip on all failures
+            try:
+                savepath = zipfile.extract(zipinfo, pathto) 
+            except:
+                # retry with mangled name? [1.3]
+                if trymangle(zipinfo, pathto, nomangle, trace):
+                    savepath = zipfile.extract(zipinfo, pathto) 
+                    stats.mangled += 1
+                else:
+                    raise  # reraise
+
+    except Exception as E:
+        # continue with rest on any item failure post mangle retry [1.3]
+        stats.skipped += 1
+        stats.skippednames.append(origname)
+        trace('**SKIP - item failed and skipped:', zipinfo.filename)
+        trace('Python exception: %s, %s' % (E.__class__.__name__, E))
+        return    # caller goes on to next zipinfo
+            
+    # show both from+to paths iff they differ
+    filename = zipinfo.filename                          # item's path in zip 
+    showname = showpath(savepath, pathtoWasRelative)     # undo fwp on windows           
+    trace3(filename, showname, trace)                    # show 1 or 2 lines [1.3]
+
+    # 
+    # propagate permissions from/to Unix for all, iff enabled [1.1]
+    #
+    if permissions:
+        try:                                          # create saved perms
+            perms = zipinfo.external_attr >> 16       # to lower 16 bits
+            if perms != 0:
+
+                if os.path.islink(savepath):
+                    # mod link itself, where supported
+                    # not on Windows, Py3.2 and earlier
+                    # Mac OS bug moot: no-op on exFAT
+ 
+                    if (hasattr(os, 'supports_follow_symlinks') and
+                        os.chmod in os.supports_follow_symlinks):
+                        os.chmod(savepath, perms, follow_symlinks=False)
+
+                    # Unix Py 2.X and 3.2- have lchmod, but not f_s
+                    elif hasattr(os, 'lchmod'):
+                        os.lchmod(savepath, perms)
+
+                else:
+                    # mod file or dir, where supported (exFAT=no-op)
+                    os.chmod(savepath, perms) 
+        except:
+            trace('--Error setting permissions')         # e.g., pre-Oreo Android
+
+    # 
+    # propagate modtime to files, links (and dirs on some platforms)
+    #
+    zipinfo.filename = origname                          # lookup premangle [1.3]
+    datetime = getModtimeUTCorLocal(zipinfo, zipfile)    # UTC if present [1.2]
+
+    if os.path.islink(savepath):
+        # reset modtime of link itself where supported
+        # but not on Windows or Py3.2-: keep now time
+        # and call _twice_ on Mac for exFAT drives bug  
+
+        stats.symlinks += 1
+        if (hasattr(os, 'supports_follow_symlinks') and  # iff utime does links
+            os.utime in os.supports_follow_symlinks):
+            try:
+                os.utime(savepath, (datetime, datetime), follow_symlinks=False)
+            except:
+                trace('--Error setting link modtime')    # pre-Oreo Android [1.2]
+            else:
+                # go again for Mac OS exFAT bug
+                if RunningOnMacOS:
+                    os.utime(savepath, (datetime, datetime), follow_symlinks=False)
+
+    elif os.path.isfile(savepath):
+        # reset (non-link) file modtime now              # no Mac OS exFAT bug 
+        stats.files += 1
+        try:
+            os.utime(savepath, (datetime, datetime))     # dest time = src time 
+        except:
+            trace('--Error setting file modtime')        # pre-Oreo Android [1.2]
+
+    elif os.path.isdir(savepath):
+        # defer (non-link) dir till after add files
+        stats.folders += 1
+        dirmodtimes.append((savepath, datetime))         # where supported
+
+    else:
+        # bad type in zipfile
+        stats.unknowns += 1
+        assert False, 'Unknown type extracted'           # should never happen
+
+
+
+#===============================================================================
+
+
+
+# parallel extracts: below this many compressed bytes, process startup isn't worth it
+ParallelMinBytes = 16 * 1024 * 1024
+
+
+
+def partitionbysize(items, parts, sizeof):
+    """
+    -----------------------------------------------------------------------
+    Split items into at most parts lists of roughly equal total sizeof():
+    largest first, each to the currently lightest list (greedy LPT).
+    -----------------------------------------------------------------------
+    """
+    import heapq
+    heap = [(0, n, []) for n in range(min(parts, len(items)))]
+    for item in sorted(items, key=sizeof, reverse=True):
+        size, n, part = heapq.heappop(heap)
+        part.append(item)
+        heapq.heappush(heap, (size + sizeof(item), n, part))
+    return [part for (size, n, part) in sorted(heap, key=lambda h: h[1]) if part]
+
+
+
+def extractworker(zipname, indexes, pathto, pathtoWasRelative,
+                  nofixlinks, verbose, permissions, nomangle):
+    """
+    -----------------------------------------------------------------------
+    Process-pool worker for parallel extracts: open a private ZipFile handle
+    and extract the file items at indexes.  Returns stats, uncompressed
+    bytes, and elapsed seconds for per-worker throughput reporting.
+    -----------------------------------------------------------------------
+    """
+    import time
+    trace = print if verbose else (lambda *args, **kwargs: None)
+    stats = ExtractStats()
+    dirmodtimes = []
+    start = time.time()
+    nbytes = 0
+    zipfile = ZipFile(zipname, mode='r', allowZip64=True)
+    infos = zipfile.infolist()
+    for index in indexes:
+        zipinfo = infos[index]
+        nbytes += zipinfo.file_size
+        extractzipitem(zipfile, zipinfo, pathto, pathtoWasRelative,
+                       stats, dirmodtimes, nofixlinks, trace, permissions, nomangle)
+    zipfile.close()
+    return stats, nbytes, time.time() - start
+
+
+
 def extractzipfile(zipname,               # pathname of zipfile to extract from
                    pathto='.',            # pathname of folder to extract to
                    nofixlinks=False,      # do not translate symlink separators? 
                    trace=print,           # trace router (or lambda *p, **k: None)
                    permissions=False,     # propagate saved permisssions? [1.1]
-                   nomangle=False):       # don't mod bad filename chars to '_' on errors?
+                   nomangle=False,        # don't mod bad filename chars to '_' on errors?
+                   workers=1,             # >1: extract files across a process pool
+                   select=None):          # callable(filename) -> bool: extract only these
     if trace is None:
         trace = lambda *args, **kwargs: None
     trace('Unzipping from', zipname, 'to', pathto)
@@ -556,119 +759,44 @@ def extractzipfile(zipname,               # pathname of zipfile to extract from
     # extract all items in zip
     #
     zipfile = ZipFile(zipname, mode='r', allowZip64=True)
-    for zipinfo in zipfile.infolist():              # for all items in zip
-        origname = zipinfo.filename                 # before trymangle mods
-
-        # 
-        # extract one item
-        #
-        try:
-            if isSymlink(zipinfo):
-                # read/save link path: stubs on non-mangle failures
-                trace('(Link)', end=' ')
-                try:
-                    savepath = extractSymlink(
-                           zipinfo, pathto, zipfile, nofixlinks, trace)
-                except:
-                    # retry with mangled name? [1.3]
-                    if trymangle(zipinfo, pathto, nomangle, trace):
-                        savepath = extractSymlink(
-                               zipinfo, pathto, zipfile, nofixlinks, trace, origname)
-                        stats.mangled += 1
-                    else:
-                        raise  # reraise
-
-            else:
-                # create file or dir: skip on all failures
-                try:
-                    savepath = zipfile.extract(zipinfo, pathto) 
-                except:
-                    # retry with mangled name? [1.3]
-                    if trymangle(zipinfo, pathto, nomangle, trace):
-                        savepath = zipfile.extract(zipinfo, pathto) 
-                        stats.mangled += 1
-                    else:
-                        raise  # reraise
-
-        except Exception as E:
-            # continue with rest on any item failure post mangle retry [1.3]
-            stats.skipped += 1
-            trace('**SKIP - item failed and skipped:', zipinfo.filename)
-            trace('Python exception: %s, %s' % (E.__class__.__name__, E))
-            continue  # next zipinfo in for loop
-                
-        # show both from+to paths iff they differ
-        filename = zipinfo.filename                          # item's path in zip 
-        showname = showpath(savepath, pathtoWasRelative)     # undo fwp on windows           
-        trace3(filename, showname, trace)                    # show 1 or 2 lines [1.3]
-
-        # 
-        # propagate permissions from/to Unix for all, iff enabled [1.1]
-        #
-        if permissions:
-            try:                                          # create saved perms
-                perms = zipinfo.external_attr >> 16       # to lower 16 bits
-                if perms != 0:
-
-                    if os.path.islink(savepath):
-                        # mod link itself, where supported
-                        # not on Windows, Py3.2 and earlier
-                        # Mac OS bug moot: no-op on exFAT
- 
-                        if (hasattr(os, 'supports_follow_symlinks') and
-                            os.chmod in os.supports_follow_symlinks):
-                            os.chmod(savepath, perms, follow_symlinks=False)
-
-                        # Unix Py 2.X and 3.2- have lchmod, but not f_s
-                        elif hasattr(os, 'lchmod'):
-                            os.lchmod(savepath, perms)
-
-                    else:
-                        # mod file or dir, where supported (exFAT=no-op)
-                        os.chmod(savepath, perms) 
-            except:
-                trace('--Error setting permissions')         # e.g., pre-Oreo Android
-
-        # 
-        # propagate modtime to files, links (and dirs on some platforms)
-        #
-        zipinfo.filename = origname                          # lookup premangle [1.3]
-        datetime = getModtimeUTCorLocal(zipinfo, zipfile)    # UTC if present [1.2]
-
-        if os.path.islink(savepath):
-            # reset modtime of link itself where supported
-            # but not on Windows or Py3.2-: keep now time
-            # and call _twice_ on Mac for exFAT drives bug  
-
-            stats.symlinks += 1
-            if (hasattr(os, 'supports_follow_symlinks') and  # iff utime does links
-                os.utime in os.supports_follow_symlinks):
-                try:
-                    os.utime(savepath, (datetime, datetime), follow_symlinks=False)
-                except:
-                    trace('--Error setting link modtime')    # pre-Oreo Android [1.2]
-                else:
-                    # go again for Mac OS exFAT bug
-                    if RunningOnMacOS:
-                        os.utime(savepath, (datetime, datetime), follow_symlinks=False)
-
-        elif os.path.isfile(savepath):
-            # reset (non-link) file modtime now              # no Mac OS exFAT bug 
-            stats.files += 1
-            try:
-                os.utime(savepath, (datetime, datetime))     # dest time = src time 
-            except:
-                trace('--Error setting file modtime')        # pre-Oreo Android [1.2]
-
-        elif os.path.isdir(savepath):
-            # defer (non-link) dir till after add files
-            stats.folders += 1
-            dirmodtimes.append((savepath, datetime))         # where supported
-
-        else:
-            # bad type in zipfile
-            stats.unknowns += 1
-            assert False, 'Unknown type extracted'           # should never happen
+    infos = zipfile.infolist()
+    # indexes stay relative to the full infolist: workers reopen the zip
+    selected = [n for (n, zipinfo) in enumerate(infos)
+                    if select is None or select(zipinfo.filename)]
+    fileindexes = [n for n in selected
+                       if not infos[n].filename.endswith('/') and not isSymlink(infos[n])]
+    parallel = (workers > 1 and len(fileindexes) > 1 and
+                sum(infos[n].compress_size for n in fileindexes) >= ParallelMinBytes)
+
+    if not parallel:
+        for n in selected:                          # for all (selected) items in zip
+            extractzipitem(zipfile, infos[n], pathto, pathtoWasRelative,
+                           stats, dirmodtimes, nofixlinks, trace, permissions, nomangle)
+    else:
+        # folders and links up front, here: cheap, and files need the folders
+        fileset = set(fileindexes)
+        for n in selected:
+            if n not in fileset:
+                extractzipitem(zipfile, infos[n], pathto, pathtoWasRelative,
+                               stats, dirmodtimes, nofixlinks, trace, permissions, nomangle)
+
+        # files across a process pool, balanced by compressed size;
+        # spawn, not fork: callers run this from threads (downloads, progress
+        # refresh), and forking a multi-threaded process can deadlock the child
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        parts = partitionbysize(fileindexes, workers, lambda n: infos[n].compress_size)
+        trace('Extracting %d files with %d workers' % (len(fileindexes), len(parts)))
+        with ProcessPoolExecutor(max_workers=len(parts),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            jobs = [pool.submit(extractworker, zipname, part,
+                                pathto, pathtoWasRelative, nofixlinks,
+                                trace is print, permissions, nomangle)
+                    for part in parts]
+            for job in jobs:
+                workerstats, nbytes, seconds = job.result()
+                stats += workerstats
+                stats.workers.append((workerstats.files, nbytes, seconds))
 
     # 
     # reset (non-link) dir modtimes now, post file adds
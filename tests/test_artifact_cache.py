@@ -0,0 +1,85 @@
+"""ArtifactCache 测试：取出与发布的文件不与缓存共享 inode，修改工作目录中的文件不会改坏缓存。"""
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from build_qt.artifact_cache import ArtifactCache
+
+
+class ArtifactCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ArtifactCache(os.path.join(self.tmp, 'cache'))
+        self.data = b'native sdk' * 1000
+        self.digest = hashlib.sha256(self.data).hexdigest()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _blob(self) -> bytes:
+        with open(self.cache.blob_path(self.digest), 'rb') as f:
+            return f.read()
+
+    def test_publish_does_not_share_source(self):
+        src = self._write('native.zip', self.data)
+        blob = self.cache.publish(src, self.digest)
+        self.assertFalse(os.path.samefile(src, blob))
+        with open(src, 'r+b') as f:
+            f.write(b'corrupted')
+        self.assertEqual(self._blob(), self.data)
+
+    def test_fetch_does_not_share_blob(self):
+        self.cache.publish(self._write('native.zip', self.data), self.digest)
+        dest = os.path.join(self.tmp, 'work', 'native.zip')
+        self.assertTrue(self.cache.fetch(self.digest, dest))
+        self.assertFalse(os.path.samefile(dest, self.cache.blob_path(self.digest)))
+        with open(dest, 'r+b') as f:
+            f.write(b'corrupted')
+        self.assertEqual(self._blob(), self.data)
+
+    def test_fetch_miss(self):
+        self.assertFalse(self.cache.fetch(self.digest, os.path.join(self.tmp, 'missing.zip')))
+
+    def test_fetch_evicted_during_copy(self):
+        self.cache.publish(self._write('native.zip', self.data), self.digest)
+        dest = os.path.join(self.tmp, 'work', 'native.zip')
+        real_copy = shutil.copy2
+
+        def evict_then_copy(src, dst):
+            os.remove(src)
+            return real_copy(src, dst)
+
+        with mock.patch('build_qt.artifact_cache._reflink', return_value=False), \
+                mock.patch('shutil.copy2', side_effect=evict_then_copy):
+            self.assertFalse(self.cache.fetch(self.digest, dest))
+        self.assertEqual(os.listdir(os.path.dirname(dest)), [])
+
+    def test_lru_eviction(self):
+        clock = iter(range(1000))
+        blobs = {}
+        with mock.patch('time.time', side_effect=lambda: next(clock)):
+            cache = ArtifactCache(os.path.join(self.tmp, 'lru'), max_size=3 * 1000)
+            for name in ('a', 'b', 'c'):
+                data = name.encode() * 1000
+                blobs[name] = hashlib.sha256(data).hexdigest()
+                cache.publish(self._write(name, data), blobs[name])
+            # 取用 a 后它成为最近使用，发布 d 时淘汰最久未用的 b
+            self.assertTrue(cache.fetch(blobs['a'], os.path.join(self.tmp, 'a.out')))
+            data = b'd' * 1000
+            blobs['d'] = hashlib.sha256(data).hexdigest()
+            cache.publish(self._write('d', data), blobs['d'])
+        self.assertEqual({name for name, digest in blobs.items() if cache.contains(digest)}, {'a', 'c', 'd'})
+        self.assertLessEqual(cache.size(), 3 * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""create_delta -> apply_delta_package 往返测试：以目录为基线生成差量包并应用到基线副本。"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from build_qt import delta_pack
+from build_qt.delta_pack import apply_delta_package, create_delta, scan_tree
+
+
+def write(root: str, rel: str, data: bytes) -> None:
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class DeltaPackTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.base = os.path.join(self.tmp, 'base')
+        self.new = os.path.join(self.tmp, 'new')
+        libs = {'lib/libQt5Mod{}.so'.format(i): os.urandom(64 * 1024) for i in range(6)}
+        for rel, data in libs.items():
+            write(self.base, rel, data)
+            # 新版本只改动库文件的一小段，适合生成补丁
+            write(self.new, rel, data[:1000] + b'changed' + data[1007:])
+        write(self.base, 'include/removed.h', b'// removed\n')
+        write(self.base, 'include/same.h', b'// same\n')
+        write(self.new, 'include/same.h', b'// same\n')
+        write(self.new, 'include/added.h', b'// added\n')
+        os.symlink('libQt5Mod0.so', os.path.join(self.new, 'lib', 'libQt5Mod0.so.5'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _round_trip(self, workers: int) -> dict:
+        delta = os.path.join(self.tmp, 'out', 'qt' + delta_pack.DELTA_SUFFIX)
+        os.makedirs(os.path.dirname(delta), exist_ok=True)
+        meta = create_delta(self.new, self.base, delta, workers=workers)
+        target = os.path.join(self.tmp, 'target')
+        shutil.copytree(self.base, target, symlinks=True)
+        apply_delta_package(delta, target)
+        self.assertEqual(scan_tree(target), scan_tree(self.new))
+        return meta
+
+    def test_round_trip(self):
+        meta = self._round_trip(workers=4)
+        self.assertEqual(len(meta['patches']), 6)
+        self.assertEqual(sorted(meta['files']), ['include/added.h'])
+        self.assertEqual(meta['removed'], ['include/removed.h'])
+
+    def test_memory_budget_limits_concurrency(self):
+        # 上限只容纳一个基线文件时补丁逐个生成
+        active = []
+        peak = []
+        lock = threading.Lock()
+        real_make_patch = delta_pack.make_patch
+
+        def tracked(*args, **kwargs):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            try:
+                return real_make_patch(*args, **kwargs)
+            finally:
+                with lock:
+                    active.pop()
+
+        with mock.patch.object(delta_pack, 'PATCH_MEMORY_BUDGET', 64 * 1024), \
+                mock.patch.object(delta_pack, 'make_patch', side_effect=tracked):
+            meta = self._round_trip(workers=4)
+        self.assertEqual(len(meta['patches']), 6)
+        self.assertEqual(max(peak), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+"""download_component 的分段下载、断点续传与校验测试，使用本机 http.server 作为远端。"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from build_qt import utils
+from build_qt.artifact_cache import ArtifactCache
+from build_qt.utils import DownloadError, download_component
+
+ETAG = '"v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """按 server.ranges 决定是否响应 Range 请求，并记录收到的 (方法, Range)。"""
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, with_body: bool):
+        server = self.server
+        data = server.payload
+        byte_range = self.headers.get('Range')
+        with server.lock:
+            server.received.append((self.command, byte_range))
+        if byte_range and server.ranges and self.command == 'GET':
+            start, _, end = byte_range[len('bytes='):].partition('-')
+            start, end = int(start), int(end) if end else len(data) - 1
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, len(data)))
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', ETAG)
+        if server.advertise_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def do_GET(self):
+        self._respond(True)
+
+
+class DownloadComponentTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.payload = os.urandom(10000)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.payload = self.payload
+        self.server.ranges = True
+        self.server.advertise_ranges = True
+        self.server.received = []
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/qt.tar.gz'.format(self.server.server_address[1])
+        self.dest = os.path.join(self.tmp, 'qt.tar.gz')
+        self.sha256 = ('sha256', hashlib.sha256(self.payload).hexdigest())
+        # 让 10000 字节的测试文件也按 4 段下载
+        patcher = mock.patch.object(utils, 'SEGMENT_MIN_SIZE', 1024)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+        patcher = mock.patch.object(utils, '_hash_cache_dir', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _gets(self):
+        return [byte_range for method, byte_range in self.server.received if method == 'GET']
+
+    def _read_dest(self):
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+    def test_range_segments(self):
+        download_component(self.url, self.dest, self.sha256, connections=4)
+        self.assertEqual(self._read_dest(), self.payload)
+        expected = ['bytes={}-{}'.format(start, end) for start, end in utils._split_ranges(len(self.payload), 4)]
+        self.assertEqual(len(expected), 4)
+        self.assertEqual(sorted(self._gets()), sorted(expected))
+        self.assertFalse(os.path.exists(self.dest + '.part'))
+        self.assertFalse(os.path.exists(self.dest + '.part.json'))
+
+    def test_resume_from_part_state(self):
+        part = bytearray(len(self.payload))
+        part[:5000] = self.payload[:5000]
+        part[5000:6000] = self.payload[5000:6000]
+        with open(self.dest + '.part', 'wb') as f:
+            f.write(part)
+        with open(self.dest + '.part.json', 'w') as f:
+            json.dump({'url': self.url, 'validator': ETAG, 'total_size': len(self.payload),
+                       'segments': [[0, 4999, 5000], [5000, 9999, 1000]]}, f)
+        download_component(self.url, self.dest, self.sha256, connections=4)
+        self.assertEqual(self._read_dest(), self.payload)
+        self.assertEqual(self._gets(), ['bytes=6000-9999'])
+
+    def test_stale_part_state_restarts(self):
+        with open(self.dest + '.part', 'wb') as f:
+            f.write(b'\0' * len(self.payload))
+        with open(self.dest + '.part.json', 'w') as f:
+            json.dump({'url': self.url, 'validator': '"old"', 'total_size': len(self.payload),
+                       'segments': [[0, 9999, 5000]]}, f)
+        download_component(self.url, self.dest, self.sha256, connections=1)
+        self.assertEqual(self._read_dest(), self.payload)
+        self.assertEqual(self._gets(), [None])
+
+    def test_server_ignores_range(self):
+        # 声明 Accept-Ranges 却对 Range 请求返回 200：回退为单连接完整下载
+        self.server.ranges = False
+        download_component(self.url, self.dest, self.sha256, connections=4)
+        self.assertEqual(self._read_dest(), self.payload)
+        self.assertEqual(self._gets()[-1], None)
+
+    def test_server_without_range_support(self):
+        self.server.ranges = False
+        self.server.advertise_ranges = False
+        download_component(self.url, self.dest, self.sha256, connections=4)
+        self.assertEqual(self._read_dest(), self.payload)
+        self.assertEqual(self._gets(), [None])
+
+    def test_checksum_mismatch(self):
+        for connections in (1, 4):
+            with self.assertRaises(DownloadError):
+                download_component(self.url, self.dest, ('sha256', '0' * 64), connections=connections)
+            self.assertFalse(os.path.exists(self.dest))
+            self.assertFalse(os.path.exists(self.dest + '.part'))
+            self.assertFalse(os.path.exists(self.dest + '.part.json'))
+
+    def test_artifact_cache(self):
+        cache = ArtifactCache(os.path.join(self.tmp, 'artifacts'))
+        # 未命中：下载后发布到缓存
+        download_component(self.url, self.dest, self.sha256, connections=1, cache=cache)
+        self.assertTrue(cache.contains(self.sha256[1]))
+        self.assertEqual(len(self._gets()), 1)
+        # 命中：不再请求远端
+        other = os.path.join(self.tmp, 'other', 'qt.tar.gz')
+        download_component(self.url, other, self.sha256, connections=1, cache=cache)
+        with open(other, 'rb') as f:
+            self.assertEqual(f.read(), self.payload)
+        self.assertEqual(len(self._gets()), 1)
+        self.assertEqual(utils.cached_digest(other, 'sha256'), self.sha256[1])
+        self.assertEqual(os.listdir(os.path.dirname(other)), ['qt.tar.gz'])
+
+    def test_hash_cache_outside_download_dir(self):
+        download_component(self.url, self.dest, self.sha256, connections=1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, utils.HASH_CACHE_NAME)))
+        self.assertEqual(utils.cached_digest(self.dest, 'sha256'), self.sha256[1])
+        self.assertTrue(os.path.isfile(os.path.join(self.cache_dir, utils.HASH_CACHE_NAME)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+"""extract_archive 的修复（按清单重新解压被修改的成员）与异常路径测试。"""
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import unittest
+import zipfile
+from unittest import mock
+
+from build_qt.utils import DownloadError, extract_archive
+from build_qt import stream_extract
+from build_qt.ziptools import ziptools
+
+
+def add_file(tar: tarfile.TarFile, name: str, data: bytes, mode: int = 0o644) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    tar.addfile(info, io.BytesIO(data))
+
+
+class ExtractRepairTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dest = os.path.join(self.tmp, 'sdk')
+
+    def tearDown(self):
+        for root, dirs, files in os.walk(self.tmp):
+            for name in dirs + files:
+                path = os.path.join(root, name)
+                if not os.path.islink(path):
+                    os.chmod(path, 0o755)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _manifest(self):
+        with open(self.dest + '.extract.json') as f:
+            return json.load(f)
+
+    @unittest.skipIf(hasattr(os, 'geteuid') and os.geteuid() == 0, 'root 不受只读权限限制')
+    def test_repair_read_only_large_file(self):
+        big = os.urandom(stream_extract.TAR_SMALL_FILE + 1)
+        archive = os.path.join(self.tmp, 'sdk.tar.gz')
+        with tarfile.open(archive, 'w:gz') as t:
+            add_file(t, 'llvm/bin/clang', big, 0o555)
+            add_file(t, 'llvm/README', b'small', 0o444)
+        extract_archive(archive, self.dest)
+        for rel in ('llvm/bin/clang', 'llvm/README'):
+            path = os.path.join(self.dest, rel)
+            os.chmod(path, 0o644)
+            with open(path, 'wb') as f:
+                f.write(b'modified')
+            os.chmod(path, 0o444)
+        extract_archive(archive, self.dest)
+        with open(os.path.join(self.dest, 'llvm', 'bin', 'clang'), 'rb') as f:
+            self.assertEqual(f.read(), big)
+        with open(os.path.join(self.dest, 'llvm', 'README'), 'rb') as f:
+            self.assertEqual(f.read(), b'small')
+
+    def test_zip_repair_failure_keeps_manifest(self):
+        archive = os.path.join(self.tmp, 'sdk.zip')
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr('bin/qmake', b'qmake')
+            z.writestr('lib/libfoo.so', b'foo')
+        extract_archive(archive, self.dest, workers=1)
+        before = self._manifest()
+        self.assertIn('bin/qmake', before['members'])
+
+        # 成员路径被目录占据：重新解压该成员必然失败
+        os.remove(os.path.join(self.dest, 'bin', 'qmake'))
+        os.makedirs(os.path.join(self.dest, 'bin', 'qmake', 'sub'))
+        with self.assertRaises(DownloadError):
+            extract_archive(archive, self.dest, workers=1)
+        # 失败的成员不会作为已解压写入清单，下次调用仍会尝试修复
+        self.assertEqual(self._manifest(), before)
+
+        shutil.rmtree(os.path.join(self.dest, 'bin', 'qmake'))
+        extract_archive(archive, self.dest, workers=1)
+        with open(os.path.join(self.dest, 'bin', 'qmake'), 'rb') as f:
+            self.assertEqual(f.read(), b'qmake')
+
+    def test_zip_failure_on_fresh_extract_writes_no_manifest(self):
+        archive = os.path.join(self.tmp, 'sdk.zip')
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr('bin', b'file where a directory is expected')
+            z.writestr('bin/qmake', b'qmake')
+        with self.assertRaises(DownloadError):
+            extract_archive(archive, self.dest, workers=1)
+        self.assertFalse(os.path.exists(self.dest + '.extract.json'))
+
+
+class ParallelZipTest(unittest.TestCase):
+    """zip 多进程解压在有其他线程运行时（下载、进度刷新）从工作线程中调用。"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_extract_from_thread(self):
+        archive = os.path.join(self.tmp, 'perl.zip')
+        files = {'perl/bin/perl{}.dll'.format(i): os.urandom(1024) * (i + 1) for i in range(8)}
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            for name, data in files.items():
+                z.writestr(name, data)
+        dest = os.path.join(self.tmp, 'out')
+        stop = threading.Event()
+        busy = threading.Thread(target=stop.wait)
+        busy.start()
+        errors = []
+
+        def run():
+            try:
+                extract_archive(archive, dest, workers=2)
+            except Exception as e:
+                errors.append(e)
+
+        try:
+            with mock.patch.object(ziptools, 'ParallelMinBytes', 0):
+                worker = threading.Thread(target=run)
+                worker.start()
+                worker.join(120)
+        finally:
+            stop.set()
+            busy.join()
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(errors, [])
+        for name, data in files.items():
+            with open(os.path.join(dest, name), 'rb') as f:
+                self.assertEqual(f.read(), data)
+
+
+class HardlinkFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.archive = os.path.join(self.tmp, 'native.tar.gz')
+        with tarfile.open(self.archive, 'w:gz') as t:
+            add_file(t, 'native/llvm/lib/libclang.so.15', b'clang')
+            link = tarfile.TarInfo('native/sysroot/lib/libclang.so')
+            link.type = tarfile.LNKTYPE
+            link.linkname = 'native/llvm/lib/libclang.so.15'
+            t.addfile(link)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_link_with_filtered_target_is_skipped(self):
+        dest = os.path.join(self.tmp, 'out')
+        extract_archive(self.archive, dest, include=['native/sysroot/*'])
+        self.assertFalse(os.path.exists(os.path.join(dest, 'native', 'sysroot', 'lib', 'libclang.so')))
+        with open(dest + '.extract.json') as f:
+            self.assertEqual(json.load(f)['members'], {})
+
+    def test_link_with_selected_target(self):
+        dest = os.path.join(self.tmp, 'out')
+        extract_archive(self.archive, dest)
+        link = os.path.join(dest, 'native', 'sysroot', 'lib', 'libclang.so')
+        target = os.path.join(dest, 'native', 'llvm', 'lib', 'libclang.so.15')
+        self.assertTrue(os.path.samefile(link, target))
+
+
+class LinkEscapeTest(unittest.TestCase):
+    """硬链接或符号链接经由同一存档中的符号链接指向目标目录之外。"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.outside = os.path.join(self.tmp, 'outside')
+        os.makedirs(self.outside)
+        with open(os.path.join(self.outside, 'outside.txt'), 'w') as f:
+            f.write('secret')
+        self.dest = os.path.join(self.tmp, 'out')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _extract(self, *links):
+        data = io.BytesIO()
+        with tarfile.open(fileobj=data, mode='w') as t:
+            for name, kind, linkname in links:
+                info = tarfile.TarInfo(name)
+                info.type = kind
+                info.linkname = linkname
+                t.addfile(info)
+        data.seek(0)
+        return stream_extract.extract_tar_members(data, self.dest)
+
+    def test_hardlink_through_symlink(self):
+        self._extract(('a', tarfile.SYMTYPE, self.outside), ('b', tarfile.LNKTYPE, 'a/outside.txt'))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'b')))
+
+    def test_hardlink_through_existing_symlink(self):
+        # 符号链接来自上一次解压
+        self._extract(('a', tarfile.SYMTYPE, self.outside))
+        with self.assertRaises(stream_extract.StreamExtractError):
+            self._extract(('b', tarfile.LNKTYPE, 'a/outside.txt'))
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'b')))
+
+
+if __name__ == '__main__':
+    unittest.main()
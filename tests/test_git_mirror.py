@@ -0,0 +1,107 @@
+"""GitMirrorCache 与 QtRepo 镜像克隆的测试：以本地裸仓库作为远端。"""
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from build_qt.git_mirror import GitMirrorCache, GitMirrorError
+from build_qt.qt_repo import QtRepo
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@localhost',
+               GIT_COMMITTER_NAME='test', GIT_COMMITTER_EMAIL='test@localhost',
+               GIT_CONFIG_GLOBAL=os.devnull, GIT_CONFIG_NOSYSTEM='1')
+
+
+def git(*args, cwd=None) -> str:
+    return subprocess.run(['git'] + list(args), cwd=cwd, env=GIT_ENV, check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+def make_remote(root: str, name: str, files: dict, submodules: dict = None) -> str:
+    """创建裸仓库 <root>/<name>.git，提交 files 与 submodules（路径 -> 裸仓库），返回裸仓库路径。"""
+    work = os.path.join(root, name + '-work')
+    bare = os.path.join(root, name + '.git')
+    git('init', '-q', '-b', 'master', work)
+    for rel, content in files.items():
+        with open(os.path.join(work, rel), 'w') as f:
+            f.write(content)
+    git('add', '-A', cwd=work)
+    for path, url in (submodules or {}).items():
+        git('-c', 'protocol.file.allow=always', 'submodule', 'add', '-q', url, path, cwd=work)
+    git('commit', '-q', '-m', 'init', cwd=work)
+    git('clone', '-q', '--bare', work, bare)
+    return bare
+
+
+def push_commit(bare: str, rel: str, content: str) -> str:
+    """向裸仓库推送一个修改 rel 的提交，返回新提交。"""
+    work = tempfile.mkdtemp()
+    try:
+        git('clone', '-q', bare, work)
+        with open(os.path.join(work, rel), 'w') as f:
+            f.write(content)
+        git('commit', '-q', '-am', 'update', cwd=work)
+        git('push', '-q', 'origin', 'HEAD:master', cwd=work)
+        return git('rev-parse', 'HEAD', cwd=work)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+class GitMirrorCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.remotes = os.path.join(self.tmp, 'remotes')
+        os.makedirs(self.remotes)
+        self.mirrors = GitMirrorCache(os.path.join(self.tmp, 'mirrors'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_create_mirror(self):
+        remote = make_remote(self.remotes, 'qtbase', {'a.txt': 'a'})
+        path = self.mirrors.update(remote)
+        self.assertEqual(path, self.mirrors.mirror_path(remote))
+        self.assertEqual(git('-C', path, 'rev-parse', 'master'), git('-C', remote, 'rev-parse', 'master'))
+        self.assertEqual(git('-C', path, 'config', 'uploadpack.allowAnySHA1InWant'), 'true')
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+    def test_refresh_mirror(self):
+        remote = make_remote(self.remotes, 'qtbase', {'a.txt': 'a'})
+        path = self.mirrors.update(remote)
+        head = push_commit(remote, 'a.txt', 'b')
+        self.assertNotEqual(git('-C', path, 'rev-parse', 'master'), head)
+        self.assertEqual(self.mirrors.update(remote), path)
+        self.assertEqual(git('-C', path, 'rev-parse', 'master'), head)
+
+    def test_offline_uses_existing_mirror(self):
+        remote = make_remote(self.remotes, 'qtbase', {'a.txt': 'a'})
+        path = self.mirrors.update(remote)
+        head = git('-C', path, 'rev-parse', 'master')
+        os.rename(remote, remote + '.offline')
+        self.assertEqual(self.mirrors.update(remote), path)
+        self.assertEqual(git('-C', path, 'rev-parse', 'master'), head)
+
+    def test_missing_remote_without_mirror(self):
+        with self.assertRaises(GitMirrorError):
+            self.mirrors.update(os.path.join(self.remotes, 'missing.git'))
+        self.assertFalse(os.path.exists(self.mirrors.mirror_path(os.path.join(self.remotes, 'missing.git')) + '.tmp'))
+
+    def test_offline_init_from_mirror(self):
+        sub = make_remote(self.remotes, 'qtbase', {'a.txt': 'a'})
+        top = make_remote(self.remotes, 'qt5', {'README': 'qt5'}, submodules={'qtbase': sub})
+        QtRepo(os.path.join(self.tmp, 'online')).clone(top, depth=1, mirror=self.mirrors, jobs=2)
+
+        for remote in (sub, top):
+            os.rename(remote, remote + '.offline')
+        dest = os.path.join(self.tmp, 'offline')
+        QtRepo(dest).clone(top, depth=1, mirror=self.mirrors, jobs=2)
+        with open(os.path.join(dest, 'qtbase', 'a.txt')) as f:
+            self.assertEqual(f.read(), 'a')
+        # 克隆完成后 origin 仍指向远端而不是镜像
+        self.assertEqual(git('-C', dest, 'remote', 'get-url', 'origin'), top)
+        self.assertEqual(git('-C', os.path.join(dest, 'qtbase'), 'remote', 'get-url', 'origin'), sub)
+
+
+if __name__ == '__main__':
+    unittest.main()
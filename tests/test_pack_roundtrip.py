@@ -0,0 +1,133 @@
+"""create_archive -> extract_archive 往返测试：合成的 Qt 安装目录经各格式打包、解压后内容一致。"""
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+from build_qt import utils
+from build_qt.utils import create_archive, extract_archive
+
+FORMATS = ['zip', 'tar.gz', 'tar.xz', 'tar.zst']
+
+
+def make_prefix(root: str) -> None:
+    """生成类似 Qt 安装目录的 prefix：可执行文件、库与版本链接、大量头文件、空文件与空目录。"""
+    def write(rel, data, mode=0o644):
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        os.chmod(path, mode)
+
+    write('bin/qmake', b'#!/bin/sh\necho qmake\n', 0o755)
+    write('bin/moc', os.urandom(4096), 0o755)
+    # 大于 stream_extract.TAR_SMALL_FILE，走边读边写的分支
+    write('lib/libQt5Core.so.5.15.12', os.urandom(1536 * 1024) + b'\0' * (1024 * 1024))
+    os.symlink('libQt5Core.so.5.15.12', os.path.join(root, 'lib', 'libQt5Core.so.5'))
+    write('lib/cmake/Qt5Core/Qt5CoreConfig.cmake', b'set(Qt5Core_FOUND TRUE)\n')
+    for i in range(200):
+        write('include/QtCore/q{}.h'.format(i), '#pragma once\n// header {}\n'.format(i).encode() * (i + 1))
+    write('include/QtCore/中文.h', '// 非 ASCII 文件名\n'.encode('utf-8'))
+    write('mkspecs/oh-clang/qmake.conf', b'QMAKE_CC = clang\n')
+    write('doc/empty.txt', b'')
+    os.makedirs(os.path.join(root, 'plugins', 'empty'))
+
+
+def snapshot(root: str, follow_links: bool) -> dict:
+    """相对路径 -> (类型, 内容或链接目标, 可执行位)；follow_links 为 True 时符号链接按目标文件内容比较。"""
+    result = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, '/')
+            if rel.endswith(('.extract.json', '.manifest.json')):
+                continue
+            if os.path.islink(path) and not follow_links:
+                result[rel] = ('link', os.readlink(path), None)
+            elif os.path.isdir(path):
+                result[rel] = ('dir', None, None)
+            else:
+                with open(path, 'rb') as f:
+                    result[rel] = ('file', f.read(), bool(os.stat(path).st_mode & stat.S_IXUSR))
+    return result
+
+
+class PackRoundTripTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.prefix = os.path.join(cls.tmp, 'qt-5.15.12-ohos')
+        make_prefix(cls.prefix)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def _round_trip(self, fmt: str, workers: int) -> None:
+        out_dir = tempfile.mkdtemp(dir=self.tmp)
+        archive = create_archive(self.prefix, os.path.join(out_dir, 'qt-ohos.' + fmt), _format=fmt, workers=workers)
+        self.assertTrue(archive.endswith('.' + fmt))
+        dest = os.path.join(out_dir, 'extracted')
+        extract_archive(archive, dest, workers=1)
+        # zip 不保存符号链接（与 shutil.make_archive 一致，按目标内容打包）
+        follow = fmt == 'zip'
+        self.assertEqual(snapshot(dest, follow), snapshot(self.prefix, follow))
+
+    def test_single_thread(self):
+        for fmt in FORMATS:
+            with self.subTest(format=fmt):
+                self._round_trip(fmt, workers=1)
+
+    def test_parallel(self):
+        # 绕过 CPU 核心数与目录大小的判断，强制使用并行引擎
+        with mock.patch.object(utils, 'PARALLEL_PACK_MIN_SIZE', 0), mock.patch('os.cpu_count', return_value=4):
+            for fmt in FORMATS:
+                with self.subTest(format=fmt):
+                    self.assertEqual(utils._pack_workers(self.prefix, 4), 4)
+                    self._round_trip(fmt, workers=4)
+
+    def test_single_thread_honours_level(self):
+        for fmt in ('zip', 'tar.gz'):
+            with self.subTest(format=fmt):
+                out_dir = tempfile.mkdtemp(dir=self.tmp)
+                sizes = {}
+                for level in (0, 9):
+                    archive = create_archive(self.prefix, os.path.join(out_dir, 'l{}.{}'.format(level, fmt)),
+                                             _format=fmt, workers=1, level=level)
+                    sizes[level] = os.path.getsize(archive)
+                    dest = os.path.join(out_dir, 'extracted{}'.format(level))
+                    extract_archive(archive, dest, workers=1)
+                    follow = fmt == 'zip'
+                    self.assertEqual(snapshot(dest, follow), snapshot(self.prefix, follow))
+                # 级别 0 只存储不压缩：库文件中 1 MiB 的零字节不会被压缩掉
+                self.assertGreater(sizes[0] - sizes[9], 1024 * 1024)
+
+    def test_single_thread_incremental_zip(self):
+        # 首次打包即写出清单，下一次以其为基线时未变化的成员全部复用
+        out_dir = tempfile.mkdtemp(dir=self.tmp)
+        first = create_archive(self.prefix, os.path.join(out_dir, 'first.zip'), workers=1)
+        self.assertTrue(os.path.isfile(first + '.manifest.json'))
+        second = create_archive(self.prefix, os.path.join(out_dir, 'second.zip'), workers=1, baseline=first)
+        with open(second + '.manifest.json') as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['compressed'], 0)
+        self.assertEqual(manifest['reused'], len(manifest['entries']))
+        dest = os.path.join(out_dir, 'extracted')
+        extract_archive(second, dest, workers=1)
+        self.assertEqual(snapshot(dest, True), snapshot(self.prefix, True))
+
+    def test_extract_twice_is_noop(self):
+        out_dir = tempfile.mkdtemp(dir=self.tmp)
+        archive = create_archive(self.prefix, os.path.join(out_dir, 'qt-ohos.tar.gz'), _format='tar.gz')
+        dest = os.path.join(out_dir, 'extracted')
+        extract_archive(archive, dest)
+        os.remove(os.path.join(dest, 'bin', 'qmake'))
+        extract_archive(archive, dest)
+        self.assertEqual(snapshot(dest, False), snapshot(self.prefix, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""QtRepo.apply_patches 测试：切换 Qt tag 时先检出该 tag 再应用补丁，补丁快照按 tag 区分。"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from git import Repo
+
+from build_qt.qt_repo import QtRepo
+from tests.test_git_mirror import git
+from tests.test_worktree import commit_all, make_qt5_remote
+
+
+def base_patch(version: str) -> str:
+    return ('diff --git a/base.txt b/base.txt\n'
+            '--- a/base.txt\n'
+            '+++ b/base.txt\n'
+            '@@ -1 +1,2 @@\n'
+            '-{0}\n'
+            '\\ No newline at end of file\n'
+            '+{0}\n'
+            '+patched\n').format(version)
+
+
+class ApplyPatchesTagSwitchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.url = make_qt5_remote(cls.tmp)
+        cls.patch_root = os.path.join(cls.tmp, 'patches')
+        for tag in ('v1', 'v2'):
+            os.makedirs(os.path.join(cls.patch_root, 'patch', tag))
+            with open(os.path.join(cls.patch_root, 'patch', tag, 'qtbase.patch'), 'w') as f:
+                f.write(base_patch(tag))
+        git('init', '-q', '-b', 'master', cls.patch_root)
+        commit_all(cls.patch_root, 'patches')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(dir=self.tmp)
+        self.qt = QtRepo(os.path.join(self.root, 'qt5'))
+        self.qt.clone(self.url, depth=1, branch='v1')
+        self.qt.patch_repo = Repo(self.patch_root)
+
+    def _read(self, *parts):
+        with open(os.path.join(self.qt.repo_path, *parts)) as f:
+            return f.read()
+
+    def _switch_and_check(self, snapshots: bool):
+        build_file = os.path.join(self.qt.repo_path, 'build', 'obj.o')
+        os.makedirs(os.path.dirname(build_file))
+        with open(build_file, 'w') as f:
+            f.write('o')
+        self.qt.apply_patches('v1', jobs=2, snapshots=snapshots)
+        self.assertEqual(self._read('qtbase', 'base.txt'), 'v1\npatched\n')
+
+        self.qt.apply_patches('v2', jobs=2, snapshots=snapshots)
+        self.assertEqual(git('describe', '--tags', 'HEAD', cwd=self.qt.repo_path), 'v2')
+        self.assertEqual(self._read('qtbase', 'base.txt'), 'v2\npatched\n')
+        self.assertEqual(self._read('qtbase', 'src', '3rdparty', 'lib.c'), 'v2')
+        self.assertTrue(os.path.isfile(build_file))
+
+        self.qt.apply_patches('v1', jobs=2, snapshots=snapshots)
+        self.assertEqual(self._read('qtbase', 'base.txt'), 'v1\npatched\n')
+        self.assertEqual(self._read('qtbase', 'src', '3rdparty', 'lib.c'), 'v1')
+
+    def test_tag_switch(self):
+        self._switch_and_check(snapshots=False)
+
+    def test_tag_switch_with_snapshots(self):
+        self._switch_and_check(snapshots=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""remove_tree 的同步删除与即时（回收目录 + 后台线程）删除测试。"""
+import contextlib
+import io
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import unittest
+
+from build_qt.utils import TRASH_DIR_NAME, remove_tree
+
+
+def make_tree(root: str, files: int = 50) -> None:
+    for i in range(files):
+        path = os.path.join(root, 'd{}'.format(i % 5), 'sub', 'f{}.o'.format(i))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * i)
+    readonly = os.path.join(root, 'readonly.txt')
+    with open(readonly, 'w') as f:
+        f.write('r')
+    os.chmod(readonly, stat.S_IREAD)
+    os.symlink(os.path.join(root, 'd0'), os.path.join(root, 'link'))
+
+
+class RemoveTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_remove_sync(self):
+        target = os.path.join(self.tmp, 'build')
+        make_tree(target)
+        self.assertIsNone(remove_tree(target))
+        self.assertFalse(os.path.exists(target))
+
+    def test_symlink_target_kept(self):
+        keep = os.path.join(self.tmp, 'keep')
+        make_tree(keep)
+        target = os.path.join(self.tmp, 'build')
+        os.makedirs(target)
+        os.symlink(keep, os.path.join(target, 'keep-link'))
+        remove_tree(target)
+        self.assertTrue(os.path.isfile(os.path.join(keep, 'd0', 'sub', 'f0.o')))
+
+    def test_instant_concurrent_share_trash(self):
+        targets = [os.path.join(self.tmp, 'build{}'.format(i)) for i in range(8)]
+        for target in targets:
+            make_tree(target)
+        purgers = []
+        lock = threading.Lock()
+
+        def remove(target):
+            thread = remove_tree(target, instant=True)
+            with lock:
+                purgers.append(thread)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            callers = [threading.Thread(target=remove, args=(target,)) for target in targets]
+            for caller in callers:
+                caller.start()
+            for caller in callers:
+                caller.join()
+            self.assertTrue(all(not os.path.exists(target) for target in targets))
+            for thread in purgers:
+                self.assertIsNotNone(thread)
+                thread.join()
+        # 每个条目只由一个线程删除，不会出现互相删除对方正在删除的目录导致的失败
+        self.assertNotIn('Warning', output.getvalue())
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, TRASH_DIR_NAME)))
+
+    def test_instant_custom_trash_dir(self):
+        source = os.path.join(self.tmp, 'qt5')
+        target = os.path.join(source, 'build', 'release')
+        make_tree(target)
+        # 以往中断遗留在回收目录中的内容一并删除
+        trash_dir = os.path.join(self.tmp, TRASH_DIR_NAME)
+        make_tree(os.path.join(trash_dir, 'leftover'))
+        remove_tree(target, instant=True, trash_dir=trash_dir).join()
+        self.assertFalse(os.path.exists(target))
+        self.assertEqual(os.listdir(os.path.join(source, 'build')), [])
+        self.assertFalse(os.path.exists(trash_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""OhosSdkDownloader.get_sdk_list 缓存测试：返回值是缓存的副本，TTL 内不发请求，网络失败时回退到缓存。"""
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+from build_qt.ohos_sdk_downloader import OhosSdkDownloader
+
+SDK_LIST = [{'apiVersion': '12', 'path': 'native', 'archive': {'url': 'https://example.com/native.zip'}}]
+
+
+class _Response:
+    status_code = 200
+    headers = {'ETag': '"v1"'}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return [dict(item, archive=dict(item['archive'])) for item in SDK_LIST]
+
+
+class SdkListCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        patcher = mock.patch.dict(OhosSdkDownloader._sdk_list_memo, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.downloader = OhosSdkDownloader('linux', 'x64', '5.0', cache_dir=self.tmp, cache_ttl=3600)
+        self.post = mock.patch.object(self.downloader.session, 'post', return_value=_Response()).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_returns_copy(self):
+        first = self.downloader.get_sdk_list()
+        first[0]['archive']['url'] = 'mutated'
+        first.append({})
+        second = OhosSdkDownloader('linux', 'x64', '5.0', cache_dir=self.tmp).get_sdk_list()
+        self.assertEqual(second, SDK_LIST)
+        self.assertEqual(self.post.call_count, 1)
+
+    def test_offline_fallback(self):
+        self.downloader.get_sdk_list()
+        self.post.side_effect = requests.ConnectionError('offline')
+        self.assertEqual(self.downloader.get_sdk_list(force_refresh=True), SDK_LIST)
+
+
+if __name__ == '__main__':
+    unittest.main()
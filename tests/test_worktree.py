@@ -0,0 +1,127 @@
+"""QtRepo.add_worktree/list_worktrees/remove_worktree 测试：主仓库为 --no-checkout 对象库，子模块含嵌套子模块。"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from build_qt.qt_repo import QtRepo, QtRepoError
+from tests.test_git_mirror import git
+
+
+def commit_all(work: str, message: str) -> str:
+    git('add', '-A', cwd=work)
+    git('commit', '-q', '-m', message, cwd=work)
+    return git('rev-parse', 'HEAD', cwd=work)
+
+
+def common_dir(work: str) -> str:
+    """工作目录的对象库（--git-common-dir，相对路径按 work 解析）。"""
+    return os.path.realpath(os.path.join(work, git('-C', work, 'rev-parse', '--git-common-dir')))
+
+
+def make_qt5_remote(tmp: str) -> str:
+    """在 tmp 下创建 qt5 远端：tag v1/v2，qtbase 含嵌套子模块 src/3rdparty，v2 只更新 qtbase 与 3rdparty。"""
+    remotes = os.path.join(tmp, 'remotes')
+    work = os.path.join(tmp, 'work')
+    for name in ('3rdparty', 'qtbase', 'qtdeclarative', 'qt5'):
+        git('init', '-q', '-b', 'master', os.path.join(work, name))
+        git('init', '-q', '--bare', os.path.join(remotes, name + '.git'))
+        git('remote', 'add', 'origin', os.path.join(remotes, name + '.git'), cwd=os.path.join(work, name))
+
+    def write(repo, rel, text):
+        with open(os.path.join(work, repo, rel), 'w') as f:
+            f.write(text)
+
+    def publish(repo, message):
+        commit_all(os.path.join(work, repo), message)
+        git('push', '-q', 'origin', 'HEAD:master', cwd=os.path.join(work, repo))
+
+    write('3rdparty', 'lib.c', 'v1')
+    publish('3rdparty', '3rdparty v1')
+    write('qtdeclarative', 'qml.txt', 'v1')
+    publish('qtdeclarative', 'qtdeclarative v1')
+    write('qtbase', 'base.txt', 'v1')
+    git('-c', 'protocol.file.allow=always', 'submodule', 'add', '-q', '../3rdparty.git', 'src/3rdparty',
+        cwd=os.path.join(work, 'qtbase'))
+    publish('qtbase', 'qtbase v1')
+    qt5 = os.path.join(work, 'qt5')
+    for module in ('qtbase', 'qtdeclarative'):
+        git('-c', 'protocol.file.allow=always', 'submodule', 'add', '-q', '../{}.git'.format(module), module, cwd=qt5)
+    publish('qt5', 'qt5 v1')
+    git('tag', 'v1', cwd=qt5)
+
+    write('3rdparty', 'lib.c', 'v2')
+    publish('3rdparty', '3rdparty v2')
+    git('-c', 'protocol.file.allow=always', 'submodule', 'update', '-q', '--remote', 'src/3rdparty',
+        cwd=os.path.join(work, 'qtbase'))
+    write('qtbase', 'base.txt', 'v2')
+    publish('qtbase', 'qtbase v2')
+    git('-c', 'protocol.file.allow=always', 'submodule', 'update', '-q', '--remote', 'qtbase', cwd=qt5)
+    publish('qt5', 'qt5 v2')
+    git('tag', 'v2', cwd=qt5)
+    git('push', '-q', 'origin', '--tags', cwd=qt5)
+    return os.path.join(remotes, 'qt5.git')
+
+
+class WorktreeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.url = make_qt5_remote(cls.tmp)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(dir=self.tmp)
+        self.main = QtRepo(os.path.join(self.root, 'qt5'))
+        self.main.clone(self.url, depth=1, branch='v1', no_checkout=True)
+
+    def _read(self, *parts):
+        with open(os.path.join(*parts)) as f:
+            return f.read()
+
+    def test_main_is_object_store_only(self):
+        self.assertEqual(os.listdir(self.main.repo_path), ['.git'])
+        self.assertFalse(os.path.exists(os.path.join(self.main.repo_path, '.git', 'modules')))
+
+    def test_add_list_remove(self):
+        v1 = self.main.add_worktree(os.path.join(self.root, 'qt5-v1'), 'v1', jobs=2, skip=['qtdeclarative'])
+        v2 = self.main.add_worktree(os.path.join(self.root, 'qt5-v2'), 'v2', jobs=2, skip=['qtdeclarative'])
+        self.assertEqual(self._read(v1.repo_path, 'qtbase', 'base.txt'), 'v1')
+        self.assertEqual(self._read(v1.repo_path, 'qtbase', 'src', '3rdparty', 'lib.c'), 'v1')
+        self.assertEqual(self._read(v2.repo_path, 'qtbase', 'base.txt'), 'v2')
+        self.assertEqual(self._read(v2.repo_path, 'qtbase', 'src', '3rdparty', 'lib.c'), 'v2')
+        self.assertFalse(os.path.exists(os.path.join(v1.repo_path, 'qtdeclarative', '.git')))
+
+        # 子模块与嵌套子模块的对象库位于主仓库 .git/modules 下，由两个工作树共享
+        store = os.path.join(self.main.repo_path, '.git', 'modules', 'qtbase')
+        nested = os.path.join(store, 'modules', 'src', '3rdparty')
+        for path in (v1.repo_path, v2.repo_path):
+            self.assertEqual(common_dir(os.path.join(path, 'qtbase')), os.path.realpath(store))
+            self.assertEqual(common_dir(os.path.join(path, 'qtbase', 'src', '3rdparty')), os.path.realpath(nested))
+        # 共享配置未被 submodule init 或 inactive 标记改写
+        for git_dir in (os.path.join(self.main.repo_path, '.git'), store):
+            config = git('--git-dir', git_dir, 'config', '--list')
+            self.assertNotIn('submodule.', config)
+            self.assertNotIn('core.worktree', config)
+
+        self.assertEqual(sorted(w['path'] for w in self.main.list_worktrees()),
+                         sorted([v1.repo_path, v2.repo_path]))
+        self.main.remove_worktree(v1.repo_path)
+        self.assertFalse(os.path.exists(v1.repo_path))
+        self.assertEqual([w['path'] for w in self.main.list_worktrees()], [v2.repo_path])
+        self.assertEqual(len(git('--git-dir', store, 'worktree', 'list').splitlines()), 2)
+        self.assertEqual(len(git('--git-dir', nested, 'worktree', 'list').splitlines()), 2)
+        self.assertEqual(self._read(v2.repo_path, 'qtbase', 'src', '3rdparty', 'lib.c'), 'v2')
+
+    def test_remove_main_or_missing(self):
+        with self.assertRaises(QtRepoError):
+            self.main.remove_worktree(self.main.repo_path)
+        with self.assertRaises(QtRepoError):
+            self.main.remove_worktree(os.path.join(self.root, 'qt5-missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()